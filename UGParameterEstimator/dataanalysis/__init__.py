@@ -1 +1,3 @@
+from .journal import *
+from .logwriter import *
 from .result import *
@@ -0,0 +1,294 @@
+import io
+import os
+import pickle
+import struct
+from collections.abc import Sequence
+
+
+class ResultJournal:
+    """Append-only storage for the data of a Result object.
+
+    Every record (an iteration, a metadata entry or a logentry) is pickled on its own and appended
+    to the journal file, preceded by a small header containing the kind of the record and its length.
+    Committing an iteration therefore only writes the new data, independent of the size of the whole result.
+
+    When reading, only the headers are scanned, the records themselves are unpickled on demand.
+
+    Evaluations are stored once, as separate records identified by a key (their eval_id). Other records
+    referencing an already written evaluation only store this key, so the evaluation is shared again when loading.
+
+    The same format is used for saved result files: these end with an index record, listing the positions of all other
+    records, followed by a trailer pointing to the index (see writeIndex). This allows to read single records without scanning the file.
+    The trailer ends with a magic containing the version of the format.
+
+    Records are read through a file handle opened on first read and kept open, so a journal keeps reading the file it
+    was opened on, even if the file is replaced in the meantime (e.g. by a running optimizer saving its result).
+
+    :param filename: path of the journal file
+    :type filename: string
+    :param truncate: if True, an existing journal file with this name will be discarded
+    :type truncate: bool, optional
+    """
+
+    ITERATION = b"i"
+    METADATA = b"m"
+    LOG = b"l"
+    EVALUATION = b"e"
+    SECTION = b"s"
+    INDEX = b"x"
+
+    header = struct.Struct("<cQ")
+    evaluationkey = struct.Struct("<q")
+    trailer = struct.Struct("<Q8s")
+    magic = b"UGPEIDX1"
+
+    def __init__(self, filename, truncate=False):
+        self.filename = filename
+
+        # file handle all records are read from, see getReadFile
+        self.readfile = None
+
+        # offset and length of each stored evaluation, by key
+        self.evaluationpositions = {}
+
+        # evaluations written or loaded so far, by key
+        self.evaluations = {}
+
+        # keys of the evaluations written or loaded so far, by id() of the evaluation object
+        self.references = {}
+
+        if truncate:
+            with open(self.filename, "wb"):
+                pass
+
+    def write(self, records):
+        """Appends records to the journal.
+
+        :param records: records to append. The payload of EVALUATION records is a tuple (key, evaluation).
+        :type records: list of tuples (kind, picklable object)
+        :return: offset and length of each of the appended records in the journal file
+        :rtype: list of tuples (int, int)
+        """
+        positions = []
+        with open(self.filename, "ab") as f:
+            for kind, payload in records:
+                if kind == ResultJournal.EVALUATION:
+                    key, evaluation = payload
+                    data = ResultJournal.evaluationkey.pack(key) + pickle.dumps(evaluation, protocol=pickle.HIGHEST_PROTOCOL)
+                else:
+                    buffer = io.BytesIO()
+                    ReferencePickler(buffer, self.references).dump(payload)
+                    data = buffer.getvalue()
+
+                f.write(ResultJournal.header.pack(kind, len(data)))
+                positions.append((f.tell(), len(data)))
+                f.write(data)
+
+                if kind == ResultJournal.EVALUATION:
+                    self.evaluationpositions[key] = positions[-1]
+                    self.evaluations[key] = evaluation
+                    self.references[id(evaluation)] = key
+
+        return positions
+
+    def scan(self):
+        """Reads the headers of all records in the journal.
+        An incomplete record at the end of the file (e.g. because the writing process was killed) is ignored.
+
+        :return: kind, offset and length of each record, in the order they were written
+        :rtype: list of tuples (bytes, int, int)
+        """
+        records = []
+        f = self.getReadFile()
+        size = os.fstat(f.fileno()).st_size
+        f.seek(0)
+        while True:
+            header = f.read(ResultJournal.header.size)
+            if len(header) < ResultJournal.header.size:
+                break
+
+            kind, length = ResultJournal.header.unpack(header)
+            offset = f.tell()
+            if offset + length > size:
+                break
+
+            records.append((kind, offset, length))
+            if kind == ResultJournal.EVALUATION:
+                key, = ResultJournal.evaluationkey.unpack(f.read(ResultJournal.evaluationkey.size))
+                self.evaluationpositions[key] = (offset, length)
+
+            f.seek(offset + length)
+
+        return records
+
+    def getReadFile(self):
+        """Returns the file handle records are read from, opening the file on first use.
+
+        :return: the file opened for reading
+        :rtype: binary file object
+        """
+        if self.readfile is None:
+            self.readfile = open(self.filename, "rb")
+        return self.readfile
+
+    def readBytes(self, offset, length):
+        """Reads a range of bytes from the file this journal was opened on.
+
+        :param offset: position to start reading at
+        :type offset: int
+        :param length: number of bytes to read
+        :type length: int
+        :rtype: bytes
+        """
+        f = self.getReadFile()
+        f.seek(offset)
+        return f.read(length)
+
+    def close(self):
+        """Closes the file handle records are read from. Reading again opens the file by its name.
+        """
+        if self.readfile is not None:
+            self.readfile.close()
+            self.readfile = None
+
+    def read(self, offset, length):
+        """Unpickles a single record of the journal.
+
+        :param offset: offset of the record, as returned by write or scan
+        :type offset: int
+        :param length: length of the record, as returned by write or scan
+        :type length: int
+        :return: the stored object
+        """
+        return ReferenceUnpickler(io.BytesIO(self.readBytes(offset, length)), self).load()
+
+    def writeIndex(self, index):
+        """Appends the index record and the trailer pointing to it. Nothing must be appended afterwards.
+
+        :param index: the index to write. If it contains an entry "evaluations", this has to map the keys of
+                the stored evaluations to their position.
+        :type index: dict
+        """
+        offset, length = self.write([(ResultJournal.INDEX, index)])[0]
+        with open(self.filename, "ab") as f:
+            f.write(ResultJournal.trailer.pack(offset - ResultJournal.header.size, ResultJournal.magic))
+
+    def readIndex(self):
+        """Reads the index written by writeIndex.
+
+        :return: the index, or None if the file does not end with an index
+        :rtype: dict
+        :raises ValueError: if the file was written in another version of the format
+        """
+        size = os.fstat(self.getReadFile().fileno()).st_size
+        if size < ResultJournal.trailer.size + ResultJournal.header.size:
+            return None
+
+        offset, magic = ResultJournal.trailer.unpack(self.readBytes(size - ResultJournal.trailer.size, ResultJournal.trailer.size))
+        if magic != ResultJournal.magic and magic[:-1] == ResultJournal.magic[:-1]:
+            raise ValueError(self.filename + " was written in version " + magic[-1:].decode(errors="replace") + " of the result file format, "
+                             "only version " + ResultJournal.magic[-1:].decode() + " can be read")
+        if magic != ResultJournal.magic or offset > size - ResultJournal.trailer.size - ResultJournal.header.size:
+            return None
+
+        kind, length = ResultJournal.header.unpack(self.readBytes(offset, ResultJournal.header.size))
+        if kind != ResultJournal.INDEX:
+            return None
+
+        index = pickle.loads(self.readBytes(offset + ResultJournal.header.size, length))
+
+        self.evaluationpositions.update(index.get("evaluations", {}))
+        return index
+
+    def getEvaluation(self, key):
+        """Returns a stored evaluation, loading it from the journal if it was not accessed yet.
+
+        :param key: key the evaluation was stored with
+        :type key: int
+        :return: the stored evaluation, or None if no evaluation is stored with this key
+        :rtype: Evaluation
+        """
+        if key in self.evaluations:
+            return self.evaluations[key]
+
+        if key not in self.evaluationpositions:
+            return None
+
+        offset, length = self.evaluationpositions[key]
+        evaluation = pickle.loads(self.readBytes(offset + ResultJournal.evaluationkey.size, length - ResultJournal.evaluationkey.size))
+
+        self.evaluations[key] = evaluation
+        self.references[id(evaluation)] = key
+        return evaluation
+
+
+class ReferencePickler(pickle.Pickler):
+    """Pickler writing only the key of evaluations already stored in a ResultJournal.
+
+    :param file: file to write to
+    :type file: binary file object
+    :param references: keys of the stored evaluations, by id() of the evaluation object
+    :type references: dict
+    """
+
+    def __init__(self, file, references):
+        super().__init__(file, protocol=pickle.HIGHEST_PROTOCOL)
+        self.references = references
+
+    def persistent_id(self, obj):
+        return self.references.get(id(obj))
+
+
+class ReferenceUnpickler(pickle.Unpickler):
+    """Unpickler resolving evaluation keys written by ReferencePickler using a ResultJournal.
+
+    :param file: file to read from
+    :type file: binary file object
+    :param journal: the journal the evaluations are stored in
+    :type journal: ResultJournal
+    """
+
+    def __init__(self, file, journal):
+        super().__init__(file)
+        self.journal = journal
+
+    def persistent_load(self, key):
+        evaluation = self.journal.getEvaluation(key)
+        if evaluation is None:
+            raise pickle.UnpicklingError("Evaluation " + str(key) + " is not stored in the journal")
+        return evaluation
+
+
+class JournalIterations(Sequence):
+    """List-like view of the iterations stored in a ResultJournal.
+    Iterations are only unpickled when they are accessed, the last accessed iteration is kept in memory.
+
+    :param journal: the journal the iterations are stored in
+    :type journal: ResultJournal
+    :param positions: offset and length of each stored iteration. New iterations are added by appending to this list.
+    :type positions: list of tuples (int, int), optional
+    """
+
+    def __init__(self, journal, positions=None):
+        self.journal = journal
+        self.positions = positions if positions is not None else []
+        self.lastindex = None
+        self.lastiteration = None
+
+    def __len__(self):
+        return len(self.positions)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self[i] for i in range(*index.indices(len(self)))]
+
+        if index < 0:
+            index += len(self)
+        if index < 0 or index >= len(self):
+            raise IndexError("iteration index out of range")
+
+        if index != self.lastindex:
+            self.lastiteration = self.journal.read(*self.positions[index])
+            self.lastindex = index
+
+        return self.lastiteration
@@ -0,0 +1,123 @@
+import atexit
+import threading
+import time
+import weakref
+
+
+# all writers not yet garbage collected, flushed when the interpreter exits
+_writers = weakref.WeakSet()
+
+
+@atexit.register
+def _flushWriters():
+    for writer in list(_writers):
+        writer.flush()
+
+
+class LogWriter:
+    """Buffered writer for the plain text log file of a Result object.
+
+    The file is kept open, lines are collected in a buffer and written when more than buffersize characters are
+    buffered or the last write is longer than flushinterval seconds ago. If background is set, the buffer is written
+    by a separate thread, so logging never waits for the filesystem. Buffered lines are written when the writer is
+    garbage collected or the interpreter exits.
+
+    :param filename: path of the log file. lines are appended to an existing file.
+    :type filename: string
+    :param flushinterval: maximum time in seconds lines stay in the buffer (as long as new lines are logged, or background is set)
+    :type flushinterval: float, optional
+    :param buffersize: number of buffered characters causing a write
+    :type buffersize: int, optional
+    :param background: write the buffer from a background thread
+    :type background: bool, optional
+    """
+
+    def __init__(self, filename, flushinterval=1.0, buffersize=64 * 1024, background=False):
+        self.filename = filename
+        self.flushinterval = flushinterval
+        self.buffersize = buffersize
+        self.background = background
+
+        self.file = None
+        self.buffer = []
+        self.bufferedsize = 0
+        self.lastflush = time.perf_counter()
+        self.lock = threading.Lock()
+        self.writelock = threading.Lock()
+
+        self.thread = None
+        self.event = threading.Event()
+        self.stopped = False
+        if self.background:
+            self.thread = threading.Thread(target=self.run, daemon=True)
+            self.thread.start()
+
+        _writers.add(self)
+
+    def write(self, line, flush=False):
+        """Adds a line to the buffer, writing the buffer if necessary.
+
+        :param line: the line to write, without trailing newline
+        :type line: string
+        :param flush: write the buffer immediately, including this line
+        :type flush: bool, optional
+        """
+        with self.lock:
+            self.buffer.append(line + "\n")
+            self.bufferedsize += len(line) + 1
+            full = self.bufferedsize >= self.buffersize
+
+        if flush:
+            self.flush()
+        elif self.background:
+            if full:
+                self.event.set()
+        elif full or time.perf_counter() - self.lastflush >= self.flushinterval:
+            self.flush()
+
+    def flush(self):
+        """Writes all buffered lines to the file.
+        """
+        # the buffer is only locked while swapping it, so logging does not wait for the file
+        with self.writelock:
+            with self.lock:
+                lines = self.buffer
+                self.buffer = []
+                self.bufferedsize = 0
+                self.lastflush = time.perf_counter()
+
+            if len(lines) == 0:
+                return
+
+            if self.file is None:
+                self.file = open(self.filename, "a")
+
+            self.file.write("".join(lines))
+            self.file.flush()
+
+    def run(self):
+        """Main loop of the background thread.
+        """
+        while not self.stopped:
+            self.event.wait(self.flushinterval)
+            self.event.clear()
+            self.flush()
+
+    def close(self):
+        """Writes all buffered lines, stops the background thread and closes the file.
+        """
+        if self.thread is not None:
+            self.stopped = True
+            self.event.set()
+            self.thread.join()
+            self.thread = None
+
+        self.flush()
+
+        with self.writelock:
+            if self.file is not None:
+                self.file.close()
+                self.file = None
+
+    def __del__(self):
+        self.close()
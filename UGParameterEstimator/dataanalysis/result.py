@@ -4,8 +4,11 @@ import pickle
 import copy
 from scipy import stats
 from math import floor, log10
-from UGParameterEstimator import FreeSurfaceTimeDependentEvaluation, FreeSurfaceEquilibriumEvaluation
+from UGParameterEstimator import Evaluation, ErroredEvaluation, FreeSurfaceTimeDependentEvaluation, FreeSurfaceEquilibriumEvaluation
+from .journal import ResultJournal, JournalIterations
+from .logwriter import LogWriter
 from datetime import datetime
+from enum import IntEnum
 
 
 # helper functions to write numbers in scientific notation
@@ -31,15 +34,68 @@ class Result:
 
     If a filename is specified, the results object will be saved whenever new data is available.
 
+    If journal is set, the results are not pickled as a whole every time, instead new iterations, metadata and logentries
+    are appended to the journal file "<filename>_journal" (see ResultJournal). Result.load reads the journal if it is newer than
+    the .pkl file, compact() writes the usual .pkl file from it.
+
+    The .pkl file is not a plain pickle of this object, but a sequence of pickled records (see writeFile), so it has to be
+    read with Result.load instead of pickle.load. The version of this format is stored at the end of the file, see ResultJournal.
+    Files written as a plain pickle by older versions can still be loaded.
+
+    Logentries below loglevel are dropped. The log file is written buffered (see LogWriter), optionally from a background thread.
+    In this case, closeLog() should be called at the end of the calibration.
+
     :param filename: filename to save. if a path is specified, the directories will be create if not yet existant.
     :type filename: string, optional
+    :param journal: store the results in an append-only journal file
+    :type journal: bool, optional
+    :param loglevel: minimum level of logentries to keep
+    :type loglevel: Result.LogLevel, optional
+    :param asynclog: write the log file from a background thread
+    :type asynclog: bool, optional
     """
 
-    def __init__(self, filename=None):
+    class LogLevel(IntEnum):
+        DEBUG = 10  # e.g. the result of every single line search or lambda candidate
+        INFO = 20
+        WARNING = 30
+        ERROR = 40
+
+    # the journal the data is appended to, if journaling is enabled
+    journal = None
+
+    # the saved result file iterations and evaluations are loaded from on demand, if loaded lazily
+    resultfile = None
+
+    # numeric metrics of every iteration, if loaded lazily from a result file. See getMetric()
+    summary = None
+
+    # maximum number of entries of a numeric metric to be stored in the summary of a result file
+    summarysize = 64
+
+    loglevel = LogLevel.INFO
+    asynclog = False
+
+    # writer for the log file, created on the first logentry
+    logwriter = None
+
+    # maximum time in seconds logentries are buffered before written to the log file
+    logflushinterval = 1.0
+
+    # number of buffered characters causing the log file to be written
+    logbuffersize = 64 * 1024
+
+    def __init__(self, filename=None, journal=False, loglevel=LogLevel.INFO, asynclog=False):
         """Constructor
 
         :param filename: filename to save. if a path is specified, the directories will be create if not yet existant.
         :type filename: string, optional
+        :param journal: store the results in an append-only journal file
+        :type journal: bool, optional
+        :param loglevel: minimum level of logentries to keep
+        :type loglevel: Result.LogLevel, optional
+        :param asynclog: write the log file from a background thread
+        :type asynclog: bool, optional
         """
         self.iterations = []
         self.logentries = []
@@ -49,13 +105,26 @@ class Result:
 
         self.metadata = {}
 
+        # all evaluations added to this object, by eval_id. iterations reference these objects,
+        # so every evaluation is only stored once.
+        self.storedevaluations = {}
+
         self.filename = filename
+        self.loglevel = loglevel
+        self.asynclog = asynclog
 
         if filename:
             directory = os.path.dirname(self.filename)
             if directory != "":
                 os.makedirs(directory, exist_ok=True)
 
+        # records not yet written to the journal
+        self.journalpending = []
+
+        if filename and journal:
+            self.journal = ResultJournal(self.filename + "_journal", truncate=True)
+            self.iterations = JournalIterations(self.journal)
+
     @property
     def iterationCount(self):
         """Returns the number of iterations stored in this object
@@ -87,20 +156,20 @@ class Result:
 
             f.write("\n")
 
-            i = 0
-            for iteration in self.iterations:
+            parameters = self.getMetric("parameters")
+            values = [self.getMetric(p[1]) for p in metrics]
+            for i in range(self.iterationCount):
                 f.write(str(i) + "\t")
                 for j in range(len(pm.parameters)):
-                    f.write(str(iteration["parameters"][j]) + "\t")
+                    f.write(str(parameters[i][j]) + "\t")
 
-                for p in metrics:
-                    if p[1] in iteration:
-                        f.write(str(iteration[p[1]]) + "\t")
+                for v in values:
+                    if v[i] is not None:
+                        f.write(str(v[i]) + "\t")
                     else:
                         f.write("NaN\t")
 
                 f.write("\n")
-                i += 1
 
     def writeLatexTable(self, filename, metrics=[], nameoverride=None):
         """writes the iteration data as a latex table.
@@ -274,6 +343,163 @@ class Result:
 
             f.write("\\end{tabular}")
 
+    def writeColumns(self, directory, metrics=None):
+        """Exports the iteration data and evaluations in a columnar format for postprocessing: a directory containing
+        one .npy file per column, which can be read separately and memory mapped using readColumns.
+
+        "iterations.npy" contains the iteration indices.
+        Each metric becomes a numpy array stacked over all iterations, stored as "metric_<name>.npy". Iterations
+        missing the metric contain NaN. Metrics which are not numeric, or whose shape changes between iterations, are skipped.
+
+        All evaluations added to the iterations are stored row by row in the order they were added:
+        "evaluation_parameters.npy" (evaluations x parameters), "evaluation_measurements.npy" (evaluations x measurements, filled up with NaN
+        for evaluations with less measurements and errored evaluations), "evaluation_measurementcounts.npy", "evaluation_ids.npy",
+        "evaluation_iterations.npy", "evaluation_tags.npy", "evaluation_errored.npy" and "evaluation_runtimes.npy".
+
+        The metadata is pickled to "metadata.pkl".
+
+        Other .npy files in the directory, e.g. columns of metrics exported by an earlier call, are removed,
+        so readColumns only reads the columns written by this call.
+
+        :param directory: directory to write to. will be created if it does not exist.
+        :type directory: string
+        :param metrics: names of the metrics to export. if not specified, all metrics will be exported.
+        :type metrics: list of strings, optional
+        """
+        os.makedirs(directory, exist_ok=True)
+
+        metricvalues = {}
+        evaluationrows = []
+        for i in range(self.iterationCount):
+            iteration = self.iterations[i]
+            for name in iteration:
+                if name == "evaluations" or (metrics is not None and name not in metrics):
+                    continue
+                if name not in metricvalues:
+                    metricvalues[name] = [None] * self.iterationCount
+                metricvalues[name][i] = iteration[name]
+
+            for evaluations, tag, index in iteration.get("evaluations", []):
+                for evaluation in evaluations:
+                    if evaluation is not None:
+                        evaluationrows.append((evaluation, "" if tag is None else str(tag), index))
+
+        columns = {}
+        for name, values in metricvalues.items():
+            column = Result.stackMetric(values)
+            if column is not None:
+                columns["metric_" + name] = column
+
+        parameters = [np.zeros(0) if e.parameters is None else np.ravel(e.parameters) for e, _, _ in evaluationrows]
+        measurements = [np.zeros(0) if isinstance(e, ErroredEvaluation) else np.ravel(e.getNumpyArray()) for e, _, _ in evaluationrows]
+
+        columns.update({
+            "iterations": np.arange(self.iterationCount, dtype=np.int64),
+            "evaluation_ids": np.array([-1 if e.eval_id is None else e.eval_id for e, _, _ in evaluationrows], dtype=np.int64),
+            "evaluation_iterations": np.array([index for _, _, index in evaluationrows], dtype=np.int64),
+            "evaluation_tags": np.array([tag for _, tag, _ in evaluationrows], dtype=np.str_),
+            "evaluation_errored": np.array([isinstance(e, ErroredEvaluation) for e, _, _ in evaluationrows], dtype=bool),
+            "evaluation_runtimes": np.array([np.nan if e.runtime is None else e.runtime for e, _, _ in evaluationrows], dtype=np.float64),
+            "evaluation_parameters": Result.padRows(parameters),
+            "evaluation_measurements": Result.padRows(measurements),
+            "evaluation_measurementcounts": np.array([len(m) for m in measurements], dtype=np.int64)
+        })
+
+        for name, column in columns.items():
+            np.save(os.path.join(directory, name + ".npy"), column)
+
+        for filename in os.listdir(directory):
+            if filename.endswith(".npy") and filename[:-4] not in columns:
+                os.remove(os.path.join(directory, filename))
+
+        with open(os.path.join(directory, "metadata.pkl"), "wb") as f:
+            pickle.dump(self.metadata, f)
+
+    @staticmethod
+    def stackMetric(values):
+        """Stacks the values of a metric over all iterations into a single numpy array.
+
+        :param values: the value of the metric in every iteration, None if it is missing
+        :type values: list
+        :return: float array with the iteration as first axis, NaN for missing iterations. None if the values are not numeric or differently shaped.
+        :rtype: numpy array
+        """
+        arrays = []
+        for value in values:
+            if value is None:
+                continue
+            if isinstance(value, (Evaluation, str, bytes)):
+                return None
+            array = np.asarray(value)
+            if array.dtype.kind not in "biuf" or (len(arrays) > 0 and array.shape != arrays[0].shape):
+                return None
+            arrays.append(array)
+
+        if len(arrays) == 0:
+            return None
+
+        column = np.full((len(values),) + arrays[0].shape, np.nan)
+        present = [i for i in range(len(values)) if values[i] is not None]
+        column[present] = np.stack(arrays)
+        return column
+
+    @staticmethod
+    def padRows(rows):
+        """Stacks 1d arrays of different length into a matrix, filled up with NaN.
+
+        :param rows: the rows of the matrix
+        :type rows: list of 1d numpy arrays
+        :return: matrix with one row per entry of rows
+        :rtype: 2d numpy array
+        """
+        matrix = np.full((len(rows), max([len(r) for r in rows], default=0)), np.nan)
+        for i in range(len(rows)):
+            matrix[i, :len(rows[i])] = rows[i]
+        return matrix
+
+    @staticmethod
+    def readColumns(directory, columns=None, mmap=True):
+        """Reads columns written by writeColumns. Only the requested columns are read.
+
+        :param directory: directory written by writeColumns
+        :type directory: string
+        :param columns: names of the columns to read, e.g. "metric_residualnorm" or "evaluation_parameters". if not specified, all columns will be read.
+        :type columns: list of strings, optional
+        :param mmap: memory map the columns instead of reading them into memory
+        :type mmap: bool, optional
+        :return: the columns, by name
+        :rtype: dict of numpy arrays
+        """
+        if columns is None:
+            columns = sorted(f[:-4] for f in os.listdir(directory) if f.endswith(".npy"))
+
+        mode = "r" if mmap else None
+        return {name: np.load(os.path.join(directory, name + ".npy"), mmap_mode=mode) for name in columns}
+
+    @classmethod
+    def fromColumns(cls, directory, mmap=True):
+        """Creates a result object from the metadata and metrics written by writeColumns.
+        The evaluations are not restored, they can be read using readColumns.
+
+        :param directory: directory written by writeColumns
+        :type directory: string
+        :param mmap: memory map the metrics instead of reading them into memory
+        :type mmap: bool, optional
+        :return: the result object
+        :rtype: Result
+        """
+        result = cls()
+        with open(os.path.join(directory, "metadata.pkl"), "rb") as f:
+            result.metadata = pickle.load(f)
+
+        names = [f[:-4] for f in os.listdir(directory) if f.startswith("metric_") and f.endswith(".npy")]
+        metrics = Result.readColumns(directory, names, mmap)
+
+        count = len(Result.readColumns(directory, ["iterations"], mmap)["iterations"])
+        result.iterations = [{name[len("metric_"):]: column[i] for name, column in metrics.items()} for i in range(count)]
+
+        return result
+
     def writeMatrix(self, file, name, symbol, iterations_to_print=[-1]):
         """Writes an numpy matrix stored as iteration data to a file, formatted for direct use in latex using a pmatrix element.
         The matrix has to be saved by the optimizer. Can be used to print the matrix from multiple iterations.
@@ -459,18 +685,112 @@ class Result:
         """
         self.metadata[name] = value
 
+        if self.journal is not None:
+            self.journalpending.append((ResultJournal.METADATA, (name, value)))
+
     def addEvaluations(self, evaluations, tag=None):
         """Adds evaluations to the current iteration.
         The evaluations can be tagged with an additional string for later analysis.
 
+        The evaluations are not copied, so they must not be modified afterwards. Each evaluation is stored once
+        (see storeEvaluation), iterations only reference it.
+
         :param evaluations: the evaluations to add
-        :type evaluations: string
+        :type evaluations: list of Evaluation
         :param tag: additional tag for this iteration
         :type tag: string
         """
+        for evaluation in evaluations:
+            self.storeEvaluation(evaluation)
+
         if "evaluations" not in self.currentIteration:
             self.currentIteration["evaluations"] = []
-        self.currentIteration["evaluations"].append((copy.deepcopy(evaluations), tag, self.iterationCount))
+        self.currentIteration["evaluations"].append((list(evaluations), tag, self.iterationCount))
+
+    def storeEvaluation(self, evaluation):
+        """Stores an evaluation by its eval_id, so it is stored only once, no matter how often it is referenced
+        in iterations or metrics. This sharing is kept when saving and loading.
+        Evaluations without a valid eval_id, or with an eval_id already used by a different evaluation, are not stored
+        and will be saved as a copy wherever they are referenced.
+
+        :param evaluation: the evaluation to store
+        :type evaluation: Evaluation
+        """
+        if not isinstance(evaluation, Evaluation):
+            return
+
+        key = evaluation.eval_id
+        if not isinstance(key, (int, np.integer)) or key < 0:
+            return
+        key = int(key)
+
+        if key in self.storedevaluations or any(key in storage.evaluationpositions for storage in self.getStorages()):
+            return
+
+        self.storedevaluations[key] = evaluation
+        if self.journal is not None:
+            self.journalpending.append((ResultJournal.EVALUATION, (key, evaluation)))
+
+    def getEvaluation(self, eval_id):
+        """Returns an evaluation stored in this object.
+
+        :param eval_id: eval_id of the evaluation
+        :type eval_id: int
+        :return: the evaluation, or None if no evaluation with this id is stored
+        :rtype: Evaluation
+        """
+        if eval_id in self.storedevaluations:
+            return self.storedevaluations[eval_id]
+
+        for storage in self.getStorages():
+            if eval_id in storage.evaluationpositions:
+                return storage.getEvaluation(eval_id)
+
+        return None
+
+    def getStorages(self):
+        """Returns the files iterations and evaluations of this object are loaded from on demand.
+
+        :return: the journal and the result file this object was loaded from, if any
+        :rtype: list of ResultJournal
+        """
+        return [storage for storage in [self.journal, self.resultfile] if storage is not None]
+
+    def getMetric(self, name):
+        """Returns the value of a metric in every iteration.
+        If this object was loaded lazily, numeric metrics are read from the summary of the result file,
+        without loading the iterations.
+
+        :param name: name of the metric
+        :type name: string
+        :return: value of the metric in every iteration, None for iterations not containing it.
+        :rtype: list
+        """
+        values = []
+        for i in range(self.iterationCount):
+            if self.summary is not None and i < len(self.summary) and name not in self.summary[i][1]:
+                values.append(self.summary[i][0].get(name))
+            else:
+                values.append(self.iterations[i].get(name))
+        return values
+
+    @staticmethod
+    def getSummary(iteration):
+        """Splits the metrics of an iteration into small numeric ones, stored in the summary of a result file, and all others.
+
+        :param iteration: the iteration
+        :type iteration: dict
+        :return: small numeric metrics, and the names of all other metrics
+        :rtype: tuple (dict, list of strings)
+        """
+        small = {}
+        others = []
+        for name, value in iteration.items():
+            if isinstance(value, (int, float, np.number, bool)) or (isinstance(value, np.ndarray) and value.dtype.kind in "biuf" and value.size <= Result.summarysize):
+                small[name] = value
+            else:
+                others.append(name)
+        return small, others
 
     def addMetric(self, name, value):
         """Adds a metric to the current evaluation
@@ -480,44 +800,179 @@ class Result:
         :param value: value for this metric key
         :type value: any picklable python type
         """
+        self.storeEvaluation(value)
         self.currentIteration[name] = value
 
     def commitIteration(self):
         """Stores the current iteration to iterations array.
         If a filename was specified at construction, also saves the results object.
+        If journaling is enabled, only the new iteration is appended to the journal.
         """
-        self.iterations.append(copy.deepcopy(self.currentIteration))
+        self.flushLog()
+
+        if self.journal is not None:
+            self.journalpending.append((ResultJournal.ITERATION, self.currentIteration))
+            positions = self.flushJournal()
+            self.iterations.positions.append(positions[-1])
+            self.currentIteration.clear()
+            return
+
+        if not isinstance(self.iterations, list):
+            self.iterations = list(self.iterations)
+            self.summary = None
+
+        # copy the metrics, but keep referencing the stored evaluations
+        memo = {id(evaluation): evaluation for evaluation in self.storedevaluations.values()}
+        self.iterations.append(copy.deepcopy(self.currentIteration, memo))
         self.currentIteration.clear()
         self.save()
 
+    def flushJournal(self):
+        """Writes all pending metadata and logentries to the journal.
+
+        :return: offset and length of each written record in the journal file
+        :rtype: list of tuples (int, int)
+        """
+        if self.journal is None or len(self.journalpending) == 0:
+            return []
+
+        positions = self.journal.write(self.journalpending)
+        self.journalpending = []
+        return positions
+
+    def getState(self):
+        """Returns the data of this object, as it is stored in the .pkl file.
+
+        :return: the stored data
+        :rtype: dict
+        """
+        state = dict(self.__dict__)
+        state.pop("journal", None)
+        state.pop("journalpending", None)
+        state.pop("logwriter", None)
+        state.pop("resultfile", None)
+        state.pop("summary", None)
+        state["iterations"] = list(self.iterations)
+        state["storedevaluations"] = dict(self.storedevaluations)
+        for storage in self.getStorages():
+            for key in storage.evaluationpositions:
+                state["storedevaluations"][key] = storage.getEvaluation(key)
+        return state
+
+    def writeFile(self, filename):
+        """Writes the results object to a file.
+
+        The file consists of separately pickled records (see ResultJournal) for every stored evaluation, every iteration
+        and every other field of this object, as well as a summary containing the small numeric metrics of all iterations.
+        It ends with an index of these records, so Result.load can read each of them on demand.
+
+        :param filename: filename to save to
+        :type filename: string
+        """
+        state = self.getState()
+        iterations = state.pop("iterations")
+        evaluations = state.pop("storedevaluations")
+        state["summary"] = [Result.getSummary(iteration) for iteration in iterations]
+
+        tmpfilename = filename + ".tmp"
+        storage = ResultJournal(tmpfilename, truncate=True)
+        evaluationpositions = storage.write([(ResultJournal.EVALUATION, (key, evaluation)) for key, evaluation in evaluations.items()])
+        iterationpositions = storage.write([(ResultJournal.ITERATION, iteration) for iteration in iterations])
+        sectionpositions = storage.write([(ResultJournal.SECTION, value) for value in state.values()])
+        storage.writeIndex({
+            "evaluations": dict(zip(evaluations.keys(), evaluationpositions)),
+            "iterations": iterationpositions,
+            "sections": dict(zip(state.keys(), sectionpositions))})
+        os.replace(tmpfilename, filename)
+
+        # the file this object is loaded from was replaced, continue loading from the new one
+        if self.resultfile is not None and os.path.abspath(self.resultfile.filename) == os.path.abspath(filename):
+            storage.filename = filename
+            self.resultfile.close()
+            self.resultfile = storage
+            if isinstance(self.iterations, JournalIterations):
+                self.iterations = JournalIterations(storage, iterationpositions)
+                self.summary = state["summary"]
+
     def save(self, filename=None):
-        """Saves the results object in pickle format to a file.
+        """Saves the results object to a file, in the format described in writeFile.
+        If journaling is enabled and no filename is given, only pending data is written to the journal, see compact().
 
         :param filename: filename to save to. if not specified, the filename set when constructing this object will be used.
         :type filename: string
         """
+        self.flushLog()
+
+        if filename is None:
+            if self.journal is not None:
+                self.flushJournal()
+                return
+
+            filename = self.filename
+
+        if filename is None:
+            return
+
+        self.writeFile(filename)
+
+    def compact(self, filename=None):
+        """Writes the results object to a file in the format described in writeFile, so it can be loaded without the journal.
+        This loads all iterations stored in the journal.
+        The journal is kept, so further iterations can be appended to it.
+
+        :param filename: filename to save to. if not specified, the filename set when constructing this object will be used.
+        :type filename: string, optional
+        """
         if filename is None:
             filename = self.filename
 
         if filename is None:
             return
 
-        with open(filename, "wb") as f:
-            pickle.dump(self.__dict__, f)
+        self.flushJournal()
+        self.writeFile(filename)
 
-    def log(self, text):
+    def log(self, text, level=LogLevel.INFO):
         """Adds an logentry.
 
         The logentry is printed in the process. Logs are addionally written to a separate file "<filename>_log" in plain text format to allow for easier debugging.
+        This file is written buffered, it is complete after flushLog() was called (which happens on every commitIteration() and save()).
+        Logentries of level WARNING or above are written immediately.
 
         :param text: logtext to add.
         :type text: string
+        :param level: level of this logentry. the entry is dropped if this is lower than the loglevel of this object.
+        :type level: Result.LogLevel, optional
         """
+        if level < self.loglevel:
+            return
+
         logtext = "[" + str(datetime.now()) + "] " + text
         print(logtext)
         self.logentries.append(logtext)
-        with open(self.filename + "_log", "a") as f:
-            f.write(logtext + "\n")
+        if self.journal is not None:
+            self.journalpending.append((ResultJournal.LOG, logtext))
+
+        if self.filename is None:
+            return
+
+        if self.logwriter is None:
+            self.logwriter = LogWriter(self.filename + "_log", self.logflushinterval, self.logbuffersize, self.asynclog)
+        self.logwriter.write(logtext, flush=level >= Result.LogLevel.WARNING)
+
+    def flushLog(self):
+        """Writes all buffered logentries to the log file.
+        """
+        if self.logwriter is not None:
+            self.logwriter.flush()
+
+    def closeLog(self):
+        """Writes all buffered logentries to the log file, closes the file and stops the background thread, if there is one.
+        The file will be opened again by the next logentry.
+        """
+        if self.logwriter is not None:
+            self.logwriter.close()
+            self.logwriter = None
 
     def printlog(self):
         """Prints all logentries stored in the object.
@@ -526,17 +981,78 @@ class Result:
             print(l)
 
     @classmethod
-    def load(cls, filename, printInfo=True):
-        """Loads a result object stored pickled in a file.
+    def load(cls, filename, printInfo=True, lazy=True):
+        """Loads a result object saved to a file, either in the format described in writeFile or as a plain pickle written
+        by older versions. If the journal "<filename>_journal" exists and is newer than the file, the journal is loaded instead.
+
+        If lazy is set, only metadata, logentries and the summary of the iterations are read immediately.
+        Iterations and evaluations are read when they are accessed, use getMetric() to get small numeric
+        metrics without loading the iterations. Files written before this format was introduced are always loaded completely.
+        The file stays open, so a lazily loaded object keeps reading from the loaded file, even if it is replaced by
+        another save (e.g. of a running optimization).
 
         :param filename: path to the file to load.
         :type filename: string
         :param printInfo: print information about the loaded results object (default: true)
         :type printInfo: bool, optional
+        :param lazy: read iterations and evaluations on demand
+        :type lazy: bool, optional
+        """
+        journalfilename = filename + "_journal"
+        if os.path.isfile(journalfilename) and (not os.path.isfile(filename) or os.path.getmtime(journalfilename) > os.path.getmtime(filename)):
+            return cls.loadJournal(filename, printInfo)
+
+        result = cls()
+        storage = ResultJournal(filename)
+        index = storage.readIndex()
+
+        if index is None:
+            storage.close()
+            with open(filename, "rb") as f:
+                result.__dict__.update(pickle.load(f))
+        else:
+            for name, position in index["sections"].items():
+                result.__dict__[name] = storage.read(*position)
+
+            result.resultfile = storage
+            result.iterations = JournalIterations(storage, index["iterations"])
+
+            if not lazy:
+                result.iterations = list(result.iterations)
+                result.storedevaluations = {key: storage.getEvaluation(key) for key in storage.evaluationpositions}
+                result.resultfile = None
+                result.summary = None
+                storage.close()
+
+        if printInfo:
+            print(result)
+
+        return result
+
+    @classmethod
+    def loadJournal(cls, filename, printInfo=True):
+        """Loads a result object stored in the journal "<filename>_journal".
+        Metadata and logentries are read immediately, iterations only when they are accessed.
+        Further iterations committed to the returned object are appended to the journal.
+
+        :param filename: path to the file the result was saved to, without the "_journal" suffix.
+        :type filename: string
+        :param printInfo: print information about the loaded results object (default: true)
+        :type printInfo: bool, optional
         """
         result = cls()
-        with open(filename, "rb") as f:
-            result.__dict__.update(pickle.load(f))
+        result.filename = filename
+        result.journal = ResultJournal(filename + "_journal")
+        result.iterations = JournalIterations(result.journal)
+
+        for kind, offset, length in result.journal.scan():
+            if kind == ResultJournal.ITERATION:
+                result.iterations.positions.append((offset, length))
+            elif kind == ResultJournal.METADATA:
+                name, value = result.journal.read(offset, length)
+                result.metadata[name] = value
+            elif kind == ResultJournal.LOG:
+                result.logentries.append(result.journal.read(offset, length))
 
         if printInfo:
             print(result)
@@ -578,8 +1094,9 @@ class Result:
                 f.write("\t\t table [x={it}, y={f}]{ \n")
                 f.write("it\t f\n")
 
+                residualnorms = result.getMetric("residualnorm")
                 for t in range(result.iterationCount):
-                    f.write(str(t) + "\t" + str(result.iterations[t]["residualnorm"]) + "\n")
+                    f.write(str(t) + "\t" + str(residualnorms[t]) + "\n")
                 f.write("};\n")
 
                 legtext = ""
@@ -602,8 +1119,9 @@ class Result:
         res += "filename: " + self.filename + "\n"
         res += "iterationCount: " + str(self.iterationCount) + "\n"
         res += "paramcount: " + str(len(self.metadata["parametermanager"].parameters)) + "\n"
-        res += "first res norm: " + str(self.iterations[0]["residualnorm"]) + "\n"
-        res += "last res norm: " + str(self.iterations[self.iterationCount - 1]["residualnorm"]) + "\n"
+        residualnorms = self.getMetric("residualnorm")
+        res += "first res norm: " + str(residualnorms[0]) + "\n"
+        res += "last res norm: " + str(residualnorms[self.iterationCount - 1]) + "\n"
 
         for k in self.metadata:
             res += k + ": " + str(self.metadata[k]) + "\n"
@@ -1,5 +1,7 @@
 import numpy as np
 import os
+import io
+import re
 from abc import ABC, abstractmethod
 
 
@@ -14,6 +16,9 @@ class Evaluation(ABC):
     eval_id = None
     runtime = None
 
+    # maximum number of bytes of a csv file read at once by readCSVColumns
+    csvmemorybudget = 64 * 1024 * 1024
+
     @abstractmethod
     def getNumpyArray(self):
         """Returns stored measurements as a 1d numpy array
@@ -56,6 +61,96 @@ class Evaluation(ABC):
         """
         pass
 
+    @classmethod
+    def isFinished(cls, directory, evaluation_id):
+        """Cheaply checks if the measurement file of the evaluation with the given id has been written completely,
+        without parsing it. Used by the evaluators to react to finished jobs as soon as possible.
+
+        :param directory: directory to read the evaluation from
+        :type directory: string
+        :param evaluation_id: id of the evaluation to find the correct file fron directory
+        :type evaluation_id: int
+        :return: True if finished, False if not (yet), None if this evaluation type can not tell
+        :rtype: boolean
+        """
+        return None
+
+    @staticmethod
+    def fileEndsWith(filename, marker, tail=256):
+        """Helper to check if the last bytes of a file contain a marker.
+
+        :param filename: file to check
+        :type filename: string
+        :param marker: marker to look for
+        :type marker: bytes
+        :param tail: number of bytes at the end of the file to search
+        :type tail: int, optional
+        :return: true, if the file exists and contains the marker in the last bytes
+        :rtype: boolean
+        """
+        try:
+            with open(filename, "rb") as f:
+                f.seek(0, os.SEEK_END)
+                f.seek(max(0, f.tell() - tail))
+                return marker in f.read()
+        except OSError:
+            return False
+
+    @classmethod
+    def readCSVColumns(cls, filename, columns, delimiter=","):
+        """Bulk reads numeric columns of a csv measurement file using numpy, up to the row
+        with FINISHED in its first column ("step").
+
+        Files larger than csvmemorybudget of the class this is called on are read and converted in chunks of this size,
+        so the memory needed for the text stays bounded.
+
+        :param filename: file to read
+        :type filename: string
+        :param columns: names of the columns to read
+        :type columns: list of strings
+        :param delimiter: delimiter of the csv file
+        :type delimiter: string, optional
+        :raises ValueError: if the file can not be read this way, e.g. because of missing columns, non numeric entries or
+                repeated header lines. Callers should fall back to parsing the file row by row.
+        :return: one 1d float64 array per column, and whether the FINISHED row was found
+        :rtype: tuple (list of numpy arrays, boolean)
+        """
+        finishedmarker = re.compile("^FINISHED(" + re.escape(delimiter) + "|$)", re.MULTILINE)
+
+        with open(filename) as csvfile:
+            header = [c.strip() for c in csvfile.readline().rstrip("\n").split(delimiter)]
+
+            if "step" not in header or header[0] != "step" or any(c not in header for c in columns):
+                raise ValueError("Unsupported header in " + filename)
+
+            usecols = [header.index(c) for c in columns]
+            chunks = []
+            finished = False
+
+            while not finished:
+                text = csvfile.read(cls.csvmemorybudget)
+                if text == "":
+                    break
+
+                # complete the last line of the chunk
+                text += csvfile.readline()
+
+                match = finishedmarker.search(text)
+                if match is not None:
+                    text = text[:match.start()]
+                    finished = True
+
+                if text.strip() == "":
+                    continue
+
+                chunks.append(np.loadtxt(io.StringIO(text), delimiter=delimiter, usecols=usecols, dtype=np.float64, ndmin=2))
+
+        if len(chunks) == 0:
+            return [np.zeros(0) for c in columns], finished
+
+        values = np.concatenate(chunks, axis=0)
+        return [values[:, i] for i in range(len(columns))], finished
+
     class IncompatibleFormatError(Exception):
         pass
 
@@ -63,10 +158,13 @@ class Evaluation(ABC):
 class ErroredEvaluation(Evaluation):
     """An Implementation of Evaluation indicating an error has occurred during Evaluation.
 
-    The reason might be found in the reason field.
+    The reason might be found in the reason field. Transient errors (e.g. timeouts or node failures)
+    might not occur again for the same parameters, so they are not cached by the evaluators.
     """
 
-    def __init__(self, parameters, reason, eval_id=None, runtime=None):
+    transient = False
+
+    def __init__(self, parameters, reason, eval_id=None, runtime=None, transient=False):
         """Class constructor
 
         :param parameters: the (transformed) parameters of this evaluation
@@ -77,11 +175,14 @@ class ErroredEvaluation(Evaluation):
         :type eval_id: int, optional
         :param runtime: runtime of the evaluation, in seconds
         :type runtime: int, optional
+        :param transient: whether the error might not occur again when evaluating the same parameters
+        :type transient: bool, optional
         """
         self.parameters = parameters
         self.eval_id = eval_id
         self.runtime = runtime
         self.reason = reason
+        self.transient = transient
 
     def getNumpyArray(self):
         pass
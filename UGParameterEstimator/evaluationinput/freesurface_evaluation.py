@@ -78,17 +78,19 @@ class FreeSurfaceEvaluation(Evaluation):
         """
         if A.locationCount != B.locationCount:
             return False
-        else:
-            for l in range(A.locationCount):
-                if A.dimension == 2:
-                    if math.fabs(B.locations[l] - A.locations[l]) > 0.001:
-                        print("At location " + str(l) + ": target: " + str(B.locations[l]) + ", measurement: " + str(A.locations[l]))
-                        return False
-                else:
-                    if math.fabs(B.locations[l][0] - A.locations[l][0]) > 0.001 or math.fabs(B.locations[l][1] - A.locations[l][1]) > 0.001:
-                        print("At location " + str(l) + ": ")
-                        print("target: " + str(B.locations[l]) + ", measurement: " + str(A.lcations[l]))
-                        return False
+
+        if A.locationCount == 0:
+            return True
+
+        # compare all locations (and in the 3d case, all coordinates) at once
+        deviation = np.abs(np.asarray(B.locations, dtype=np.float64) - np.asarray(A.locations, dtype=np.float64)) > 0.001
+        if deviation.ndim > 1:
+            deviation = np.any(deviation, axis=1)
+
+        if np.any(deviation):
+            l = int(np.argmax(deviation))
+            print("At location " + str(l) + ": target: " + str(B.locations[l]) + ", measurement: " + str(A.locations[l]))
+            return False
 
         return True
 
@@ -293,7 +295,10 @@ class BinaryReader:
 
 class FreeSurfaceTimeDependentEvaluation(FreeSurfaceEvaluation):
     """Class representing the measurement of the free surface position at multiple time points.
-    The underlying data is a 2d array.
+    The underlying data is a 2d float64 numpy array (time x location).
+
+    The result of the interpolation to the format of a target is cached, so repeated calls of
+    getNumpyArrayLike with the same target do not interpolate again.
     """
     EQUILIBRIUM_CONSTANT = 10
 
@@ -301,9 +306,9 @@ class FreeSurfaceTimeDependentEvaluation(FreeSurfaceEvaluation):
         """ Class constructor
 
         :param data: 2d array of numbers, first dimension: time, second(inner) dimension location
-        :type data: list of list of numbers
+        :type data: list of list of numbers or 2d numpy array
         :param times: the times measured (in simulation time)
-        :type times: list of numbers
+        :type times: list of numbers or numpy array
         :param locations: the locations measured
         :type locations: list of numbers or list of tuples (3d case)
         :param dimension: dimension of the problem
@@ -315,19 +320,133 @@ class FreeSurfaceTimeDependentEvaluation(FreeSurfaceEvaluation):
         :param runtime: runtime of the evaluation this data resulted from, in seconds
         :type runtime: int, optional
         """
-        self.data = data
-        self.times = times
+        self.data = np.asarray(data, dtype=np.float64)
+        self.times = np.asarray(times, dtype=np.float64)
         self.locations = locations
         self.dimension = dimension
         self.eval_id = eval_id
         self.parameters = parameters
         self.runtime = runtime
+        self._interpolationcache = None
+
+    def __getstate__(self):
+        # the interpolation cache can be recalculated, so do not pickle it
+        state = self.__dict__.copy()
+        state.pop("_interpolationcache", None)
+        return state
 
     @classmethod
     def parseBinary(cls, file, evaluation_id=-1, parameters=None, runtime=None):
         """ Factory method to parse a binary measurement file.
         This uses the format defined in fs_measurement.hpp in the d3f-plugin.
 
+        The file is read in one pass and decoded as array of fixed size records using a structured numpy dtype.
+        Times and locations are extracted with vectorized operations. Files not matching the fixed record layout
+        (unknown status bytes or a varying number of locations per time) are parsed with parseBinaryStream instead.
+
+        :param file: file to parse
+        :type file: string
+        :param evaluation_id: id of the evaluation this data resulted from
+        :type evaluation_id: int, optional
+        :param parameters: (transformed) parameters of the evaluation this data resulted from
+        :type parameters: numpy array, optional
+        :param runtime: runtime of the evaluation this data resulted from, in seconds
+        :type runtime: int, optional
+        """
+        buffer = np.fromfile(file, dtype=np.uint8)
+
+        if len(buffer) < 4:
+            return ErroredEvaluation(parameters, "Error parsing dimension.", evaluation_id, runtime)
+
+        dimension = int(buffer[:4].view("<i4")[0])
+
+        if dimension not in [2, 3]:
+            return ErroredEvaluation(parameters, "Error parsing dimension.", evaluation_id, runtime)
+
+        # status, time, location (1 or 2 doubles), value
+        recordtype = np.dtype([("status", "i1"), ("time", "<f8"), ("location", "<f8", (dimension - 1,)), ("value", "<f8")])
+        body = buffer[4:]
+        recordcount = len(body) // recordtype.itemsize
+        records = np.frombuffer(body, dtype=recordtype, count=recordcount)
+
+        # find the end of the measurement: the first record with another status than 1
+        notmeasurement = np.flatnonzero(records["status"] != 1)
+
+        if len(notmeasurement) > 0:
+            end = int(notmeasurement[0])
+            status = int(records["status"][end])
+        else:
+            end = recordcount
+            rest = body[recordcount * recordtype.itemsize:]
+            status = int(rest[:1].view("i1")[0]) if len(rest) > 0 else None
+
+        if status not in [None, 1, 2]:
+            return cls.parseBinaryStream(file, evaluation_id, parameters, runtime)
+
+        if status != 2:
+            return ErroredEvaluation(parameters, "UG run did not finish.", evaluation_id, runtime)
+
+        records = records[:end]
+
+        evaluation = cls.fromRecords(records["time"], records["location"], records["value"], dimension, evaluation_id, parameters, runtime)
+        if evaluation is None:
+            return cls.parseBinaryStream(file, evaluation_id, parameters, runtime)
+
+        return evaluation
+
+    @classmethod
+    def fromRecords(cls, times, locations, values, dimension, evaluation_id=-1, parameters=None, runtime=None):
+        """ Factory method constructing an evaluation from the flat measurement records, as they are stored
+        in the measurement files: one record per time and location, grouped by time.
+        Times and locations are used in the order of their first appearance.
+
+        :param times: time of each record
+        :type times: 1d numpy array
+        :param locations: location of each record
+        :type locations: 2d numpy array, with 1 (2d case) or 2 (3d case) columns
+        :param values: measured height of each record
+        :type values: 1d numpy array
+        :param dimension: dimension of the problem
+        :type dimension: int
+        :param evaluation_id: id of the evaluation this data resulted from
+        :type evaluation_id: int, optional
+        :param parameters: (transformed) parameters of the evaluation this data resulted from
+        :type parameters: numpy array, optional
+        :param runtime: runtime of the evaluation this data resulted from, in seconds
+        :type runtime: int, optional
+        :return: the constructed evaluation, or None, if not every time has the same number of records as there are locations.
+        :rtype: FreeSurfaceTimeDependentEvaluation
+        """
+        if len(values) == 0:
+            return cls([], [], [], dimension, evaluation_id, parameters, runtime)
+
+        # times and locations in order of their first appearance
+        _, firsttimes = np.unique(times, return_index=True)
+        firsttimes = np.sort(firsttimes)
+        _, firstlocations = np.unique(locations, axis=0, return_index=True)
+        firstlocations = np.sort(firstlocations)
+
+        if len(values) != len(firsttimes) * len(firstlocations) or np.any(np.diff(firsttimes) != len(firstlocations)):
+            return None
+
+        timelist = times[firsttimes].tolist()
+        if dimension == 2:
+            locationlist = locations[firstlocations, 0].tolist()
+        else:
+            locationlist = [tuple(l) for l in locations[firstlocations].tolist()]
+
+        data = np.array(values, dtype=np.float64).reshape((len(timelist), len(locationlist)))
+        if FreeSurfaceTimeDependentEvaluation.nanhandling == FreeSurfaceEvaluation.NaNHandling.replace:
+            data[np.isnan(data)] = FreeSurfaceTimeDependentEvaluation.nanreplacevalue
+
+        return cls(data, timelist, locationlist, dimension, evaluation_id, parameters, runtime)
+
+    @classmethod
+    def parseBinaryStream(cls, file, evaluation_id=-1, parameters=None, runtime=None):
+        """ Factory method to parse a binary measurement file record by record.
+        This uses the format defined in fs_measurement.hpp in the d3f-plugin.
+        Slower than parseBinary, but does not rely on the records having a fixed layout.
+
         :param file: file to parse
         :type file: string
         :param evaluation_id: id of the evaluation this data resulted from
@@ -382,6 +501,48 @@ class FreeSurfaceTimeDependentEvaluation(FreeSurfaceEvaluation):
         else:
             return ErroredEvaluation(parameters, "UG run did not finish.", evaluation_id, runtime)
 
+    @classmethod
+    def isFinished(cls, directory, evaluation_id):
+        """Cheaply checks if the measurement file of the evaluation with the given id has been written completely.
+        For binary files, this uses the fixed record size of the format: a finished file consists of
+        the dimension, complete records and the final status byte.
+
+        :param directory: directory to read the evaluation from
+        :type directory: string
+        :param evaluation_id: id of the evaluation to find the correct file fron directory
+        :type evaluation_id: int
+        :return: True if finished, False if not (yet)
+        :rtype: boolean
+        """
+        filenameBin = os.path.join(directory, str(evaluation_id) + "_measurement.bin")
+        filenameCSV = os.path.join(directory, str(evaluation_id) + "_measurement.csv")
+
+        if os.path.isfile(filenameBin):
+            try:
+                with open(filenameBin, "rb") as f:
+                    header = f.read(4)
+                    if len(header) < 4:
+                        return False
+                    dimension = struct.unpack("<i", header)[0]
+                    if dimension not in [2, 3]:
+                        # can not be parsed anyway, let the parser report the error
+                        return True
+                    # status, time, location (1 or 2 doubles), value
+                    recordsize = 1 + 8 * (dimension + 1)
+                    f.seek(0, os.SEEK_END)
+                    size = f.tell()
+                    if (size - 4) % recordsize != 1:
+                        return False
+                    f.seek(size - 1)
+                    return struct.unpack("<b", f.read(1))[0] == 2
+            except OSError:
+                return False
+
+        if os.path.isfile(filenameCSV):
+            return Evaluation.fileEndsWith(filenameCSV, b"FINISHED")
+
+        return False
+
     @classmethod
     def parse(cls, directory, evaluation_id, parameters=None, runtime=None):
         """ Factory method to parse a measurement file.
@@ -412,6 +573,49 @@ class FreeSurfaceTimeDependentEvaluation(FreeSurfaceEvaluation):
         """ Factory method to parse a csv measurement file.
         This uses the format defined in fs_measurement.hpp in the d3f-plugin.
 
+        The file is bulk loaded with numpy, in chunks if it is large. Files which can not be read this way
+        are parsed row by row using parseFromCSVRows.
+
+        :param filename: file to parse
+        :type filename: string
+        :param evaluation_id: id of the evaluation this data resulted from
+        :type evaluation_id: int, optional
+        :param parameters: (transformed) parameters of the evaluation this data resulted from
+        :type parameters: numpy array, optional
+        :param runtime: runtime of the evaluation this data resulted from, in seconds
+        :type runtime: int, optional
+        """
+        with open(filename) as csvfile:
+            header = csvfile.readline().rstrip("\n").split(",")
+
+        if "dim1" in header:
+            dimension = 3
+            locationcolumns = ["dim0", "dim1"]
+        elif "dim0" in header:
+            dimension = 2
+            locationcolumns = ["dim0"]
+        else:
+            return cls.parseFromCSVRows(filename, evaluation_id, parameters, runtime)
+
+        try:
+            columns, finished = cls.readCSVColumns(filename, ["time", "z"] + locationcolumns)
+        except ValueError:
+            return cls.parseFromCSVRows(filename, evaluation_id, parameters, runtime)
+
+        if not finished:
+            return ErroredEvaluation(parameters, "UG run did not finish.", evaluation_id, runtime)
+
+        evaluation = cls.fromRecords(columns[0], np.column_stack(columns[2:]), columns[1], dimension, evaluation_id, parameters, runtime)
+        if evaluation is None:
+            return cls.parseFromCSVRows(filename, evaluation_id, parameters, runtime)
+
+        return evaluation
+
+    @classmethod
+    def parseFromCSVRows(cls, filename, evaluation_id=-1, parameters=None, runtime=None):
+        """ Factory method to parse a csv measurement file row by row.
+        This uses the format defined in fs_measurement.hpp in the d3f-plugin.
+
         :param filename: file to parse
         :type filename: string
         :param evaluation_id: id of the evaluation this data resulted from
@@ -477,7 +681,7 @@ class FreeSurfaceTimeDependentEvaluation(FreeSurfaceEvaluation):
         :return: the constructed FreeSurfaceTimeDependentEvaluation
         :rtype: FreeSurfaceTimeDependentEvaluation
         """
-        data_reformatted = np.array(data).reshape((seriesformat.timeCount, seriesformat.locationCount)).tolist()
+        data_reformatted = np.array(data, dtype=np.float64).reshape((seriesformat.timeCount, seriesformat.locationCount))
         dim = 2
         if hasattr(seriesformat, "dimension"):
             dim = seriesformat.dimension
@@ -498,55 +702,45 @@ class FreeSurfaceTimeDependentEvaluation(FreeSurfaceEvaluation):
         if (not isinstance(target, FreeSurfaceEquilibriumEvaluation)) and (not isinstance(target, FreeSurfaceTimeDependentEvaluation)):
             raise Evaluation.IncompatibleFormatError("Target not compatible!")
 
+        targettimes = np.asarray(target.times, dtype=np.float64)
+        cachekey = (type(target), targettimes.tobytes(), np.asarray(target.locations, dtype=np.float64).tobytes())
+
+        cache = getattr(self, "_interpolationcache", None)
+        if cache is not None and cache[0] == cachekey:
+            return cache[1].copy()
+
         if not FreeSurfaceTimeDependentEvaluation.hasSameLocations(self, target):
             raise Evaluation.IncompatibleFormatError("Not the same locations!")
 
+        data = np.asarray(self.data, dtype=np.float64)
+
         if isinstance(target, FreeSurfaceEquilibriumEvaluation):
-            return np.array(self.data[-1])
+            array = np.array(data[-1])
 
         else:
-            array = np.zeros(len(target.times) * len(target.locations))
-            for i in range(len(target.times)):
-                targettime = target.times[i]
-
-                # find nearest entries in this instances time field
-                nearest_lower = 0
-
-                # first, find the time with the maximum index lower or equal to targettime
-                while True:
-                    if self.times[nearest_lower] == targettime:
-                        # found a perfect match!
-                        array[i * len(target.locations):((i + 1) * len(target.locations))] = self.data[nearest_lower]
-                        break
-
-                    if nearest_lower == self.timeCount - 1:
-                        # at the edge...
-                        array[i * len(target.locations):((i + 1) * len(target.locations))] = self.data[nearest_lower]
-                        break
-
-                    if self.times[nearest_lower] < targettime:
-                        if self.times[nearest_lower + 1] > targettime:
-                            # found it
-                            # interpolate
-                            higherdata = np.array(self.data[nearest_lower + 1])
-                            highertime = self.times[nearest_lower + 1]
-                            lowerdata = np.array(self.data[nearest_lower])
-                            lowertime = self.times[nearest_lower]
-
-                            percentage = ((targettime - lowertime) / (highertime - lowertime))
-                            interpolated = percentage * higherdata + (1 - percentage) * lowerdata
-
-                            array[i * len(target.locations):((i + 1) * len(target.locations))] = interpolated
-                            break
-                        else:
-                            nearest_lower += 1
-
-                    # if we are here, self.times[nearest_lower] > targettime....
-                    if nearest_lower == 0:
-                        array[i * len(target.locations):((i + 1) * len(target.locations))] = self.data[nearest_lower]
-                        break
-
-            return array
+            times = np.asarray(self.times, dtype=np.float64)
+
+            if len(times) == 1:
+                interpolated = np.repeat(data, len(targettimes), axis=0)
+            else:
+                # index of the time with the maximum index lower or equal to each targettime,
+                # restricted so there is always a higher neighbour to interpolate with
+                lower = np.clip(np.searchsorted(times, targettimes, side="right") - 1, 0, len(times) - 2)
+                higher = lower + 1
+
+                # target times out of the time frame are clamped to the first or last timestep
+                percentage = np.clip((targettimes - times[lower]) / (times[higher] - times[lower]), 0, 1)[:, np.newaxis]
+                interpolated = percentage * data[higher] + (1 - percentage) * data[lower]
+
+                # use the data directly for perfect matches and clamped entries
+                interpolated = np.where(percentage == 0, data[lower], interpolated)
+                interpolated = np.where(percentage == 1, data[higher], interpolated)
+
+            array = np.reshape(interpolated, -1)
+
+        self._interpolationcache = (cachekey, array)
+
+        return array.copy()
 
     def writeCSVAveragedOverLocation(self, filename):
         """Writes a tsv with a entry for every timestep measured. The entry will be the
@@ -41,16 +41,16 @@ class GenericEvaluation(Evaluation):
 
     """
 
-    data = []
-    times = []
+    data = np.zeros(0)
+    times = np.zeros(0)
 
     def __init__(self, data, times, eval_id=-1, parameters=None, runtime=None):
         """ Class constructor
 
         :param data: 1d array of numbers representing the measured for each timestep
-        :type data: list of numbers
+        :type data: list of numbers or numpy array
         :param times: the times measured (in simulation time)
-        :type times: list of numbers
+        :type times: list of numbers or numpy array
         :param eval_id: id of the evaluation this data resulted from
         :type eval_id: int, optional
         :param parameters: (transformed) parameters of the evaluation this data resulted from
@@ -58,8 +58,8 @@ class GenericEvaluation(Evaluation):
         :param runtime: runtime of the evaluation this data resulted from, in seconds
         :type runtime: int, optional
         """
-        self.data = data
-        self.times = times
+        self.data = np.asarray(data, dtype=np.float64)
+        self.times = np.asarray(times, dtype=np.float64)
         self.eval_id = eval_id
         self.parameters = parameters
         self.runtime = runtime
@@ -79,7 +79,7 @@ class GenericEvaluation(Evaluation):
         :return: stored measurements as a 1d numpy array
         :rtype: numpy array, 1d
         """
-        return np.array(self.data)
+        return np.array(self.data, dtype=np.float64)
 
     def getNumpyArrayLike(self, target):
         """Used to interpolate between different evaluations, when timestamps might differ because
@@ -95,52 +95,42 @@ class GenericEvaluation(Evaluation):
         if not isinstance(target, GenericEvaluation):
             raise Evaluation.IncompatibleFormatError("Target not compatible!")
 
-        array = np.zeros(target.timeCount)
-        for i in range(target.timeCount):
-            targettime = target.times[i]
+        # linear interpolation between the neighbouring timesteps.
+        # target times outside of the measured time frame are clamped to the first or last measurement.
+        return np.interp(np.asarray(target.times, dtype=np.float64),
+                         np.asarray(self.times, dtype=np.float64),
+                         np.asarray(self.data, dtype=np.float64))
 
-            # find nearest entries in this instances time list
-            nearest_lower = 0
-
-            # first, find the time with the maximum index lower or equal to targettime
-            while True:
-                if self.times[nearest_lower] == targettime:
-                    # found a perfect match!
-                    array[i] = self.data[nearest_lower]
-                    break
-
-                if nearest_lower == self.timeCount - 1:
-                    # at the edge...
-                    array[i] = self.data[nearest_lower]
-                    break
+    @classmethod
+    def fromCSV(cls, filename, evaluation_id=-1, parameters=None, runtime=None):
+        """Parses this evaluation from the csv format described.
+        The file is bulk loaded with numpy, in chunks if it is large. Files which can not be read this way
+        are parsed row by row using fromCSVRows.
 
-                if self.times[nearest_lower] < targettime:
-                    if self.times[nearest_lower + 1] > targettime:
-                        # found it
-                        # interpolate
-                        higherdata = np.array(self.data[nearest_lower + 1])
-                        highertime = self.times[nearest_lower + 1]
-                        lowerdata = np.array(self.data[nearest_lower])
-                        lowertime = self.times[nearest_lower]
-
-                        percentage = ((targettime - lowertime) / (highertime - lowertime))
-                        interpolated = percentage * higherdata + (1 - percentage) * lowerdata
-
-                        array[i] = interpolated
-                        break
-                    else:
-                        nearest_lower += 1
-
-                # if we are here, self.times[nearest_lower] > targettime....
-                if nearest_lower == 0:
-                    array[i] = self.data[nearest_lower]
-                    break
+        :param filename: file to parse
+        :type filename: string
+        :param evaluation_id: id of the evaluation this data resulted from
+        :type evaluation_id: int, optional
+        :param parameters: (transformed) parameters of the evaluation this data resulted from
+        :type parameters: numpy array, optional
+        :param runtime: runtime of the evaluation this data resulted from, in seconds
+        :type runtime: int, optional
+        :return: the parsed evaluation, or ErroredEvaluation if an error occurred.
+        :rtype: Evaluation
+        """
+        try:
+            (times, data), isfinished = cls.readCSVColumns(filename, ["time", "value"])
+        except ValueError:
+            return cls.fromCSVRows(filename, evaluation_id, parameters, runtime)
 
-        return array
+        if isfinished:
+            return cls(data, times, evaluation_id, parameters, runtime)
+        else:
+            return ErroredEvaluation(parameters, "Evaluation did not finish correctly", evaluation_id, runtime)
 
     @classmethod
-    def fromCSV(cls, filename, evaluation_id=-1, parameters=None, runtime=None):
-        """Parses this evaluation from the csv format described
+    def fromCSVRows(cls, filename, evaluation_id=-1, parameters=None, runtime=None):
+        """Parses this evaluation from the csv format described, row by row.
 
         :param filename: file to parse
         :type filename: string
@@ -154,7 +144,8 @@ class GenericEvaluation(Evaluation):
         :rtype: Evaluation
         """
 
-        parsedevaluation = cls([], [], evaluation_id, parameters, runtime)
+        data = []
+        times = []
 
         with open(filename) as csvfile:
             reader = csv.DictReader(csvfile)
@@ -172,11 +163,11 @@ class GenericEvaluation(Evaluation):
                 if row["value"] == "value" or row["time"] == "time":  # ignore header
                     continue
 
-                parsedevaluation.data.append(float(row["value"]))
-                parsedevaluation.times.append(float(row["time"]))
+                data.append(float(row["value"]))
+                times.append(float(row["time"]))
 
         if isfinished:
-            return parsedevaluation
+            return cls(data, times, evaluation_id, parameters, runtime)
         else:
             return ErroredEvaluation(parameters, "Evaluation did not finish correctly", evaluation_id, runtime)
 
@@ -213,16 +204,44 @@ class GenericEvaluation(Evaluation):
         if not parsedjson["metadata"]["finished"]:
             return ErroredEvaluation(parameters, "Evaluation did not finish correctly", evaluation_id, runtime)
 
-        parsedevaluation = cls([], [], evaluation_id, parameters, runtime)
+        data = []
+        times = []
 
         # parse data into internal arrays
         for element in parsedjson["data"]:
             if "value" not in element or "time" not in element:
                 return ErroredEvaluation(parameters, "Malformed data entry!", evaluation_id, runtime)
-            parsedevaluation.data.append(element["value"])
-            parsedevaluation.times.append(element["time"])
+            data.append(element["value"])
+            times.append(element["time"])
+
+        return cls(data, times, evaluation_id, parameters, runtime)
+
+    @classmethod
+    def isFinished(cls, directory, evaluation_id):
+        """Cheaply checks if the measurement file of the evaluation with the given id has been written completely.
+
+        :param directory: directory to read the evaluation from
+        :type directory: string
+        :param evaluation_id: id of the evaluation to find the correct file fron directory
+        :type evaluation_id: int
+        :return: True if finished, False if not (yet)
+        :rtype: boolean
+        """
+        filenameJson = os.path.join(directory, str(evaluation_id) + "_measurement.json")
+        filenameCSV = os.path.join(directory, str(evaluation_id) + "_measurement.csv")
+
+        if os.path.isfile(filenameCSV):
+            return Evaluation.fileEndsWith(filenameCSV, b"FINISHED")
+
+        if os.path.isfile(filenameJson):
+            try:
+                with open(filenameJson) as jsonfile:
+                    parsedjson = json.load(jsonfile)
+            except (OSError, json.JSONDecodeError):
+                return False
+            return parsedjson.get("metadata", {}).get("finished", False) is True
 
-        return parsedevaluation
+        return False
 
     @classmethod
     def parse(cls, directory, evaluation_id, parameters=None, runtime=None):
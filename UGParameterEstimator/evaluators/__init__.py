@@ -1,3 +1,8 @@
+from .evaluationStore import *
+from .retryPolicy import *
 from .evaluator import *
 from .clusterEvaluator import *
 from .localEvaluator import *
+from .pilotEvaluator import *
+from .workerPool import *
+from .workerEvaluator import *
@@ -2,10 +2,14 @@ import subprocess
 import os
 import io
 import time
+import re
 import csv
+import threading
+from concurrent.futures import Future
 from shutil import copyfile
 from UGParameterEstimator import ParameterManager, Evaluation, ParameterOutputAdapter, ErroredEvaluation
 from .evaluator import Evaluator
+from .evaluationStore import EvaluationStore
 
 
 class ClusterEvaluator(Evaluator):
@@ -19,7 +23,50 @@ class ClusterEvaluator(Evaluator):
 
     Output of UG4 is redirected into a separate <id>_ug_output.txt file.
 
+    Finished jobs are detected by polling the exchange directory every pollinterval seconds for completely
+    written measurement files, and are parsed as soon as they finish. UGINFO is only called every uginfointerval seconds
+    to detect jobs that left the queue without finishing.
+
+    Jobs are submitted back to back, one job per evaluation. Only if the scheduler rejects a submission, it is retried
+    with an adaptive delay, accepted submissions are never delayed. The submission throughput is written to the metadata of the result object.
+    To submit a whole batch of evaluations in one scheduler interaction, use the PilotEvaluator: it submits a single job
+    fanning out to the evaluations (with a small idletimeout, one job per batch).
+
+    Supports asynchronous evaluations (see Evaluator.submit). Submitted jobs are watched by a background thread,
+    cancelled jobs are removed from the queue using UGCANCEL. This is also done for jobs exceeding their timeout
+    (see Evaluator.getTimeout). Like the runtime of the evaluations, it is measured from the moment the job is seen running
+    by uginfo, so time waiting in the queue does not count. While a timeout is set and jobs are pending, uginfo is called every
+    runninginterval seconds to detect started jobs. Failed jobs are resubmitted by the background thread, if the retry
+    policy decides so (see Evaluator.setRetryPolicy). The exit status of jobs is not known, only their output is used.
+
     """
+
+    asynchronous = True
+
+    pollinterval = 0.5
+    uginfointerval = 30
+    runninginterval = 5
+
+    # adaptive delay between submissions, only used when the scheduler rejects submissions
+    submitdelay = 0
+    minsubmitdelay = 0.5
+    maxsubmitdelay = 30
+    submitretries = 5
+
+    # regular expressions in the output of UGSUBMIT marking a submission the scheduler rejected
+    submitrejectionpatterns = [
+        r"QOSMaxSubmitJob",
+        r"AssocMaxSubmitJob",
+        r"[Ss]ubmission failed",
+        r"Resource temporarily unavailable",
+        r"[Tt]ry again later",
+        r"Socket timed out",
+    ]
+
+    submission_count = 0
+    submission_time = 0
+    submission_backoff_count = 0
+
     def __init__(self, luafilename, directory, parametermanager: ParameterManager, evaluation_type, parameter_output_adapter: ParameterOutputAdapter, fixedparameters={}, threadcount=10, cliparameters=[], ugsubmitparameters=[]):
         """Class constructor
 
@@ -49,11 +96,20 @@ class ClusterEvaluator(Evaluator):
         self.evaluation_type = evaluation_type
         self.parameter_output_adapter = parameter_output_adapter
         self.threadcount = threadcount
-        self.jobids = []
         self.luafilename = luafilename
         self.cliparameters = cliparameters
         self.ugsubmitparameters = ugsubmitparameters
 
+        # tuple (evaluation id, job id, parameters, start time, call parameters, retries so far) of each unfinished job by its future,
+        # guarded by joblock
+        self.jobs = {}
+
+        # futures of the jobs seen running, guarded by joblock. their start time is the time they were first seen running
+        self.runningjobs = set()
+        self.joblock = threading.Lock()
+        self.monitor = None
+        self.runtimes = []
+
         if not os.path.exists(self.directory):
             os.mkdir(self.directory)
 
@@ -70,6 +126,16 @@ class ClusterEvaluator(Evaluator):
         """
         return self.threadcount
 
+    def getFingerprint(self):
+        """Returns a fingerprint of the luafile, the command line parameters, the fixed parameters and the evaluation type.
+        Used to separate the entries of different setups in the persistent cache.
+
+        :return: fingerprint of this evaluator
+        :rtype: string
+        """
+        parameternames = [p.name for p in self.parametermanager.parameters]
+        return EvaluationStore.getFingerprint(self.luafilename, self.cliparameters, self.fixedparameters, self.evaluation_type, parameternames)
+
     def evaluate(self, evaluationlist, transform=True, tag=""):
         """Evaluates the parameters given in evaluationlist using UG4, and the adapters set in the constructor.
 
@@ -82,146 +148,450 @@ class ClusterEvaluator(Evaluator):
         :return: list of parsed evaluation objects with the type given in the constructor, or ErroredEvaluation
         :rtype: list of Evaluation
         """
-        results = [None] * len(evaluationlist)
-        self.jobids = [None] * len(evaluationlist)
-        evaluationids = [None] * len(evaluationlist)
-        beta = [None] * len(evaluationlist)
-        starttimes = [None] * len(evaluationlist)
+        return self.collect(self.submit(evaluationlist, transform), tag)
 
-        for j in range(len(evaluationlist)):
+    def startEvaluation(self, parameters):
+        """Submits the job of a single evaluation and hands it over to the background thread watching the jobs.
 
-            beta_j = evaluationlist[j]
+        :param parameters: the (transformed) parameters to evaluate
+        :type parameters: numpy array
+        :return: future resulting in the parsed evaluation object or ErroredEvaluation
+        :rtype: concurrent.futures.Future
+        """
+        absolute_directory_path = os.getcwd() + "/" + self.directory
+        absolute_script_path = os.getcwd() + "/" + self.luafilename
+
+        if not os.path.isfile(absolute_script_path):
+            print("Luafile not found! " + absolute_script_path)
+            exit()
+        if not os.path.exists(absolute_directory_path):
+            print("Exchange directory not found! " + absolute_directory_path)
+            exit()
+
+        evaluation_id = self.id
+        callParameters = self.getCallParameters(evaluation_id, absolute_script_path, absolute_directory_path)
+
+        # output the parameters however needed for the application
+        self.parameter_output_adapter.writeParameters(self.directory, self.id, self.parametermanager, parameters, self.fixedparameters)
+
+        self.id += 1
+
+        starttime = time.time()
+        jobid = self.submitEvaluation(evaluation_id, callParameters)
+
+        future = Future()
+        future.parameters = parameters
+        future.evaluation_id = evaluation_id
+
+        # jobs without job id could not be submitted, there is nothing to wait for
+        if jobid is None:
+            data = self.parseResult(evaluation_id, jobid, parameters, time.time() - starttime)
+            if isinstance(data, ErroredEvaluation):
+                data.transient = True
+            future.set_result(data)
+            return future
+
+        with self.joblock:
+            self.jobs[future] = (evaluation_id, jobid, parameters, starttime, callParameters, 0)
+            if self.monitor is None:
+                self.monitor = threading.Thread(target=self.watchJobs, daemon=True)
+                self.monitor.start()
+
+        return future
+
+    def getCallParameters(self, evaluation_id, scriptpath, directorypath):
+        """Assembles the command line submitting the job of an evaluation.
+
+        :param evaluation_id: id of the evaluation
+        :type evaluation_id: int
+        :param scriptpath: absolute path of the luafile
+        :type scriptpath: string
+        :param directorypath: absolute path of the exchange directory
+        :type directorypath: string
+        :return: the command line
+        :rtype: list of strings
+        """
+        callParameters = ["ugsubmit", str(self.threadcount)]
 
-            if transform:
-                beta[j] = self.parametermanager.getTransformedParameters(beta_j)
-                if beta[j] is None:
-                    results[j] = ErroredEvaluation(None, reason="Infeasible parameters")
-            else:
-                beta[j] = beta_j
+        callParameters += self.ugsubmitparameters
 
-            if results[j] is None:
-                results[j] = self.checkCache(beta[j])
+        callParameters += ["---", "ugshell", "-ex", scriptpath, "-evaluationId", str(evaluation_id), "-communicationDir", directorypath]
 
-        for j in range(len(evaluationlist)):
+        callParameters += self.cliparameters
 
-            if results[j] is not None:
-                continue
+        return callParameters
 
-            starttimes[j] = time.time()
+    def submitEvaluation(self, evaluation_id, callParameters):
+        """Submits the job of an evaluation, or resubmits it when retried, and records the submission throughput.
 
-            absolute_directory_path = os.getcwd() + "/" + self.directory
-            absolute_script_path = os.getcwd() + "/" + self.luafilename
+        :param evaluation_id: id of the evaluation
+        :type evaluation_id: int
+        :param callParameters: the command line returned by getCallParameters
+        :type callParameters: list of strings
+        :return: the job id, or None, if the job could not be submitted
+        :rtype: int
+        """
+        starttime = time.time()
+        jobid = self.submitJob(callParameters)
 
-            if not os.path.isfile(absolute_script_path):
-                print("Luafile not found! " + absolute_script_path)
-                exit()
-            if not os.path.exists(absolute_directory_path):
-                print("Exchange directory not found! " + absolute_directory_path)
-                exit()
+        self.submission_count += 1
+        self.submission_time += time.time() - starttime
+        if self.resultobj is not None:
+            self.resultobj.addRunMetadata("evaluator_submissioncount", self.submission_count)
+            self.resultobj.addRunMetadata("evaluator_submissiontime", self.submission_time)
+            self.resultobj.addRunMetadata("evaluator_submissionthroughput", self.submission_count / max(self.submission_time, 1e-9))
+            self.resultobj.addRunMetadata("evaluator_submissionbackoffs", self.submission_backoff_count)
 
-            callParameters = ["ugsubmit", str(self.threadcount)]
+        return jobid
 
-            callParameters += self.ugsubmitparameters
+    def watchJobs(self):
+        """Main loop of the background thread watching the submitted jobs, until no job is left.
 
-            callParameters += ["---", "ugshell", "-ex", absolute_script_path, "-evaluationId", str(self.id), "-communicationDir", absolute_directory_path]
+        Finished jobs are detected by their completely written measurement files and parsed immediately.
+        uginfo is only called as slow fallback, to find jobs which left the queue without finishing.
 
-            callParameters += self.cliparameters
+        If watching the jobs fails, all outstanding futures are resolved with the exception, so nobody waits for them forever.
+        """
+        try:
+            self.watchJobsLoop()
+        except Exception as e:
+            print("Watching the jobs failed: " + repr(e))
+            with self.joblock:
+                jobs = self.jobs
+                self.jobs = {}
+                self.runningjobs = set()
+                self.monitor = None
+            for future in jobs:
+                if not future.done():
+                    future.set_exception(e)
+        finally:
+            with self.joblock:
+                if self.monitor is threading.current_thread():
+                    self.monitor = None
+
+    def watchJobsLoop(self):
+        """Loop of watchJobs, returns when no job is left.
+        """
+        lastuginfo = time.time()
 
-            evaluationids[j] = self.id
+        while True:
+            with self.joblock:
+                if not self.jobs:
+                    self.monitor = None
+                    return
+                jobs = list(self.jobs.items())
+
+            finished = []
+            notification = True
+            for future, job in jobs:
+                state = self.getJobState(future, job)
+                if state is None:
+                    notification = False
+                elif state:
+                    finished.append(future)
+
+            timeout = self.getTimeout()
+            uginfointerval = self.uginfointerval if notification else 5
+            with self.joblock:
+                pending = any(future not in self.runningjobs for future, job in jobs)
+            if timeout is not None and pending:
+                uginfointerval = min(uginfointerval, self.runninginterval)
+
+            if time.time() - lastuginfo >= uginfointerval:
+                lastuginfo = time.time()
+                jobstates = self.getJobStates()
+
+                # without a readable job table, no job can be considered lost
+                if jobstates is not None:
+                    for future in self.findRunningJobs(jobs, jobstates):
+                        self.markRunning(future)
+                    activejobids = set(jobid for jobid, state in jobstates.items() if state in ["RUNNING", "PENDING"])
+                    finished += [future for future in self.findLostJobs(jobs, activejobids) if future not in finished]
+
+            for future in finished:
+                try:
+                    self.finishJob(future)
+                except Exception as e:
+                    print("Finishing job of evaluation " + str(future.evaluation_id) + " failed: " + repr(e))
+                    with self.joblock:
+                        self.jobs.pop(future, None)
+                        self.runningjobs.discard(future)
+                    if not future.done():
+                        future.set_exception(e)
+
+            if timeout is not None:
+                with self.joblock:
+                    jobs = [(future, job) for future, job in self.jobs.items() if future in self.runningjobs]
+                for future, job in jobs:
+                    if future not in finished and time.time() - job[3] > timeout:
+                        self.stopJob(future, timeout)
+
+            if len(finished) == 0:
+                time.sleep(self.pollinterval)
+
+    def getJobState(self, future, job):
+        """Cheaply checks whether a job has finished, by its measurement file.
+
+        :param future: the future of the job
+        :type future: concurrent.futures.Future
+        :param job: the job tuple (evaluation id, job id, parameters, start time, call parameters, retries so far)
+        :type job: tuple
+        :return: True if finished, False if not (yet), None if this can not be detected from the measurement file
+        :rtype: boolean
+        """
+        return self.evaluation_type.isFinished(self.directory, job[0])
 
-            # output the parameters however needed for the application
-            self.parameter_output_adapter.writeParameters(self.directory, self.id, self.parametermanager, beta[j], self.fixedparameters)
+    def findRunningJobs(self, jobs, jobstates):
+        """Returns the jobs uginfo reports as running.
 
-            self.id += 1
+        :param jobs: the unfinished jobs
+        :type jobs: list of tuples (future, job tuple)
+        :param jobstates: state of each job in the job table of uginfo, by job id
+        :type jobstates: dictionary<int, string>
+        :return: futures of the running jobs
+        :rtype: list of concurrent.futures.Future
+        """
+        return [future for future, job in jobs if jobstates.get(job[1]) == "RUNNING"]
 
-            # submit the job and parse the received id
-            process = subprocess.Popen(callParameters, stdout=subprocess.PIPE)
-            process.wait()
+    def markRunning(self, future):
+        """Records that a job was seen running for the first time, which starts the clock for its runtime and timeout.
 
-            for line in io.TextIOWrapper(process.stdout, encoding="UTF-8"):
-                if line.startswith("Received job id"):
-                    self.jobids[j] = int(line.split(" ")[3])
+        :param future: the future of the job
+        :type future: concurrent.futures.Future
+        """
+        with self.joblock:
+            if future in self.jobs and future not in self.runningjobs:
+                self.runningjobs.add(future)
+                self.updateJob(future, starttime=time.time())
 
-            # to avoid bugs with the used scheduler on cesari
-            time.sleep(1)
+    def updateJob(self, future, **changes):
+        """Replaces entries of the tuple of an unfinished job. joblock has to be held by the caller.
 
-        while True:
+        :param future: the future of the job
+        :type future: concurrent.futures.Future
+        :param changes: new values for jobid and/or starttime
+        """
+        job = self.jobs.get(future)
+        if job is not None:
+            evaluation_id, jobid, parameters, starttime, callParameters, attempt = job
+            self.jobs[future] = (evaluation_id, changes.get("jobid", jobid), parameters, changes.get("starttime", starttime), callParameters, attempt)
+
+    def findLostJobs(self, jobs, activejobids):
+        """Returns the jobs which left the queue without finishing.
+
+        :param jobs: the unfinished jobs
+        :type jobs: list of tuples (future, job tuple)
+        :param activejobids: ids of the jobs still running or pending, according to uginfo
+        :type activejobids: set of int
+        :return: futures of the lost jobs
+        :rtype: list of concurrent.futures.Future
+        """
+        return [future for future, job in jobs if job[1] not in activejobids]
 
-            # wait until all jobs are finished
-            # for this, call uginfo and parse the output
-            process = subprocess.Popen(["uginfo"], stdout=subprocess.PIPE)
-            process.wait()
-            lines = io.TextIOWrapper(process.stdout, encoding="UTF-8").readlines()
-            while True:
-                if "JOBID" not in lines[0]:
-                    lines.remove(lines[0])
-                else:
-                    break
+    def finishJob(self, future):
+        """Parses the result of a finished job and sets it as result of its future.
 
-            reader = csv.DictReader(lines, delimiter=" ", skipinitialspace=True)
+        :param future: the future of the job
+        :type future: concurrent.futures.Future
+        """
+        with self.joblock:
+            job = self.jobs.pop(future, None)
+            self.runningjobs.discard(future)
 
-            # are all of our jobs finished?
-            finished = True
+        # the job was cancelled in the meantime
+        if job is None:
+            return
 
-            for row in reader:
-                jobid = int(row["JOBID"])
-                if (jobid in self.jobids) and (row["STATE"] == "RUNNING" or row["STATE"] == "PENDING"):
-                    finished = False
-                    break
+        evaluation_id, jobid, parameters, starttime, callParameters, attempt = job
+        data = self.parseResult(evaluation_id, jobid, parameters, time.time() - starttime)
+        if not isinstance(data, ErroredEvaluation):
+            self.recordRuntime(data.runtime)
 
-            if finished:
-                break
+        elif not getattr(future, "cancelrequested", False) and self.checkRetry(data, evaluation_id, attempt):
+            jobid = self.submitEvaluation(evaluation_id, callParameters)
+            if jobid is not None:
+                with self.joblock:
+                    self.jobs[future] = (evaluation_id, jobid, parameters, time.time(), callParameters, attempt + 1)
+                return
 
-            time.sleep(5)
+        future.set_result(data)
 
-        # now we can parse the measurement files
-        for i in range(len(evaluationlist)):
+    def cancelEvaluation(self, future):
+        """Cancels a job using ugcancel.
 
-            if results[i] is not None:
-                continue
+        :param future: the future returned by startEvaluation
+        :type future: concurrent.futures.Future
+        """
+        self.stopJob(future)
 
-            # parse the result
-            data = self.evaluation_type.parse(self.directory, evaluationids[i], beta[i], time.time() - starttimes[i])
+    def stopJob(self, future, timeout=None):
+        """Removes a job from the queue using ugcancel, and sets an ErroredEvaluation as result of its future.
 
-            # preserve the association between the ugoutput and th einternal avaluation id.
-            # this allows for better debugging
-            stdoutfile = os.path.join(self.directory, str(evaluationids[i]) + "_ug_output.txt")
-            copyfile("jobid." + str(self.jobids[i]) + "/job.output", stdoutfile)
+        :param future: the future of the job
+        :type future: concurrent.futures.Future
+        :param timeout: the exceeded timeout, if the job is stopped because of it
+        :type timeout: float, optional
+        """
+        with self.joblock:
+            job = self.jobs.pop(future, None)
+            self.runningjobs.discard(future)
 
-            results[i] = data
+        # the job finished in the meantime
+        if job is None:
+            return
 
-        self.handleNewEvaluations(results, tag)
-        self.jobids.clear()
+        evaluation_id, jobid, parameters, starttime, callParameters, attempt = job
 
-        return results
+        # the future is resolved in any case, even if the job could not be removed from the queue
+        try:
+            self.removeJob(job)
+        except OSError as e:
+            print("Could not cancel job " + str(jobid) + ": " + repr(e))
 
-    def __enter__(self):
-        pass
+        runtime = time.time() - starttime
+        if timeout is None:
+            future.set_result(ErroredEvaluation(parameters, reason="Cancelled", eval_id=evaluation_id, runtime=runtime))
+        else:
+            future.set_result(self.getTimeoutEvaluation(parameters, evaluation_id, runtime, timeout))
 
-    def __exit__(self, type, value, traceback):
+    def removeJob(self, job):
+        """Removes a job from the queue using ugcancel.
 
-        # make sure all (of our) jobs are cancelled or finished when the evaluation is finished
+        :param job: the job tuple (evaluation id, job id, parameters, start time, call parameters, retries so far)
+        :type job: tuple
+        """
+        print("Cancelling " + str(job[1]))
+        process = subprocess.Popen(["ugcancel", str(job[1])], stdout=subprocess.PIPE)
+        process.wait()
 
-        if not self.jobids:
-            return None
+    def submitJob(self, callParameters):
+        """Submits a job using UGSUBMIT and returns its job id.
+
+        Jobs are submitted without any fixed delay. Only if the scheduler pushes back (UGSUBMIT prints no job id,
+        but one of submitrejectionpatterns), the submission is retried after an exponentially growing delay,
+        which decays again with every successful submission.
+        If a job id was printed, it is returned even if UGSUBMIT failed, and other failures are not retried,
+        as the job might have been submitted anyway and would run twice.
+
+        :param callParameters: the command line to execute
+        :type callParameters: list of strings
+        :return: the job id, or None, if the job could not be submitted
+        :rtype: int
+        """
+        for attempt in range(self.submitretries + 1):
+
+            if self.submitdelay > 0:
+                time.sleep(self.submitdelay)
 
-        # call uginfo to find out which jobs are still running
+            process = subprocess.Popen(callParameters, stdout=subprocess.PIPE, stderr=subprocess.STDOUT)
+            output = io.TextIOWrapper(process.stdout, encoding="UTF-8").readlines()
+            returncode = process.wait()
+
+            jobid = None
+            for line in output:
+                if line.startswith("Received job id"):
+                    jobid = int(line.split(" ")[3])
+
+            if jobid is not None:
+                if returncode != 0:
+                    print("UGSUBMIT exited with status " + str(returncode) + ", but submitted job " + str(jobid))
+
+                # the scheduler accepted the job, so slowly decrease the delay
+                self.submitdelay = self.submitdelay / 2 if self.submitdelay > self.minsubmitdelay else 0
+                return jobid
+
+            if not any(re.search(pattern, line) for pattern in self.submitrejectionpatterns for line in output):
+                print("Submission failed with status " + str(returncode) + ":\n" + "".join(output))
+                return None
+
+            # the scheduler pushed back, so increase the delay
+            self.submission_backoff_count += 1
+            self.submitdelay = min(self.maxsubmitdelay, max(self.minsubmitdelay, 2 * self.submitdelay))
+            print("Submission failed, retrying in " + str(self.submitdelay) + "s")
+
+        return None
+
+    def parseResult(self, evaluation_id, jobid, parameters, runtime):
+        """Parses the result of a finished job and copies the output of UG4 into the exchange directory.
+
+        :param evaluation_id: id of the evaluation
+        :type evaluation_id: int
+        :param jobid: id of the job in the scheduler
+        :type jobid: int
+        :param parameters: the (transformed) parameters of the evaluation
+        :type parameters: numpy array
+        :param runtime: runtime of the evaluation, in seconds
+        :type runtime: number
+        :return: the parsed evaluation
+        :rtype: Evaluation
+        """
+        data = self.evaluation_type.parse(self.directory, evaluation_id, parameters, runtime)
+        if data is None:
+            data = ErroredEvaluation(parameters, reason="Error while parsing.", eval_id=evaluation_id, runtime=runtime)
+
+        # preserve the association between the ugoutput and th einternal avaluation id.
+        # this allows for better debugging
+        # the job output might not be written yet, if the job was detected finished by its measurement file
+        joboutput = "jobid." + str(jobid) + "/job.output"
+        if os.path.isfile(joboutput):
+            stdoutfile = os.path.join(self.directory, str(evaluation_id) + "_ug_output.txt")
+            copyfile(joboutput, stdoutfile)
+
+        return data
+
+    @staticmethod
+    def readJobTable():
+        """Calls uginfo and parses its job table.
+
+        :return: one dictionary per job, with the columns of the uginfo table as keys, or None if uginfo printed no job table
+        :rtype: list of dictionaries
+        """
         process = subprocess.Popen(["uginfo"], stdout=subprocess.PIPE)
-        process.wait()
-        lines = io.TextIOWrapper(process.stdout, encoding="UTF-8").readlines()
-        while True:
-            if "JOBID" not in lines[0]:
-                lines.remove(lines[0])
-            else:
-                break
+        output, _ = process.communicate()
+        lines = output.decode("UTF-8", errors="replace").splitlines()
+        while lines and "JOBID" not in lines[0]:
+            lines.pop(0)
+
+        if not lines:
+            return None
+
+        return list(csv.DictReader(lines, delimiter=" ", skipinitialspace=True))
+
+    def getJobStates(self):
+        """Returns the state of all jobs listed by uginfo.
+
+        :return: state of each job by its id, or None if uginfo printed no job table
+        :rtype: dictionary<int, string>
+        """
+        table = self.readJobTable()
+        if table is None:
+            return None
+
+        # rows not matching the header (e.g. garbled lines) are skipped
+        return dict((int(row["JOBID"]), row.get("STATE")) for row in table if (row.get("JOBID") or "").isdigit())
+
+    def getActiveJobIds(self):
+        """Returns the ids of all jobs which are still running or pending, according to uginfo.
+
+        :return: ids of the active jobs, or None if uginfo printed no job table
+        :rtype: set of int
+        """
+        jobstates = self.getJobStates()
+        if jobstates is None:
+            return None
+        return set(jobid for jobid, state in jobstates.items() if state in ["RUNNING", "PENDING"])
+
+    def __enter__(self):
+        pass
+
+    def __exit__(self, type, value, traceback):
 
-        reader = csv.DictReader(lines, delimiter=" ", skipinitialspace=True)
+        # evaluations submitted asynchronously may outlive the with block, unless it is left by an exception
+        if type is None:
+            return
 
-        for row in reader:
-            jobid = int(row["JOBID"])
-            if jobid in self.jobids:
-                print("Cancelling " + str(jobid))
+        # make sure all (of our) jobs are cancelled when the evaluation was interrupted
+        with self.joblock:
+            futures = list(self.jobs.keys())
 
-                # cancel them using ugcancel
-                process2 = subprocess.Popen(["ugcancel", str(jobid)], stdout=subprocess.PIPE)
-                process2.wait()
+        self.cancel(futures)
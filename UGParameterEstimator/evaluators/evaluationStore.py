@@ -0,0 +1,113 @@
+import os
+import pickle
+import hashlib
+import tempfile
+
+
+class EvaluationStore:
+    """Persistent on-disk store for parsed evaluations, used as a second level cache by the evaluators.
+
+    Every evaluation is stored in its own pickle file, named by a hash of the fingerprint of the evaluator setup
+    (lua file, command line parameters, fixed parameters, ...) and the parameters of the evaluation.
+    Files are written to a temporary file first and then atomically renamed, so multiple optimizer processes can
+    share one store on the same filesystem without locking. This allows to resume or repeat calibrations without
+    rerunning the simulations.
+
+    :param directory: directory to store the evaluations in. will be created if not yet existant.
+    :type directory: string
+    """
+
+    def __init__(self, directory):
+        """Class constructor
+
+        :param directory: directory to store the evaluations in. will be created if not yet existant.
+        :type directory: string
+        """
+        self.directory = directory
+        os.makedirs(self.directory, exist_ok=True)
+
+    @staticmethod
+    def getFingerprint(luafile, cliparameters, fixedparameters, evaluation_type, parameternames=[]):
+        """Calculates a fingerprint of everything besides the parameters that influences the result of an evaluation.
+
+        :param luafile: path to the luafile called for every evaluation. its content is part of the fingerprint.
+        :type luafile: string
+        :param cliparameters: list of command line parameters passed to ug
+        :type cliparameters: list of strings
+        :param fixedparameters: dictionary of fixed parameters passed to ug
+        :type fixedparameters: dictionary<string, string|number>
+        :param evaluation_type: TYPE the evaluations are parsed as
+        :type evaluation_type: type implementing Evaluation
+        :param parameternames: names of the parameters, in the order they are passed to ug
+        :type parameternames: list of strings, optional
+        :return: the fingerprint, as hex string
+        :rtype: string
+        """
+        hasher = hashlib.sha256()
+        hasher.update(str(luafile).encode())
+        if luafile is not None and os.path.isfile(luafile):
+            with open(luafile, "rb") as f:
+                hasher.update(f.read())
+        hasher.update(repr(list(cliparameters)).encode())
+        hasher.update(repr(sorted((str(k), repr(v)) for k, v in fixedparameters.items())).encode())
+        hasher.update(evaluation_type.__name__.encode())
+        hasher.update(repr(list(parameternames)).encode())
+        return hasher.hexdigest()
+
+    def getFilename(self, fingerprint, key):
+        """Returns the file an evaluation is stored in.
+
+        :param fingerprint: fingerprint of the evaluator setup
+        :type fingerprint: string
+        :param key: cache key of the parameters of the evaluation
+        :type key: bytes
+        :return: path of the file
+        :rtype: string
+        """
+        hasher = hashlib.sha256(fingerprint.encode())
+        hasher.update(key)
+        return os.path.join(self.directory, hasher.hexdigest() + ".pkl")
+
+    def load(self, fingerprint, key):
+        """Loads an evaluation from the store.
+
+        :param fingerprint: fingerprint of the evaluator setup
+        :type fingerprint: string
+        :param key: cache key of the parameters of the evaluation
+        :type key: bytes
+        :return: the stored evaluation, or None, if there is none
+        :rtype: Evaluation
+        """
+        try:
+            with open(self.getFilename(fingerprint, key), "rb") as f:
+                storedfingerprint, storedkey, evaluation = pickle.load(f)
+        except (OSError, EOFError, ValueError, pickle.UnpicklingError):
+            return None
+
+        if storedfingerprint != fingerprint or storedkey != key:
+            return None
+
+        return evaluation
+
+    def store(self, fingerprint, key, evaluation):
+        """Stores an evaluation. Existing entries will be replaced.
+
+        :param fingerprint: fingerprint of the evaluator setup
+        :type fingerprint: string
+        :param key: cache key of the parameters of the evaluation
+        :type key: bytes
+        :param evaluation: evaluation to store
+        :type evaluation: Evaluation
+        """
+        filedescriptor, temporaryfile = tempfile.mkstemp(dir=self.directory, suffix=".tmp")
+        try:
+            with os.fdopen(filedescriptor, "wb") as f:
+                pickle.dump((fingerprint, key, evaluation), f)
+            os.replace(temporaryfile, self.getFilename(fingerprint, key))
+        except BaseException:
+            if os.path.exists(temporaryfile):
+                os.remove(temporaryfile)
+            raise
+
+    def __len__(self):
+        return len([f for f in os.listdir(self.directory) if f.endswith(".pkl")])
@@ -1,8 +1,12 @@
 import numpy as np
 import math
 import os
+import time
 from abc import ABC, abstractmethod
+from concurrent.futures import Future
 from UGParameterEstimator import ParameterManager, Evaluation, ParameterOutputAdapter, ErroredEvaluation
+from .evaluationStore import EvaluationStore
+from .retryPolicy import RetryPolicy
 
 
 class Evaluator(ABC):
@@ -11,13 +15,68 @@ class Evaluator(ABC):
     Defines the interface for evaluators.
     Implements a cache to avoid unnecessary evaluations.
 
+    The cache is indexed by the (transformed) parameters of the evaluations, so lookups
+    take constant time. If cache_tolerance is set to a value > 0, parameters are rounded to this
+    relative precision before being used as key, so nearly identical parameters are also served from the cache.
+
+    Optionally, an EvaluationStore can be set as persistent cache. It is consulted when the in-memory cache
+    misses and receives all successful evaluations, so they survive the end of the process. Evaluations loaded from
+    the store get a new eval_id from id, the counter of this evaluator, as their old one was assigned by another process.
+
+    Single evaluations can be stopped after a fixed timeout, or after timeout_factor times the median runtime
+    of the successfully finished evaluations (once timeout_minsamples of them are known), to keep stragglers from
+    blocking a whole batch. Stopped evaluations result in an ErroredEvaluation with a reason starting with "Timeout".
+
+    Failed evaluations can be resubmitted automatically, if a RetryPolicy is set (see setRetryPolicy).
+    Each retry is logged and recorded in the metadata of the result object. Timeouts and failures classified as
+    transient (by the retry policy, or by the default RetryPolicy if none is set) are not cached, so the same parameters
+    are evaluated again when requested again.
+
+    Evaluators setting asynchronous to True also support starting evaluations without waiting for them:
+    submit returns a concurrent.futures.Future per parameter set, which can be waited for using
+    concurrent.futures.as_completed or wait. Evaluations which are no longer needed can be stopped with cancel.
+    Every submitted batch has to be passed to collect, which adds the new evaluations to the cache and the result object.
+    evaluate is the same as collect(submit(...)) for these evaluators.
+
     """
 
     resultobj = None
     total_evaluation_count = 0
     serial_evaluation_count = 0
     cached_evaluation_count = 0
-    cache = set()
+    cache_miss_count = 0
+    cache_lookup_time = 0
+    cache_tolerance = 0
+    cache = {}
+    persistentcache = None
+    persistent_cache_hits = 0
+
+    # result of getFingerprint, and the fixed and command line parameters it was calculated for
+    fingerprint = None
+    fingerprintparameters = None
+    reused_evaluation_count = 0
+    asynchronous = False
+
+    # id of the next evaluation
+    id = 0
+
+    # maximum runtime of a single evaluation in seconds, None for no limit
+    timeout = None
+
+    # maximum runtime of a single evaluation as multiple of the median runtime, None for no limit
+    timeout_factor = None
+    timeout_minsamples = 5
+    timeout_count = 0
+
+    # runtimes of the successfully finished evaluations
+    runtimes = None
+
+    # policy deciding which failed evaluations are resubmitted, None to never resubmit
+    retrypolicy = None
+
+    # one dictionary per resubmission, and the number of them already logged to the result object
+    retries = None
+    logged_retry_count = 0
 
     @property
     @abstractmethod
@@ -44,6 +103,225 @@ class Evaluator(ABC):
         """
         pass
 
+    def submit(self, evaluationlist, transform=True):
+        """Starts the evaluation of the given parameter sets, without waiting for them to finish.
+        Cached and infeasible parameter sets get an already finished future.
+
+        :param evaluationlist: parametersets to evaluate
+        :type evaluationlist: list of numpy arrays
+        :param transform: wether to transform the parameters with parametermanager set in this object, defaults to true
+        :type transform: boolean, optional
+        :return: one future per parameter set, resulting in the parsed evaluation object or ErroredEvaluation
+        :rtype: list of concurrent.futures.Future
+        """
+        futures = []
+        for parameters in evaluationlist:
+
+            if transform:
+                beta = self.parametermanager.getTransformedParameters(parameters)
+                if beta is None:
+                    futures.append(self.completedFuture(ErroredEvaluation(None, reason="Infeasible parameters")))
+                    continue
+            else:
+                beta = parameters
+
+            evaluation = self.checkCache(beta)
+            if evaluation is not None:
+                futures.append(self.completedFuture(evaluation))
+            else:
+                futures.append(self.startEvaluation(beta))
+
+        return futures
+
+    def startEvaluation(self, parameters):
+        """Starts a single evaluation, without waiting for it to finish. Has to be implemented by asynchronous evaluators.
+
+        :param parameters: the (transformed) parameters to evaluate
+        :type parameters: numpy array
+        :return: future resulting in the parsed evaluation object or ErroredEvaluation
+        :rtype: concurrent.futures.Future
+        """
+        raise NotImplementedError(type(self).__name__ + " does not support asynchronous evaluations")
+
+    def cancel(self, futures):
+        """Cancels the evaluations of the given futures, if not finished yet.
+        The futures then result in an ErroredEvaluation with the reason "Cancelled".
+
+        :param futures: futures returned by submit
+        :type futures: list of concurrent.futures.Future
+        """
+        for future in futures:
+            if not future.done():
+                future.cancelrequested = True
+                self.cancelEvaluation(future)
+
+    def cancelEvaluation(self, future):
+        """Stops a single evaluation started by startEvaluation. Should be overwritten by asynchronous evaluators
+        to stop running evaluations, by default only evaluations not started yet are cancelled.
+
+        :param future: the future returned by startEvaluation
+        :type future: concurrent.futures.Future
+        """
+        future.cancel()
+
+    def collect(self, futures, tag=""):
+        """Waits for all futures of a batch started by submit, and adds the new evaluations
+        to the cache and the result object.
+
+        :param futures: futures returned by submit
+        :type futures: list of concurrent.futures.Future
+        :param tag: tag-string attached to all produced evaluations for analysis purposes
+        :type tag: string
+        :return: list of parsed evaluation objects, or ErroredEvaluation
+        :rtype: list of Evaluation
+        """
+        results = []
+        newevaluations = []
+        for future in futures:
+            if future.cancelled():
+                results.append(ErroredEvaluation(getattr(future, "parameters", None), reason="Cancelled", eval_id=getattr(future, "evaluation_id", None)))
+                continue
+
+            evaluation = future.result()
+            results.append(evaluation)
+
+            # cancelled evaluations must not end up in the cache
+            if getattr(future, "cached", False) or (getattr(future, "cancelrequested", False) and isinstance(evaluation, ErroredEvaluation)):
+                continue
+            newevaluations.append(evaluation)
+
+        if newevaluations:
+            self.handleNewEvaluations(newevaluations, tag)
+
+        return results
+
+    @staticmethod
+    def completedFuture(evaluation):
+        """Returns a finished future for an evaluation which did not need to be started, e.g. because it was cached.
+
+        :param evaluation: the result of the future
+        :type evaluation: Evaluation
+        :return: the finished future
+        :rtype: concurrent.futures.Future
+        """
+        future = Future()
+        future.cached = True
+        future.set_result(evaluation)
+        return future
+
+    def getTimeout(self):
+        """Returns the current maximum runtime of a single evaluation, see timeout and timeout_factor.
+
+        :return: the maximum runtime in seconds, or None if there is no limit
+        :rtype: float
+        """
+        timeout = self.timeout
+        if self.timeout_factor is not None and self.runtimes is not None and len(self.runtimes) >= self.timeout_minsamples:
+            adaptive = self.timeout_factor * np.median(self.runtimes)
+            timeout = adaptive if timeout is None else min(timeout, adaptive)
+        return timeout
+
+    def recordRuntime(self, runtime):
+        """Records the runtime of a successfully finished evaluation, used for the adaptive timeout.
+
+        :param runtime: the runtime in seconds
+        :type runtime: float
+        """
+        if self.runtimes is None:
+            self.runtimes = []
+        self.runtimes.append(runtime)
+
+    def getTimeoutEvaluation(self, parameters, evaluation_id, runtime, timeout):
+        """Returns the ErroredEvaluation for an evaluation stopped because of its timeout, and counts it.
+
+        :param parameters: the (transformed) parameters of the evaluation
+        :type parameters: numpy array
+        :param evaluation_id: id of the evaluation
+        :type evaluation_id: int
+        :param runtime: runtime of the evaluation until it was stopped, in seconds
+        :type runtime: float
+        :param timeout: the exceeded timeout, in seconds
+        :type timeout: float
+        :return: the errored evaluation
+        :rtype: ErroredEvaluation
+        """
+        self.timeout_count += 1
+        return ErroredEvaluation(parameters, reason="Timeout: stopped after " + str(round(runtime, 1)) + "s, limit was " + str(round(timeout, 1)) + "s", eval_id=evaluation_id, runtime=runtime, transient=True)
+
+    def setRetryPolicy(self, policy):
+        """Sets the policy deciding which failed evaluations are resubmitted.
+
+        :param policy: policy to use, or None to disable resubmitting
+        :type policy: RetryPolicy
+        """
+        self.retrypolicy = policy
+
+    def readOutput(self, evaluation_id, tail=64 * 1024):
+        """Reads the end of the output of UG4 for an evaluation, i.e. the file <id>_ug_output.txt in the exchange directory.
+
+        :param evaluation_id: id of the evaluation
+        :type evaluation_id: int
+        :param tail: maximum number of bytes to read from the end of the file
+        :type tail: int, optional
+        :return: the output, or None if there is no output file
+        :rtype: string
+        """
+        filename = os.path.join(getattr(self, "directory", ""), str(evaluation_id) + "_ug_output.txt")
+        try:
+            with open(filename, "rb") as f:
+                f.seek(0, os.SEEK_END)
+                f.seek(max(0, f.tell() - tail))
+                return f.read().decode("utf-8", errors="replace")
+        except OSError:
+            return None
+
+    def checkRetry(self, evaluation, evaluation_id, attempt, returncode=None):
+        """Asks the retry policy whether a failed evaluation should be resubmitted. If so, the retry is recorded and the
+        output of the failed attempt is kept as <id>_ug_output_<attempt>.txt, and its measurement files are removed.
+        Failures classified as transient are marked as such, so they are not cached when they are not resubmitted.
+
+        :param evaluation: the result of the evaluation
+        :type evaluation: Evaluation
+        :param evaluation_id: id of the evaluation
+        :type evaluation_id: int
+        :param attempt: number of retries of this evaluation so far
+        :type attempt: int
+        :param returncode: exit status of the UG4 process, None if not known
+        :type returncode: int, optional
+        :return: True, if the evaluation should be resubmitted
+        :rtype: bool
+        """
+        if not isinstance(evaluation, ErroredEvaluation):
+            return False
+
+        output = self.readOutput(evaluation_id)
+        policy = self.retrypolicy if self.retrypolicy is not None else RetryPolicy()
+        if policy.classify(evaluation, returncode, output)[0]:
+            evaluation.transient = True
+
+        if self.retrypolicy is None:
+            return False
+
+        retry, description = self.retrypolicy.shouldRetry(evaluation, attempt, returncode, output)
+        if not retry:
+            return False
+
+        if output is not None:
+            outputfile = os.path.join(self.directory, str(evaluation_id) + "_ug_output.txt")
+            os.replace(outputfile, os.path.join(self.directory, str(evaluation_id) + "_ug_output_" + str(attempt) + ".txt"))
+
+        # a measurement file left by the failed attempt would be taken as the result of the next one,
+        # if it looks finished (see Evaluation.isFinished)
+        prefix = str(evaluation_id) + "_measurement."
+        for filename in os.listdir(self.directory):
+            if filename.startswith(prefix):
+                os.remove(os.path.join(self.directory, filename))
+
+        if self.retries is None:
+            self.retries = []
+        self.retries.append({"eval_id": evaluation_id, "attempt": attempt + 1, "reason": evaluation.reason, "classification": description})
+        return True
+
     def setResultObject(self, res):
         """Sets the result object to write statistics to.
 
@@ -52,6 +330,37 @@ class Evaluator(ABC):
         """
         self.resultobj = res
 
+    def setPersistentCache(self, store):
+        """Sets the persistent store to use as second level cache.
+
+        :param store: store to use, or None to disable persistent caching
+        :type store: EvaluationStore
+        """
+        self.persistentcache = store
+        self.fingerprint = None
+
+    def getFingerprint(self):
+        """Returns a fingerprint of everything besides the parameters that influences the result of an evaluation.
+        Used to separate the entries of different setups in the persistent cache.
+
+        :return: fingerprint of this evaluator
+        :rtype: string
+        """
+        return EvaluationStore.getFingerprint(None, [], getattr(self, "fixedparameters", {}), type(self))
+
+    def getCachedFingerprint(self):
+        """Returns the fingerprint of this evaluator (see getFingerprint) without reading the luafile again.
+        It is calculated again if the fixed parameters or the command line parameters were changed in the meantime.
+
+        :return: fingerprint of this evaluator
+        :rtype: string
+        """
+        parameters = repr((getattr(self, "fixedparameters", {}), getattr(self, "cliparameters", [])))
+        if self.fingerprint is None or parameters != self.fingerprintparameters:
+            self.fingerprint = self.getFingerprint()
+            self.fingerprintparameters = parameters
+        return self.fingerprint
+
     def handleNewEvaluations(self, evaluations, tag):
         """Updates the internal evaluation cache and writes evaluations
         and new caching statistics to the set result object.
@@ -61,7 +370,18 @@ class Evaluator(ABC):
         :param tag: tag to store the evaluations under in the result object
         :type tag: string
         """
-        self.cache.update(evaluations)
+        fingerprint = None if self.persistentcache is None else self.getCachedFingerprint()
+        for evaluation in evaluations:
+            if evaluation is None or evaluation.parameters is None:
+                continue
+            if isinstance(evaluation, ErroredEvaluation) and evaluation.transient:
+                continue
+            key = self.getCacheKey(evaluation.parameters)
+            if key in self.cache:
+                continue
+            self.cache[key] = evaluation
+            if fingerprint is not None and not isinstance(evaluation, ErroredEvaluation):
+                self.persistentcache.store(fingerprint, key, evaluation)
         self.serial_evaluation_count += 1
         self.total_evaluation_count += len(evaluations)
         if self.resultobj is not None:
@@ -69,6 +389,36 @@ class Evaluator(ABC):
             self.resultobj.addRunMetadata("evaluator_totalcount", self.total_evaluation_count)
             self.resultobj.addRunMetadata("evaluator_serialcount", self.serial_evaluation_count)
             self.resultobj.addRunMetadata("evaluator_cachehits", self.cached_evaluation_count)
+            self.resultobj.addRunMetadata("evaluator_persistentcachehits", self.persistent_cache_hits)
+            self.resultobj.addRunMetadata("evaluator_cachemisses", self.cache_miss_count)
+            self.resultobj.addRunMetadata("evaluator_cachelookuptime", self.cache_lookup_time)
+            self.resultobj.addRunMetadata("evaluator_timeouts", self.timeout_count)
+
+            if self.retries:
+                for retry in self.retries[self.logged_retry_count:]:
+                    self.resultobj.log("Resubmitted evaluation " + str(retry["eval_id"]) + " (retry " + str(retry["attempt"]) + "): " + str(retry["reason"]) + ", " + retry["classification"])
+                self.logged_retry_count = len(self.retries)
+                self.resultobj.addRunMetadata("evaluator_retries", list(self.retries))
+                self.resultobj.addRunMetadata("evaluator_retrycount", len(self.retries))
+
+    def getCacheKey(self, parameters):
+        """Returns the key the given parameters are stored under in the evaluation cache.
+
+        The key is the byte representation of the parameters as float64 array. If cache_tolerance is set,
+        the mantissas of the parameters are rounded to this relative precision first.
+
+        :param parameters: parameters to get the key for
+        :type parameters: numpy array
+        :return: key for the evaluation cache
+        :rtype: bytes
+        """
+        # adding 0.0 maps -0.0 to 0.0, as both are considered equal
+        values = np.asarray(parameters, dtype=np.float64) + 0.0
+        if self.cache_tolerance > 0:
+            mantissas, exponents = np.frexp(values)
+            mantissas = np.round(mantissas / self.cache_tolerance).astype(np.int64)
+            return mantissas.tobytes() + exponents.astype(np.int64).tobytes()
+        return values.tobytes()
 
     def checkCache(self, parameters):
         """Checks the internal evaluation cache and returns the stored result, if
@@ -79,23 +429,57 @@ class Evaluator(ABC):
         :return: Evaluation, if in cache, or None
         :rtype: Evaluation
         """
-        for evaluation in self.cache:
-            if evaluation.parameters is None:
-                continue
-            if np.array_equal(evaluation.parameters, parameters):
+        starttime = time.perf_counter()
+        key = self.getCacheKey(parameters)
+        evaluation = self.cache.get(key)
+        self.cache_lookup_time += time.perf_counter() - starttime
+
+        if evaluation is None and self.persistentcache is not None:
+            evaluation = self.persistentcache.load(self.getCachedFingerprint(), key)
+            if evaluation is not None:
                 if self.resultobj is not None:
-                    self.resultobj.log("Served evaluation " + str(evaluation.eval_id) + " from cache!")
-                self.cached_evaluation_count += 1
-                return evaluation
-        return None
+                    self.resultobj.log("Loaded evaluation " + str(evaluation.eval_id) + " of an earlier run as " + str(self.id))
+                evaluation.eval_id = self.id
+                self.id += 1
+                self.cache[key] = evaluation
+                self.persistent_cache_hits += 1
+
+        if evaluation is None:
+            self.cache_miss_count += 1
+            return None
+
+        if self.resultobj is not None:
+            self.resultobj.log("Served evaluation " + str(evaluation.eval_id) + " from cache!")
+        self.cached_evaluation_count += 1
+        return evaluation
+
+    def reuseEvaluation(self, evaluation):
+        """Records that an optimizer reuses an evaluation it got from this evaluator earlier,
+        instead of requesting the same parameters again.
+
+        :param evaluation: the reused evaluation
+        :type evaluation: Evaluation
+        """
+        self.reused_evaluation_count += 1
+        if self.resultobj is not None:
+            self.resultobj.log("Reusing evaluation " + str(evaluation.eval_id))
+            self.resultobj.addRunMetadata("evaluator_reusedcount", self.reused_evaluation_count)
 
     def reset(self):
         """resets the internal cache and statistics
         """
-        self.cache = set()
+        self.cache = {}
+        self.reused_evaluation_count = 0
         self.cached_evaluation_count = 0
+        self.cache_miss_count = 0
+        self.cache_lookup_time = 0
+        self.persistent_cache_hits = 0
         self.serial_evaluation_count = 0
         self.total_evaluation_count = 0
+        self.timeout_count = 0
+        self.runtimes = []
+        self.retries = []
+        self.logged_retry_count = 0
 
     def getStatistics(self):
         """returns the internal statistics as a string representation
@@ -104,6 +488,12 @@ class Evaluator(ABC):
         """
         string = "Total count of evaluations: " + str(self.total_evaluation_count) + "\n"
         string += "Taken from cache: " + str(self.cached_evaluation_count) + "\n"
+        string += "Taken from persistent cache: " + str(self.persistent_cache_hits) + "\n"
+        string += "Reused by optimizer: " + str(self.reused_evaluation_count) + "\n"
+        string += "Cache misses: " + str(self.cache_miss_count) + "\n"
+        string += "Cache lookup time: " + str(self.cache_lookup_time) + "s\n"
+        string += "Stopped by timeout: " + str(self.timeout_count) + "\n"
+        string += "Resubmitted: " + str(len(self.retries) if self.retries else 0) + "\n"
         string += "Serial count: " + str(self.serial_evaluation_count)
         return string
 
@@ -113,7 +503,7 @@ class Evaluator(ABC):
         return string
 
     @classmethod
-    def ConstructEvaluator(self, luafile, directory, parametermanager: ParameterManager, evaluation_type: Evaluation, parameter_output_adapter: ParameterOutputAdapter, fixedparameters={}, threadcount=10, cliparameters=[]):
+    def ConstructEvaluator(self, luafile, directory, parametermanager: ParameterManager, evaluation_type: Evaluation, parameter_output_adapter: ParameterOutputAdapter, fixedparameters={}, threadcount=10, cliparameters=[], jobcount=1):
         """Factory method to construct a suitable evaluator.
 
         If UGSUBMIT can be detected on the system, a ClusterEvaluator will be used, if not, a LocalEvaluator.
@@ -135,6 +525,9 @@ class Evaluator(ABC):
         :param cliparameters: list of command line parameters to append to subprocess call. use separate entries
                 for places that would normally require a space.
         :type cliparameters: list of strings, optional
+        :param jobcount: optional number of evaluations to run concurrently when using a LocalEvaluator, defaults to 1.
+                If None is passed, the available cores will be split into jobs using threadcount processes each.
+        :type jobcount: int, optional
         """
         import UGParameterEstimator
         if "UGSUBMIT_TYPE" in os.environ:
@@ -142,4 +535,4 @@ class Evaluator(ABC):
             return UGParameterEstimator.ClusterEvaluator(luafile, directory, parametermanager, evaluation_type, parameter_output_adapter, fixedparameters, threadcount, cliparameters)
         else:
             print("No cluster detected, using LocalEvaluator")
-            return UGParameterEstimator.LocalEvaluator(luafile, directory, parametermanager, evaluation_type, parameter_output_adapter, fixedparameters, threadcount, cliparameters)
+            return UGParameterEstimator.LocalEvaluator(luafile, directory, parametermanager, evaluation_type, parameter_output_adapter, fixedparameters, threadcount, cliparameters, jobcount)
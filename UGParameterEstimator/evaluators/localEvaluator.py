@@ -2,9 +2,13 @@ import subprocess
 import numpy as np
 import os
 import os.path
+import signal
 import time
+import threading
+from concurrent.futures import ThreadPoolExecutor
 from UGParameterEstimator import ParameterManager, Evaluation, ParameterOutputAdapter, ErroredEvaluation
 from .evaluator import Evaluator
+from .evaluationStore import EvaluationStore
 
 
 class LocalEvaluator(Evaluator):
@@ -12,10 +16,26 @@ class LocalEvaluator(Evaluator):
 
     Implements the Evaluator AbcstractBaseClass.
     Can use MPI for local speedup, if threadcount > 1 is passed.
+    Can run multiple evaluations concurrently, if jobcount > 1 is passed. Each of the
+    concurrent jobs will use threadcount MPI processes, so jobcount * threadcount cores are used in total.
     Output of UG4 is redirected into a separate <id>_ug_output.txt file.
 
+    Supports asynchronous evaluations (see Evaluator.submit), running processes are killed when cancelled
+    or when they exceed their timeout (see Evaluator.getTimeout). Each process is started in its own session,
+    so the MPI processes started by mpirun are killed with it (see killProcess). Failed evaluations are rerun by the same
+    worker thread, if the retry policy decides so (see Evaluator.setRetryPolicy).
+
     """
-    def __init__(self, luafile, directory, parametermanager: ParameterManager, evaluation_type: Evaluation, parameter_output_adapter: ParameterOutputAdapter, fixedparameters={}, threadcount=10, cliparameters=[]):
+
+    asynchronous = True
+
+    # interval in seconds in which running processes are checked against their timeout
+    timeoutpollinterval = 0.5
+
+    # time in seconds killed processes get to exit after SIGTERM, before they are sent SIGKILL
+    killgraceperiod = 5
+
+    def __init__(self, luafile, directory, parametermanager: ParameterManager, evaluation_type: Evaluation, parameter_output_adapter: ParameterOutputAdapter, fixedparameters={}, threadcount=10, cliparameters=[], jobcount=1):
         """Class constructor
 
         :param luafilename: path to the luafile to call for every evaluation
@@ -30,11 +50,14 @@ class LocalEvaluator(Evaluator):
         :type parameter_output_adapter: ParameterOutputAdapter
         :param fixedparameters: optional dictionary of fixed parameters to pass
         :type fixedparameters: dictionary<string, string|number>, optional
-        :param threadcount: optional maximum number of parallel jobs to submit in UGSUBMIT, defaults to 10
+        :param threadcount: optional number of MPI processes to use for each evaluation, defaults to 10
         :type threadcount: int, optional
         :param cliparameters: list of command line parameters to append to subprocess call. use separate entries
                 for places that would normally require a space.
         :type cliparameters: list of strings, optional
+        :param jobcount: optional number of evaluations to run concurrently, defaults to 1.
+                If None is passed, the cores of this machine will be split into jobs of threadcount processes each.
+        :type jobcount: int, optional
         """
         self.directory = directory
         self.parametermanager = parametermanager
@@ -48,6 +71,20 @@ class LocalEvaluator(Evaluator):
         self.threadcount = threadcount
         self.cliparameters = cliparameters
 
+        if jobcount is None:
+            jobcount = max(1, (os.cpu_count() or 1) // max(1, threadcount))
+        self.jobcount = jobcount
+
+        # currently running ug processes by evaluation id, and the ids of cancelled evaluations, guarded by processlock
+        self.processes = {}
+        self.cancelledids = set()
+        self.runtimes = []
+        self.processlock = threading.Lock()
+
+        # futures of the started evaluations which are not finished yet
+        self.futures = set()
+        self.executor = None
+
         if not os.path.exists(self.directory):
             os.mkdir(self.directory)
 
@@ -57,15 +94,154 @@ class LocalEvaluator(Evaluator):
 
     @property
     def parallelism(self):
-        """Returns the parallelism of the evaluator. here it is one, as only one evaluation is handled in parallel.
+        """Returns the parallelism of the evaluator, i.e. the number of evaluations run concurrently.
 
         :return: parallelism of the evaluator
         :rtype:  int
         """
-        return 1
+        return self.jobcount
+
+    def getCallParameters(self, scriptpath, arguments):
+        """Assembles the command line to run UG4 with, using mpirun if threadcount > 1.
+
+        :param scriptpath: absolute path of the luafile
+        :type scriptpath: string
+        :param arguments: arguments passed to the luafile, before the cliparameters
+        :type arguments: list of strings
+        :return: the command line
+        :rtype: list of strings
+        """
+        if (self.threadcount > 1):
+            callParameters = ["mpirun", "-np", str(self.threadcount), "ugshell", "-ex", scriptpath]
+        else:
+            callParameters = ["ugshell", "-ex", scriptpath]
+
+        return callParameters + arguments + self.cliparameters
+
+    def runProcess(self, callParameters, stdoutfile, evaluation_id):
+        """Runs one UG4 process and blocks until it is finished. The process is registered
+        while running, so it can be killed when the evaluation is cancelled or the evaluator is left unexpectedly.
+        If a timeout is set, the process is killed when exceeding it.
+
+        :param callParameters: the command line to execute
+        :type callParameters: list of strings
+        :param stdoutfile: file to redirect the output of UG4 to
+        :type stdoutfile: string
+        :param evaluation_id: id of the evaluation
+        :type evaluation_id: int
+        :return: the exit code of the process, and the exceeded timeout (None if finished in time)
+        :rtype: tuple (int, float)
+        """
+        exceeded = None
+        with open(stdoutfile, "w") as outfile:
+            starttime = time.time()
+            process = subprocess.Popen(callParameters, stdout=outfile, start_new_session=True)
+            with self.processlock:
+                self.processes[evaluation_id] = process
+                if evaluation_id in self.cancelledids:
+                    self.killProcess(process, self.killgraceperiod)
+
+            while True:
+                timeout = self.getTimeout()
+                if timeout is None and self.timeout_factor is None:
+                    returncode = process.wait()
+                    break
+
+                try:
+                    returncode = process.wait(self.timeoutpollinterval)
+                    break
+                except subprocess.TimeoutExpired:
+                    if exceeded is None and timeout is not None and time.time() - starttime > timeout:
+                        self.killProcess(process, self.killgraceperiod)
+                        exceeded = timeout
+
+            with self.processlock:
+                del self.processes[evaluation_id]
+        return returncode, exceeded
+
+    @staticmethod
+    def killProcess(process, graceperiod):
+        """Kills a process started with start_new_session=True, together with all processes it started
+        (e.g. the MPI processes started by mpirun). The process group is sent SIGTERM, and SIGKILL after graceperiod
+        seconds, without blocking the caller. A graceperiod of 0 sends SIGKILL right away.
+
+        :param process: the process to kill
+        :type process: subprocess.Popen
+        :param graceperiod: time in seconds the processes get to exit after SIGTERM
+        :type graceperiod: float
+        """
+        def signalGroup(signum):
+            try:
+                os.killpg(process.pid, signum)
+            except OSError:
+                # all processes of the group have exited already
+                pass
+
+        if graceperiod <= 0:
+            signalGroup(signal.SIGKILL)
+            return
+
+        signalGroup(signal.SIGTERM)
+        timer = threading.Timer(graceperiod, signalGroup, [signal.SIGKILL])
+        timer.daemon = True
+        timer.start()
+
+    def runEvaluation(self, callParameters, stdoutfile, evaluation_id, parameters):
+        """Runs the UG4 process of one evaluation and parses its result. Called by the worker threads.
+
+        :param callParameters: the command line to execute
+        :type callParameters: list of strings
+        :param stdoutfile: file to redirect the output of UG4 to
+        :type stdoutfile: string
+        :param evaluation_id: id of the evaluation
+        :type evaluation_id: int
+        :param parameters: the (transformed) parameters of the evaluation
+        :type parameters: numpy array
+        :return: the parsed evaluation
+        :rtype: Evaluation
+        """
+        attempt = 0
+        while True:
+            starttime = time.time()
+            returncode, exceeded = self.runProcess(callParameters, stdoutfile, evaluation_id)
+            runtime = time.time() - starttime
+
+            with self.processlock:
+                if evaluation_id in self.cancelledids:
+                    return ErroredEvaluation(parameters, reason="Cancelled", eval_id=evaluation_id, runtime=runtime)
+
+            if exceeded is not None:
+                data = self.getTimeoutEvaluation(parameters, evaluation_id, runtime, exceeded)
+            else:
+                data = self.evaluation_type.parse(self.directory, evaluation_id, parameters, runtime)
+
+            if data is None:
+                data = ErroredEvaluation(parameters, reason="Error while parsing.", eval_id=evaluation_id, runtime=runtime)
+
+            if not isinstance(data, ErroredEvaluation):
+                with self.processlock:
+                    self.totalevaluationtime += runtime
+                    self.recordRuntime(runtime)
+                return data
+
+            if not self.checkRetry(data, evaluation_id, attempt, returncode):
+                return data
+
+            attempt += 1
+
+    def getFingerprint(self):
+        """Returns a fingerprint of the luafile, the command line parameters, the fixed parameters and the evaluation type.
+        Used to separate the entries of different setups in the persistent cache.
+
+        :return: fingerprint of this evaluator
+        :rtype: string
+        """
+        parameternames = [p.name for p in self.parametermanager.parameters]
+        return EvaluationStore.getFingerprint(self.luafile, self.cliparameters, self.fixedparameters, self.evaluation_type, parameternames)
 
     def evaluate(self, evaluationlist, transform=True, tag=""):
         """Evaluates the parameters given in evaluationlist using UG4, and the adapters set in the constructor.
+        Up to jobcount evaluations are run concurrently.
 
         :param evaluationlist: parametersets to evaluate
         :type evaluationlist: list of numpy arrays
@@ -76,72 +252,77 @@ class LocalEvaluator(Evaluator):
         :return: list of parsed evaluation objects with the type given in the constructor, or ErroredEvaluation
         :rtype: list of Evaluation
         """
-        results = []
-
-        for beta in evaluationlist:
+        return self.collect(self.submit(evaluationlist, transform), tag)
 
-            if transform is True:
-                parameters = self.parametermanager.getTransformedParameters(beta)
-                if parameters is None:
-                    results.append(ErroredEvaluation(None, reason="Infeasible parameters"))
-                    continue
-            else:
-                parameters = beta
+    def startEvaluation(self, parameters):
+        """Starts a single evaluation. It is run as soon as one of the jobcount worker threads is free.
 
-            res = self.checkCache(parameters)
-
-            if res is not None:
-                results.append(res)
-                continue
-
-            starttime = time.time()
-
-            absolute_directory_path = os.getcwd() + "/" + self.directory
-            absolute_script_path = os.getcwd() + "/" + self.luafile
+        :param parameters: the (transformed) parameters to evaluate
+        :type parameters: numpy array
+        :return: future resulting in the parsed evaluation object or ErroredEvaluation
+        :rtype: concurrent.futures.Future
+        """
+        absolute_directory_path = os.getcwd() + "/" + self.directory
+        absolute_script_path = os.getcwd() + "/" + self.luafile
 
-            if not os.path.isfile(absolute_script_path):
-                print("Luafile not found! " + absolute_script_path)
-                exit()
-            if not os.path.exists(absolute_directory_path):
-                print("Exchange directory not found! " + absolute_directory_path)
-                exit()
+        if not os.path.isfile(absolute_script_path):
+            print("Luafile not found! " + absolute_script_path)
+            exit()
+        if not os.path.exists(absolute_directory_path):
+            print("Exchange directory not found! " + absolute_directory_path)
+            exit()
 
-            if (self.threadcount > 1):
-                callParameters = ["mpirun", "-np", str(self.threadcount), "ugshell", "-ex", absolute_script_path, "-evaluationId", str(self.id), "-communicationDir", absolute_directory_path]
-            else:
-                callParameters = ["ugshell", "-ex", absolute_script_path, "-evaluationId", str(self.id), "-communicationDir", absolute_directory_path]
+        callParameters = self.getCallParameters(absolute_script_path, ["-evaluationId", str(self.id), "-communicationDir", absolute_directory_path])
 
-            callParameters += self.cliparameters
+        # assemble the paths
+        stdoutfile = os.path.join(self.directory, str(self.id) + "_ug_output.txt")
 
-            # assemble the paths
-            stdoutfile = os.path.join(self.directory, str(self.id) + "_ug_output.txt")
+        # output the parameters however needed for the application
+        self.parameter_output_adapter.writeParameters(self.directory, self.id, self.parametermanager, parameters, self.fixedparameters)
 
-            # output the parameters however needed for the application
-            self.parameter_output_adapter.writeParameters(self.directory, self.id, self.parametermanager, parameters, self.fixedparameters)
+        if self.executor is None:
+            self.executor = ThreadPoolExecutor(max_workers=self.jobcount)
 
-            # call!
-            with open(stdoutfile, "w") as outfile:
-                subprocess.call(callParameters, stdout=outfile)
+        # call!
+        future = self.executor.submit(self.runEvaluation, callParameters, stdoutfile, self.id, parameters)
+        future.parameters = parameters
+        future.evaluation_id = self.id
 
-            # parse the data, using the provided evaluation type
-            data = self.evaluation_type.parse(self.directory, self.id, parameters, time.time() - starttime)
+        self.futures.add(future)
+        future.add_done_callback(self.futures.discard)
 
-            self.id += 1
+        self.id += 1
+        return future
 
-            if data is None:
-                results.append(ErroredEvaluation(parameters, reason="Error while parsing."))
-                continue
+    def cancelEvaluation(self, future):
+        """Cancels an evaluation. If its process is already running, it is killed.
 
-            self.totalevaluationtime += time.time() - starttime
-            self.handleNewEvaluations([data], tag)
-
-            results.append(data)
+        :param future: the future returned by startEvaluation
+        :type future: concurrent.futures.Future
+        """
+        if future.cancel():
+            return
 
-        return results
+        with self.processlock:
+            self.cancelledids.add(future.evaluation_id)
+            process = self.processes.get(future.evaluation_id)
+            if process is not None:
+                self.killProcess(process, self.killgraceperiod)
 
     def __enter__(self):
         pass
 
     def __exit__(self, type, value, traceback):
-        # todo: cancel local process?
-        pass
+
+        # evaluations submitted asynchronously may outlive the with block, unless it is left by an exception
+        if type is None:
+            return
+
+        # make sure all (of our) processes are killed when the evaluation was interrupted
+        with self.processlock:
+            for evaluation_id, process in self.processes.items():
+                print("Killing process " + str(process.pid))
+                self.cancelledids.add(evaluation_id)
+                self.killProcess(process, self.killgraceperiod)
+
+        self.cancel(list(self.futures))
@@ -0,0 +1,224 @@
+import json
+import os
+import os.path
+import signal
+import subprocess
+import sys
+import threading
+import time
+
+
+class PilotDispatcher:
+    """Runs the evaluations of a PilotEvaluator inside one allocation of the cluster.
+
+    The dispatcher is the program of the pilot job. It pulls tasks from the exchange directory and runs up to slots
+    of them at the same time, so the evaluations do not wait in the queue of the scheduler separately:
+
+    - the evaluator writes the task of an evaluation as <id>.task, containing the command line to run as json,
+    - the dispatcher claims a task by renaming it to <id>.claimed_<pilotid>, so each task is run by one pilot only,
+      and runs the command line, writing its output to <id>_ug_output.txt,
+    - when the command exits, its exit status is written to <id>.exit,
+    - if a file <id>.cancel appears, the command is killed,
+    - if the file pilot_<pilotid>.stop appears, running commands are killed and the dispatcher exits,
+    - if no task was run for idletimeout seconds, the dispatcher exits, so the allocation is freed,
+    - no new tasks are claimed after walltime seconds, so evaluations are not cut off at the end of the allocation.
+
+    When exiting, the dispatcher writes pilot_<pilotid>.exit. Each command is started in its own session, and killed
+    together with the processes it started (e.g. the MPI processes started by mpirun): they are sent SIGTERM,
+    and SIGKILL after killgraceperiod seconds.
+
+    The dispatcher only uses the standard library, so it can be started with python on the nodes of the cluster,
+    without the rest of the package. If it is started on several MPI ranks, all but the first rank exit immediately.
+
+    :param directory: the exchange directory
+    :type directory: string
+    :param pilotid: id of the pilot, given by the evaluator
+    :type pilotid: int
+    :param slots: number of tasks to run at the same time
+    :type slots: int
+    :param idletimeout: time in seconds without running tasks after which the dispatcher exits
+    :type idletimeout: float, optional
+    :param walltime: time in seconds after which no new tasks are claimed, None for no limit
+    :type walltime: float, optional
+    """
+
+    pollinterval = 0.1
+
+    # time in seconds killed commands get to exit after SIGTERM, before they are sent SIGKILL
+    killgraceperiod = 5
+
+    # environment variables holding the MPI rank for common MPI implementations and schedulers
+    rankvariables = ["OMPI_COMM_WORLD_RANK", "PMI_RANK", "PMIX_RANK", "SLURM_PROCID"]
+
+    def __init__(self, directory, pilotid, slots, idletimeout=60, walltime=None):
+        self.directory = directory
+        self.pilotid = pilotid
+        self.slots = slots
+        self.idletimeout = idletimeout
+        self.walltime = walltime
+
+        # running processes by evaluation id, and the ids of the cancelled ones
+        self.processes = {}
+        self.cancelled = set()
+        self.starttime = time.time()
+        self.lastactive = self.starttime
+        self.taskcount = 0
+
+    def getFile(self, name):
+        """Returns the path of a file in the exchange directory.
+
+        :param name: name of the file
+        :type name: string
+        :rtype: string
+        """
+        return os.path.join(self.directory, name)
+
+    def claimTasks(self):
+        """Claims waiting tasks and starts them, as long as there are free slots.
+        """
+        if len(self.processes) >= self.slots:
+            return
+
+        if self.walltime is not None and time.time() - self.starttime > self.walltime:
+            return
+
+        tasks = [f[:-len(".task")] for f in os.listdir(self.directory) if f.endswith(".task")]
+        for evaluation_id in sorted(tasks, key=lambda t: int(t) if t.isdigit() else -1):
+            if len(self.processes) >= self.slots:
+                return
+
+            claimed = self.getFile(evaluation_id + ".claimed_" + str(self.pilotid))
+            try:
+                os.rename(self.getFile(evaluation_id + ".task"), claimed)
+            except OSError:
+                # claimed by another pilot, or cancelled
+                continue
+
+            with open(claimed) as f:
+                command = json.load(f)["command"]
+
+            print("Starting evaluation " + evaluation_id + ": " + " ".join(command), flush=True)
+            with open(self.getFile(evaluation_id + "_ug_output.txt"), "w") as outfile:
+                self.processes[evaluation_id] = subprocess.Popen(command, stdout=outfile, stderr=subprocess.STDOUT, start_new_session=True)
+            self.taskcount += 1
+
+    def checkTasks(self):
+        """Kills cancelled tasks and reports finished ones.
+        """
+        for evaluation_id, process in list(self.processes.items()):
+            if evaluation_id not in self.cancelled and os.path.exists(self.getFile(evaluation_id + ".cancel")):
+                self.killProcess(process, self.killgraceperiod)
+                self.cancelled.add(evaluation_id)
+
+            returncode = process.poll()
+            if returncode is None:
+                continue
+
+            self.writeFile(self.getFile(evaluation_id + ".exit"), str(returncode))
+            print("Finished evaluation " + evaluation_id + " with exit status " + str(returncode), flush=True)
+            del self.processes[evaluation_id]
+            self.cancelled.discard(evaluation_id)
+
+    def run(self):
+        """Main loop of the dispatcher, returns when stopped or idle.
+        """
+        print("Pilot " + str(self.pilotid) + " started on " + os.uname().nodename + " with " + str(self.slots) + " slots", flush=True)
+        stopfile = self.getFile("pilot_" + str(self.pilotid) + ".stop")
+
+        try:
+            while not os.path.exists(stopfile):
+                self.claimTasks()
+                self.checkTasks()
+
+                if self.processes:
+                    self.lastactive = time.time()
+                elif time.time() - self.lastactive > self.idletimeout:
+                    print("Idle for " + str(self.idletimeout) + "s, exiting", flush=True)
+                    break
+
+                time.sleep(self.pollinterval)
+        finally:
+            for process in self.processes.values():
+                self.killProcess(process, self.killgraceperiod)
+            for process in self.processes.values():
+                process.wait()
+                # the timer sending SIGKILL does not outlive the dispatcher, so processes left in the group are killed now
+                self.killProcess(process, 0)
+            self.checkTasks()
+
+            print("Pilot " + str(self.pilotid) + " exiting after " + str(self.taskcount) + " evaluations", flush=True)
+            self.writeFile(self.getFile("pilot_" + str(self.pilotid) + ".exit"), str(self.taskcount))
+
+    @staticmethod
+    def killProcess(process, graceperiod):
+        """Kills a command together with the processes it started, by sending SIGTERM to its process group,
+        and SIGKILL after graceperiod seconds, without blocking. A graceperiod of 0 sends SIGKILL right away.
+        Same as LocalEvaluator.killProcess, which can not be imported here.
+
+        :param process: the process to kill, started with start_new_session=True
+        :type process: subprocess.Popen
+        :param graceperiod: time in seconds the processes get to exit after SIGTERM
+        :type graceperiod: float
+        """
+        def signalGroup(signum):
+            try:
+                os.killpg(process.pid, signum)
+            except OSError:
+                # all processes of the group have exited already
+                pass
+
+        if graceperiod <= 0:
+            signalGroup(signal.SIGKILL)
+            return
+
+        signalGroup(signal.SIGTERM)
+        timer = threading.Timer(graceperiod, signalGroup, [signal.SIGKILL])
+        timer.daemon = True
+        timer.start()
+
+    @staticmethod
+    def writeFile(filename, content):
+        """Writes a file atomically, by writing to a temporary file and renaming it.
+
+        :param filename: path of the file
+        :type filename: string
+        :param content: content to write
+        :type content: string
+        """
+        temporary = filename + ".tmp"
+        with open(temporary, "w") as f:
+            f.write(content)
+        os.replace(temporary, filename)
+
+    @classmethod
+    def isFirstRank(cls):
+        """Returns False, if the dispatcher was started as a rank other than the first of an MPI job.
+
+        :rtype: bool
+        """
+        for variable in cls.rankvariables:
+            if variable in os.environ:
+                return os.environ[variable] == "0"
+        return True
+
+
+def main(argv):
+    """Starts a dispatcher, called as
+    pilotDispatcher.py -directory <dir> -pilotId <id> -slots <n> [-idleTimeout <seconds>] [-walltime <seconds>]
+    """
+    def argument(name, default=None):
+        if name in argv:
+            return argv[argv.index(name) + 1]
+        return default
+
+    if not PilotDispatcher.isFirstRank():
+        return
+
+    walltime = argument("-walltime")
+    dispatcher = PilotDispatcher(argument("-directory"), int(argument("-pilotId")), int(argument("-slots")),
+                                 float(argument("-idleTimeout", 60)), None if walltime is None else float(walltime))
+    dispatcher.run()
+
+
+if __name__ == "__main__":
+    main(sys.argv)
@@ -0,0 +1,303 @@
+import json
+import os
+import sys
+import threading
+import time
+from UGParameterEstimator import ParameterManager, ParameterOutputAdapter, ErroredEvaluation
+from .clusterEvaluator import ClusterEvaluator
+from . import pilotDispatcher
+
+
+class PilotEvaluator(ClusterEvaluator):
+    """ClusterEvaluator running many evaluations in one allocation, instead of submitting a job per evaluation.
+
+    A pilot job of slots * threadcount cores is submitted with UGSUBMIT, running a PilotDispatcher. The evaluations are
+    written as tasks to the exchange directory, and the dispatcher runs up to slots of them at the same time inside the
+    allocation, each with threadcount MPI processes. This way, only the pilot waits in the queue of the scheduler.
+    See PilotDispatcher for the protocol between evaluator and dispatcher.
+
+    Pilots exit after being idle for idletimeout seconds, so a small idletimeout gives one pilot per batch of evaluations,
+    a large one a pilot per calibration. When tasks are waiting and fewer than pilotcount pilots are alive, new pilots
+    are submitted. Pilots are stopped by close.
+
+    Cancelled evaluations and evaluations exceeding their timeout are killed by the dispatcher, the pilot keeps running.
+    The runtime and timeout of an evaluation count from the moment a dispatcher starts it, not from its submission.
+    If a pilot job leaves the queue while running evaluations (e.g. because its walltime ended), these are considered
+    failed, and can be resubmitted by the retry policy. Set walltime to a little less than the walltime of the
+    allocation, so pilots stop starting evaluations they can not finish.
+
+    Depending on the cluster, UGSUBMIT starts the dispatcher on every MPI rank of the pilot job,
+    all but the first rank exit immediately. The python interpreter running this evaluator has to be available
+    on the nodes of the cluster.
+
+    """
+
+    # time in seconds after which an idle pilot exits
+    idletimeout = 60
+
+    # time in seconds after which pilots do not start new evaluations, None for no limit
+    walltime = None
+
+    # time in seconds close waits for the pilots to exit
+    stoptimeout = 10
+
+    pilot_submission_count = 0
+
+    def __init__(self, luafilename, directory, parametermanager: ParameterManager, evaluation_type, parameter_output_adapter: ParameterOutputAdapter, fixedparameters={}, threadcount=10, cliparameters=[], ugsubmitparameters=[], slots=4, pilotcount=1):
+        """Class constructor, see ClusterEvaluator.
+
+        :param slots: number of evaluations run at the same time by each pilot
+        :type slots: int, optional
+        :param pilotcount: maximum number of pilots alive at the same time
+        :type pilotcount: int, optional
+        """
+        super().__init__(luafilename, directory, parametermanager, evaluation_type, parameter_output_adapter, fixedparameters, threadcount, cliparameters, ugsubmitparameters)
+        self.slots = slots
+        self.pilotcount = pilotcount
+
+        # job ids of the submitted pilots by their pilot id, and the ids of the pilots known to have ended, guarded by pilotlock
+        self.pilots = {}
+        self.endedpilots = set()
+        self.pilotlock = threading.Lock()
+
+    @property
+    def parallelism(self):
+        """Returns the parallelism of the evaluator, i.e. the number of evaluations run at the same time by all pilots.
+
+        :return: parallelism of the evaluator
+        :rtype:  int
+        """
+        return self.slots * self.pilotcount
+
+    def getFile(self, evaluation_id, extension):
+        """Returns the path of a file of the dispatcher protocol in the exchange directory.
+
+        :param evaluation_id: id of the evaluation, or pilot_<id> for files of a pilot
+        :type evaluation_id: int or string
+        :param extension: type of the file, e.g. "task"
+        :type extension: string
+        :rtype: string
+        """
+        return os.path.join(self.directory, str(evaluation_id) + "." + extension)
+
+    def getCallParameters(self, evaluation_id, scriptpath, directorypath):
+        """Assembles the command line the dispatcher runs for an evaluation.
+
+        :param evaluation_id: id of the evaluation
+        :type evaluation_id: int
+        :param scriptpath: absolute path of the luafile
+        :type scriptpath: string
+        :param directorypath: absolute path of the exchange directory
+        :type directorypath: string
+        :return: the command line
+        :rtype: list of strings
+        """
+        if self.threadcount > 1:
+            callParameters = ["mpirun", "-np", str(self.threadcount), "ugshell"]
+        else:
+            callParameters = ["ugshell"]
+
+        callParameters += ["-ex", scriptpath, "-evaluationId", str(evaluation_id), "-communicationDir", directorypath]
+
+        callParameters += self.cliparameters
+
+        return callParameters
+
+    def submitEvaluation(self, evaluation_id, callParameters):
+        """Writes the task of an evaluation for the dispatchers, and makes sure pilots are running.
+
+        :param evaluation_id: id of the evaluation
+        :type evaluation_id: int
+        :param callParameters: the command line returned by getCallParameters
+        :type callParameters: list of strings
+        :return: the job id of a pilot, or None, if no pilot could be submitted
+        :rtype: int
+        """
+        # remove the state of a previous attempt of this evaluation
+        for filename in [self.getFile(evaluation_id, "exit"), self.getFile(evaluation_id, "cancel")] + [self.getFile(evaluation_id, "claimed_" + str(pilotid)) for pilotid in self.pilots]:
+            if os.path.exists(filename):
+                os.remove(filename)
+
+        pilotDispatcher.PilotDispatcher.writeFile(self.getFile(evaluation_id, "task"), json.dumps({"command": callParameters}))
+        return self.ensurePilots()
+
+    def ensurePilots(self):
+        """Submits new pilots, if fewer than pilotcount are alive.
+
+        :return: the job id of an alive pilot, or None, if no pilot could be submitted
+        :rtype: int
+        """
+        with self.pilotlock:
+            for pilotid in self.pilots:
+                if os.path.exists(self.getFile("pilot_" + str(pilotid), "exit")):
+                    self.endedpilots.add(pilotid)
+
+            alive = [jobid for pilotid, jobid in self.pilots.items() if pilotid not in self.endedpilots]
+            while len(alive) < self.pilotcount:
+                jobid = self.submitPilot()
+                if jobid is None:
+                    break
+                alive.append(jobid)
+
+            return alive[0] if alive else None
+
+    def submitPilot(self):
+        """Submits a pilot job using UGSUBMIT.
+
+        :return: the job id of the pilot, or None, if it could not be submitted
+        :rtype: int
+        """
+        pilotid = len(self.pilots)
+        callParameters = ["ugsubmit", str(self.slots * self.threadcount)]
+
+        callParameters += self.ugsubmitparameters
+
+        callParameters += ["---", sys.executable, os.path.abspath(pilotDispatcher.__file__), "-directory", os.path.abspath(self.directory),
+                           "-pilotId", str(pilotid), "-slots", str(self.slots), "-idleTimeout", str(self.idletimeout)]
+
+        if self.walltime is not None:
+            callParameters += ["-walltime", str(self.walltime)]
+
+        jobid = ClusterEvaluator.submitEvaluation(self, None, callParameters)
+        if jobid is None:
+            return None
+
+        self.pilots[pilotid] = jobid
+        self.pilot_submission_count += 1
+        if self.resultobj is not None:
+            self.resultobj.log("Submitted pilot " + str(pilotid) + " as job " + str(jobid))
+            self.resultobj.addRunMetadata("evaluator_pilotcount", self.pilot_submission_count)
+        return jobid
+
+    def getClaimingPilot(self, evaluation_id):
+        """Returns the id of the pilot which claimed the task of an evaluation.
+
+        :param evaluation_id: id of the evaluation
+        :type evaluation_id: int
+        :return: the pilot id, or None, if the task was not claimed
+        :rtype: int
+        """
+        for pilotid in list(self.pilots):
+            if os.path.exists(self.getFile(evaluation_id, "claimed_" + str(pilotid))):
+                return pilotid
+        return None
+
+    def getJobState(self, future, job):
+        """Checks whether the task of an evaluation has finished. While the task is waiting, it is assigned to a pilot alive,
+        submitting a new one if needed. Once claimed, it is assigned to the claiming pilot and marked running.
+
+        :param future: the future of the job
+        :type future: concurrent.futures.Future
+        :param job: the job tuple (evaluation id, job id, parameters, start time, call parameters, retries so far)
+        :type job: tuple
+        :return: True if finished, False if not (yet), None if this can not be detected from the measurement file
+        :rtype: boolean
+        """
+        evaluation_id = job[0]
+        if os.path.exists(self.getFile(evaluation_id, "exit")):
+            return True
+
+        if os.path.exists(self.getFile(evaluation_id, "task")):
+            jobid = self.ensurePilots()
+            if jobid is not None:
+                with self.joblock:
+                    self.updateJob(future, jobid=jobid)
+            return False
+
+        pilotid = self.getClaimingPilot(evaluation_id)
+        if pilotid is not None:
+            self.markRunning(future)
+            with self.joblock:
+                self.updateJob(future, jobid=self.pilots[pilotid])
+
+        return super().getJobState(future, job)
+
+    def findRunningJobs(self, jobs, jobstates):
+        """Returns no jobs, as a running pilot does not tell whether a task was started. Claimed tasks are marked running by getJobState.
+
+        :param jobs: the unfinished jobs
+        :type jobs: list of tuples (future, job tuple)
+        :param jobstates: state of each job in the job table of uginfo, by job id
+        :type jobstates: dictionary<int, string>
+        :return: an empty list
+        :rtype: list of concurrent.futures.Future
+        """
+        return []
+
+    def findLostJobs(self, jobs, activejobids):
+        """Returns the evaluations claimed by pilots which left the queue. Waiting tasks are taken by other pilots.
+
+        :param jobs: the unfinished jobs
+        :type jobs: list of tuples (future, job tuple)
+        :param activejobids: ids of the jobs still running or pending, according to uginfo
+        :type activejobids: set of int
+        :return: futures of the lost evaluations
+        :rtype: list of concurrent.futures.Future
+        """
+        with self.pilotlock:
+            for pilotid, jobid in self.pilots.items():
+                if jobid not in activejobids:
+                    self.endedpilots.add(pilotid)
+
+        lost = []
+        for future, job in jobs:
+            if os.path.exists(self.getFile(job[0], "task")) or os.path.exists(self.getFile(job[0], "exit")):
+                continue
+            pilotid = self.getClaimingPilot(job[0])
+            if pilotid is not None and pilotid in self.endedpilots:
+                lost.append(future)
+        return lost
+
+    def removeJob(self, job):
+        """Removes a waiting task, or asks the dispatcher running it to kill it.
+
+        :param job: the job tuple (evaluation id, job id, parameters, start time, call parameters, retries so far)
+        :type job: tuple
+        """
+        try:
+            os.remove(self.getFile(job[0], "task"))
+        except OSError:
+            # already claimed by a dispatcher
+            pilotDispatcher.PilotDispatcher.writeFile(self.getFile(job[0], "cancel"), "")
+
+    def parseResult(self, evaluation_id, jobid, parameters, runtime):
+        """Parses the result of a finished evaluation. The output of UG4 is written to the exchange directory by the dispatcher.
+
+        :param evaluation_id: id of the evaluation
+        :type evaluation_id: int
+        :param jobid: id of the pilot job
+        :type jobid: int
+        :param parameters: the (transformed) parameters of the evaluation
+        :type parameters: numpy array
+        :param runtime: runtime of the evaluation, in seconds
+        :type runtime: number
+        :return: the parsed evaluation
+        :rtype: Evaluation
+        """
+        data = self.evaluation_type.parse(self.directory, evaluation_id, parameters, runtime)
+        if data is None:
+            data = ErroredEvaluation(parameters, reason="Error while parsing.", eval_id=evaluation_id, runtime=runtime)
+        return data
+
+    def close(self):
+        """Stops all pilots and waits for them to exit. New pilots are submitted, if further evaluations are submitted.
+        """
+        with self.pilotlock:
+            alive = [pilotid for pilotid in self.pilots if pilotid not in self.endedpilots]
+            for pilotid in alive:
+                pilotDispatcher.PilotDispatcher.writeFile(self.getFile("pilot_" + str(pilotid), "stop"), "")
+
+            deadline = time.time() + self.stoptimeout
+            for pilotid in alive:
+                while not os.path.exists(self.getFile("pilot_" + str(pilotid), "exit")) and time.time() < deadline:
+                    time.sleep(self.pollinterval)
+                self.endedpilots.add(pilotid)
+
+    def getStatistics(self):
+        """returns the internal statistics as a string representation
+        :return: string with statistics information
+        :rtype: string
+        """
+        string = super().getStatistics()
+        string += "\nPilots submitted: " + str(self.pilot_submission_count)
+        return string
@@ -0,0 +1,105 @@
+import re
+from UGParameterEstimator import ErroredEvaluation
+
+
+class RetryPolicy:
+    """Decides which failed evaluations are worth resubmitting.
+
+    Failures are classified as transient (e.g. a node failure or a filesystem hiccup, resubmitting the same
+    parameters will likely succeed) or permanent (e.g. the solver diverged, resubmitting will fail again), using
+
+    - the reason of the ErroredEvaluation: timeouts, cancelled and infeasible evaluations are never retried, unless retry_timeouts is set for timeouts,
+    - the output of UG4 (<id>_ug_output.txt): it is searched for permanentpatterns first, then for transientpatterns,
+    - the exit status of the process, if known: processes killed by a signal are considered transient failures,
+    - if neither tells, evaluations without any output of UG4 are considered transient (the job did not run at all), all others permanent.
+
+    :param maxretries: maximum number of times the same evaluation is resubmitted
+    :type maxretries: int, optional
+    :param retry_timeouts: whether to retry evaluations stopped by their timeout
+    :type retry_timeouts: bool, optional
+    :param transientpatterns: additional regular expressions marking a failure as transient
+    :type transientpatterns: list of strings, optional
+    :param permanentpatterns: additional regular expressions marking a failure as permanent
+    :type permanentpatterns: list of strings, optional
+    """
+
+    transientpatterns = [
+        r"Stale file handle",
+        r"Input/output error",
+        r"No space left on device",
+        r"Resource temporarily unavailable",
+        r"Connection (reset|refused|timed out)",
+        r"NODE FAIL",
+        r"slurmstepd: error",
+        r"mpirun noticed that process .* (signal|killed)",
+        r"ORTE was unable to",
+        r"Bus error",
+    ]
+
+    permanentpatterns = [
+        r"LUA-ERROR",
+        r"Execution of script .* failed",
+        r"did not converge",
+        r"[Nn]ewton [Ss]olver failed",
+        r"UGError",
+    ]
+
+    def __init__(self, maxretries=2, retry_timeouts=False, transientpatterns=[], permanentpatterns=[]):
+        self.maxretries = maxretries
+        self.retry_timeouts = retry_timeouts
+        self.transientpatterns = RetryPolicy.transientpatterns + list(transientpatterns)
+        self.permanentpatterns = RetryPolicy.permanentpatterns + list(permanentpatterns)
+
+    def classify(self, evaluation, returncode=None, output=None):
+        """Classifies a failed evaluation.
+
+        :param evaluation: the failed evaluation
+        :type evaluation: ErroredEvaluation
+        :param returncode: exit status of the UG4 process, None if not known
+        :type returncode: int, optional
+        :param output: output of UG4, None if not available
+        :type output: string, optional
+        :return: whether the failure is transient, and a short description of the classification
+        :rtype: tuple (bool, string)
+        """
+        reason = evaluation.reason if isinstance(evaluation, ErroredEvaluation) else ""
+
+        if reason.startswith("Timeout"):
+            return self.retry_timeouts, "timeout"
+        if reason in ["Cancelled", "Infeasible parameters"]:
+            return False, reason.lower()
+
+        if output:
+            for pattern in self.permanentpatterns:
+                match = re.search(pattern, output)
+                if match:
+                    return False, "output contains '" + match.group(0) + "'"
+            for pattern in self.transientpatterns:
+                match = re.search(pattern, output)
+                if match:
+                    return True, "output contains '" + match.group(0) + "'"
+
+        if returncode is not None and returncode < 0:
+            return True, "killed by signal " + str(-returncode)
+
+        if not output:
+            return True, "no output"
+
+        return False, "exit status " + str(returncode)
+
+    def shouldRetry(self, evaluation, attempt, returncode=None, output=None):
+        """Decides whether a failed evaluation is resubmitted.
+
+        :param evaluation: the failed evaluation
+        :type evaluation: ErroredEvaluation
+        :param attempt: number of retries of this evaluation so far
+        :type attempt: int
+        :param returncode: exit status of the UG4 process, None if not known
+        :type returncode: int, optional
+        :param output: output of UG4, None if not available
+        :type output: string, optional
+        :return: whether to resubmit, and a short description of the classification
+        :rtype: tuple (bool, string)
+        """
+        transient, description = self.classify(evaluation, returncode, output)
+        return transient and attempt < self.maxretries, description
@@ -0,0 +1,121 @@
+import os
+import time
+from UGParameterEstimator import ParameterManager, Evaluation, ParameterOutputAdapter
+from .localEvaluator import LocalEvaluator
+from .workerPool import WorkerPool
+
+
+class WorkerEvaluator(LocalEvaluator):
+    """LocalEvaluator keeping jobcount UG4 processes alive, instead of starting a new one for every evaluation.
+
+    Each worker loads plugins, reads the grid and builds the refinement hierarchy once, and then evaluates the
+    parameter sets sent to it, so the startup time is only paid once per worker. The luafile has to implement
+    the worker side of the file protocol described in Worker: it is called with -workerId <index> instead of
+    -evaluationId <id>, waits for the request file containing the id of the next evaluation, and writes the
+    done file when the evaluation is finished. example/example_convection/worker.lua implements this loop,
+    see example/example_convection/evaluate_worker.lua for its usage.
+
+    Parameters and results are exchanged through the same files as for single runs, so all evaluation types and parameter
+    output adapters can be used. The output of each evaluation is copied from the output of its worker to <id>_ug_output.txt.
+    Cancelled evaluations and evaluations exceeding their timeout kill their worker, which is started again for the next evaluation.
+    The timeout only counts from the moment the worker takes the request, i.e. the startup of the worker is excluded.
+
+    Workers are stopped by close, or when the python process exits.
+
+    """
+
+    def __init__(self, luafile, directory, parametermanager: ParameterManager, evaluation_type: Evaluation, parameter_output_adapter: ParameterOutputAdapter, fixedparameters={}, threadcount=10, cliparameters=[], jobcount=1):
+        """Class constructor, see LocalEvaluator. jobcount is the number of workers.
+        """
+        super().__init__(luafile, directory, parametermanager, evaluation_type, parameter_output_adapter, fixedparameters, threadcount, cliparameters, jobcount)
+        self.pool = None
+
+    def getWorkerCommand(self, index):
+        """Returns the command line starting the worker with the given index.
+
+        :param index: index of the worker
+        :type index: int
+        :return: the command line
+        :rtype: list of strings
+        """
+        absolute_directory_path = os.getcwd() + "/" + self.directory
+        absolute_script_path = os.getcwd() + "/" + self.luafile
+        return self.getCallParameters(absolute_script_path, ["-workerId", str(index), "-communicationDir", absolute_directory_path])
+
+    def startEvaluation(self, parameters):
+        """Starts a single evaluation. It is run as soon as one of the workers is free.
+
+        :param parameters: the (transformed) parameters to evaluate
+        :type parameters: numpy array
+        :return: future resulting in the parsed evaluation object or ErroredEvaluation
+        :rtype: concurrent.futures.Future
+        """
+        if self.pool is None:
+            self.pool = WorkerPool(self.jobcount, self.getWorkerCommand, self.directory)
+        return super().startEvaluation(parameters)
+
+    def runProcess(self, callParameters, stdoutfile, evaluation_id):
+        """Runs one evaluation on a worker and blocks until it is finished. The process of the worker is registered
+        while running the evaluation, so it can be killed when the evaluation is cancelled or the evaluator is left unexpectedly.
+
+        :param callParameters: the command line of a single run, unused
+        :type callParameters: list of strings
+        :param stdoutfile: file to copy the output of the evaluation to
+        :type stdoutfile: string
+        :param evaluation_id: id of the evaluation
+        :type evaluation_id: int
+        :return: the exit code of the worker (0 if it finished the evaluation), and the exceeded timeout (None if finished in time)
+        :rtype: tuple (int, float)
+        """
+        worker = self.pool.acquire()
+        try:
+            offset = worker.getOutputSize()
+            with self.processlock:
+                self.processes[evaluation_id] = worker.process
+                if evaluation_id in self.cancelledids:
+                    worker.kill(self.killgraceperiod)
+
+            worker.send(evaluation_id)
+
+            starttime = None
+            exceeded = None
+            while True:
+                if worker.isDone():
+                    returncode = 0
+                    break
+
+                returncode = worker.process.poll()
+                if returncode is not None:
+                    break
+
+                if starttime is None and worker.isPicked():
+                    starttime = time.time()
+
+                timeout = self.getTimeout()
+                if exceeded is None and timeout is not None and starttime is not None and time.time() - starttime > timeout:
+                    worker.kill(self.killgraceperiod)
+                    exceeded = timeout
+
+                time.sleep(self.pool.pollinterval)
+
+            worker.copyOutput(offset, stdoutfile)
+            return returncode, exceeded
+        finally:
+            with self.processlock:
+                self.processes.pop(evaluation_id, None)
+            self.pool.release(worker)
+
+    def close(self):
+        """Stops all workers. They are started again, if further evaluations are submitted.
+        """
+        if self.pool is not None:
+            self.pool.close()
+
+    def getStatistics(self):
+        """returns the internal statistics as a string representation
+        :return: string with statistics information
+        :rtype: string
+        """
+        string = super().getStatistics()
+        string += "\nWorker starts: " + str(0 if self.pool is None else self.pool.starts)
+        return string
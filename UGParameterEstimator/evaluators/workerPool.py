@@ -0,0 +1,247 @@
+import atexit
+import os
+import os.path
+import queue
+import subprocess
+import threading
+import time
+from .localEvaluator import LocalEvaluator
+
+
+class Worker:
+    """A long-lived UG4 process evaluating one parameter set after another.
+
+    Workers communicate with the python side through files in the exchange directory, so the
+    protocol works for plain ugshell processes as well as for mpirun jobs (all ranks read the same files):
+
+    - the worker is started once with the arguments -workerId <index> -communicationDir <directory>,
+      and can then load plugins, read the grid and refine it,
+    - to evaluate a parameter set, its parameters are written as for a single run (e.g. <id>_parameters.json),
+      and the request "<id> <sequence>" is written to the request file worker_<index>.request, where sequence
+      counts the requests sent to the worker process, so a resubmitted evaluation is a new request as well,
+    - the worker waits for the content of the request file to change. The request file is never deleted by the
+      worker, so all ranks of an MPI job can read it,
+    - the first rank writes the request to the file worker_<index>.started (this marks the start of the evaluation),
+      then all ranks evaluate the parameter set, writing the results as for a single run (e.g. <id>_measurement.csv),
+    - finally the first rank writes the request to the file worker_<index>.done, and the worker waits for the next request,
+    - if the request is "stop <sequence>" instead, the worker exits.
+
+    All files are written to a temporary file first and renamed, so they are never read half-written.
+    See example/example_convection/worker.lua for an implementation of the worker side in lua.
+    The output of the worker is appended to worker_<index>_output.txt. The worker is started in its own session,
+    so killing it also kills the MPI processes started by mpirun (see LocalEvaluator.killProcess).
+
+    :param index: index of the worker
+    :type index: int
+    :param command: the command line starting the worker
+    :type command: list of strings
+    :param directory: directory used to exchange data with the worker
+    :type directory: string
+    """
+
+    def __init__(self, index, command, directory):
+        self.index = index
+        self.command = command
+        self.directory = directory
+        self.process = None
+        self.starts = 0
+        self.request = None
+        self.sequence = 0
+        self.requestfile = os.path.join(directory, "worker_" + str(index) + ".request")
+        self.startedfile = os.path.join(directory, "worker_" + str(index) + ".started")
+        self.donefile = os.path.join(directory, "worker_" + str(index) + ".done")
+        self.outputfile = os.path.join(directory, "worker_" + str(index) + "_output.txt")
+
+    def isRunning(self):
+        """Returns True, if the process of the worker is alive.
+
+        :rtype: bool
+        """
+        return self.process is not None and self.process.poll() is None
+
+    def start(self):
+        """Starts the process of the worker, discarding requests left over by a previous process.
+        """
+        for filename in [self.requestfile, self.startedfile, self.donefile]:
+            if os.path.exists(filename):
+                os.remove(filename)
+        self.request = None
+        self.sequence = 0
+
+        with open(self.outputfile, "ab") as outfile:
+            self.process = subprocess.Popen(self.command, stdout=outfile, stderr=subprocess.STDOUT, start_new_session=True)
+        self.starts += 1
+
+    def send(self, request):
+        """Writes a request for the worker.
+
+        :param request: the id of the evaluation to run, or "stop"
+        :type request: int or string
+        """
+        self.sequence += 1
+        self.request = str(request) + " " + str(self.sequence)
+        WorkerPool.writeFile(self.requestfile, self.request)
+
+    def readFile(self, filename):
+        """Returns the content of a file written by the worker, or None if it does not exist.
+
+        :param filename: path of the file
+        :type filename: string
+        :rtype: string
+        """
+        try:
+            with open(filename) as f:
+                return f.read().strip()
+        except OSError:
+            return None
+
+    def isPicked(self):
+        """Returns True, if the worker has taken the last request.
+
+        :rtype: bool
+        """
+        return self.request is not None and self.readFile(self.startedfile) == self.request
+
+    def isDone(self):
+        """Returns True, if the worker has finished the last request. Removes the done file in this case.
+
+        :rtype: bool
+        """
+        if self.request is None or self.readFile(self.donefile) != self.request:
+            return False
+
+        os.remove(self.donefile)
+        return True
+
+    def getOutputSize(self):
+        """Returns the current size of the output file of the worker, used to separate the output of single evaluations.
+
+        :rtype: int
+        """
+        try:
+            return os.path.getsize(self.outputfile)
+        except OSError:
+            return 0
+
+    def copyOutput(self, offset, filename):
+        """Copies the output of the worker written since offset to another file.
+
+        :param offset: position in the output file to start at, as returned by getOutputSize
+        :type offset: int
+        :param filename: file to write the output to
+        :type filename: string
+        """
+        with open(filename, "wb") as outfile:
+            if not os.path.exists(self.outputfile):
+                return
+            with open(self.outputfile, "rb") as f:
+                f.seek(offset)
+                outfile.write(f.read())
+
+    def kill(self, graceperiod):
+        """Kills the process of the worker together with the processes it started. It is started again when needed.
+
+        :param graceperiod: time in seconds the processes get to exit after SIGTERM, before they are sent SIGKILL
+        :type graceperiod: float
+        """
+        if self.isRunning():
+            LocalEvaluator.killProcess(self.process, graceperiod)
+
+    def stop(self, timeout):
+        """Asks the worker to exit, and kills it if it does not do so within timeout seconds.
+
+        :param timeout: time to wait for the worker in seconds
+        :type timeout: float
+        """
+        if not self.isRunning():
+            return
+
+        self.send("stop")
+        try:
+            self.process.wait(timeout)
+        except subprocess.TimeoutExpired:
+            LocalEvaluator.killProcess(self.process, 0)
+            self.process.wait()
+
+
+class WorkerPool:
+    """Fixed number of workers (see Worker), handed out to one evaluation at a time.
+
+    Workers are started when first acquired, and again when their process died (e.g. because it
+    crashed or was killed on a timeout or cancellation). All workers are stopped by close, which is also
+    called when the python process exits.
+
+    :param size: number of workers
+    :type size: int
+    :param command: function returning the command line starting the worker with the given index
+    :type command: function (int) -> list of strings
+    :param directory: directory used to exchange data with the workers
+    :type directory: string
+    """
+
+    # interval in seconds in which the request and done files are checked
+    pollinterval = 0.01
+
+    # time in seconds workers get to exit after being asked to do so, before they are killed
+    stoptimeout = 10
+
+    def __init__(self, size, command, directory):
+        self.workers = [Worker(i, command(i), directory) for i in range(size)]
+        self.idle = queue.Queue()
+        for worker in self.workers:
+            self.idle.put(worker)
+        self.lock = threading.Lock()
+        atexit.register(self.close)
+
+    @property
+    def starts(self):
+        """Returns the number of times a worker process was started.
+
+        :rtype: int
+        """
+        return sum(worker.starts for worker in self.workers)
+
+    def acquire(self):
+        """Waits for an idle worker and returns it, started if it was not running.
+
+        :return: the worker, which has to be passed to release afterwards
+        :rtype: Worker
+        """
+        worker = self.idle.get()
+        with self.lock:
+            if not worker.isRunning():
+                worker.start()
+        return worker
+
+    def release(self, worker):
+        """Returns a worker acquired before to the pool.
+
+        :param worker: the worker
+        :type worker: Worker
+        """
+        self.idle.put(worker)
+
+    def close(self):
+        """Stops all workers.
+        """
+        with self.lock:
+            for worker in self.workers:
+                if worker.isRunning():
+                    worker.send("stop")
+            deadline = time.time() + self.stoptimeout
+            for worker in self.workers:
+                worker.stop(max(0, deadline - time.time()))
+
+    @staticmethod
+    def writeFile(filename, content):
+        """Writes a file atomically, by writing to a temporary file and renaming it.
+
+        :param filename: path of the file
+        :type filename: string
+        :param content: content to write
+        :type content: string
+        """
+        temporary = filename + ".tmp"
+        with open(temporary, "w") as f:
+            f.write(content)
+        os.replace(temporary, filename)
@@ -9,6 +9,11 @@ class LineSearch(ABC):
     providing a helper function
     """
 
+    parallel_evaluations = None
+
+    # function returning the points to evaluate speculatively if a candidate is accepted, see evaluateCandidates
+    speculation = None
+
     def __init__(self, evaluator):
         """Class constructor setting the evaluator to use
 
@@ -17,6 +22,9 @@ class LineSearch(ABC):
         """
         self.evaluator = evaluator
 
+        # tuples (candidate, futures) of the speculative evaluations started asynchronously, see evaluateCandidates
+        self.speculativefutures = []
+
     def measurementToNumpyArrayConverter(self, evaluations, target):
         """Helper function to convert an array of Evaluation.
         Each evaluation will be converted and interpolated using it's
@@ -40,6 +48,88 @@ class LineSearch(ABC):
                 results.append(e.getNumpyArrayLike(target))
         return results
 
+    def getParallelEvaluations(self):
+        """Returns the number of parallel evaluations to use in each iteration of the line search.
+        If parallel_evaluations is None, the batch is sized to the parallelism of the evaluator.
+
+        :return: number of parallel evaluations, at least 2
+        :rtype: int
+        """
+        if self.parallel_evaluations is None:
+            return max(2, self.evaluator.parallelism)
+        return self.parallel_evaluations
+
+    def evaluateCandidates(self, candidates, guess, J, r, result):
+        """Evaluates the candidates of one iteration of the line search.
+
+        If speculation is set (e.g. by an optimizer, to the points needed for the jacobi matrix at an accepted candidate),
+        slots of the evaluator not used by the candidates are filled with the speculative points of the candidates with the
+        lowest residual norm predicted by the linearization r + J (x - guess).
+
+        If the evaluator is asynchronous, the speculative points are submitted separately and the line search does not wait for them.
+        finishSpeculation has to be called when the line search is finished, to cancel the evaluations which are no longer needed.
+        Otherwise, they are evaluated in the same batch as the candidates, and are served from the cache of the evaluator afterwards.
+
+        :param candidates: the points to evaluate
+        :type candidates: list of numpy arrays
+        :param guess: the initial guess of the line search
+        :type guess: numpy array in parameter space
+        :param J: the jacobian at guess
+        :type J: numpy array
+        :param r: the residual vector at guess
+        :type r: numpy array in measurement space
+        :param result: the result object to log to
+        :type result: Result
+        :return: the evaluations of the candidates
+        :rtype: list of Evaluation
+        """
+        speculative = []
+        if self.speculation is not None:
+            spare = self.evaluator.parallelism - len(candidates)
+            pointcount = len(self.speculation(guess))
+            count = min(len(candidates), spare // pointcount) if pointcount > 0 else 0
+
+            if count > 0:
+                predicted = [np.linalg.norm(r + J.dot(c - guess)) for c in candidates]
+                speculative = [candidates[index] for index in np.argsort(predicted, kind="stable")[:count]]
+
+                result.log("\tevaluating the jacobi matrix of " + str(count) + " candidates speculatively")
+                result.addMetric("speculativeevaluations", result.currentIteration.get("speculativeevaluations", 0) + count * pointcount)
+
+        if self.evaluator.asynchronous:
+            futures = self.evaluator.submit(candidates)
+            for candidate in speculative:
+                self.speculativefutures.append((candidate, self.evaluator.submit(self.speculation(candidate))))
+
+            with self.evaluator:
+                return self.evaluator.collect(futures, "linesearch")
+
+        points = list(candidates)
+        for candidate in speculative:
+            points += self.speculation(candidate)
+
+        with self.evaluator:
+            evaluations = self.evaluator.evaluate(points, True, "linesearch")
+
+        return evaluations[:len(candidates)]
+
+    def finishSpeculation(self, accepted):
+        """Ends the speculation started by evaluateCandidates. Speculative evaluations of other candidates than the accepted one are
+        cancelled, the ones of the accepted candidate are waited for, so they are in the cache of the evaluator.
+
+        :param accepted: the accepted candidate, or None if the line search failed
+        :type accepted: numpy array
+        """
+        for candidate, futures in self.speculativefutures:
+            if accepted is None or not np.array_equal(candidate, accepted):
+                self.evaluator.cancel(futures)
+
+        for candidate, futures in self.speculativefutures:
+            self.evaluator.collect(futures, "speculative")
+
+        self.speculativefutures = []
+        self.speculation = None
+
     @abstractmethod
     def doLineSearch(self, stepdirection, guess, target, J, r, result):
         """Executes the line search along a given direction
@@ -54,9 +144,11 @@ class LineSearch(ABC):
         :type J: numpy array PxP
         :param r: the last residual vector
         :type r: numpy array in measurement space
-        :param result: a tuple of final best guess, and overall
-        lowest residual value. Or (None, None), if an error occurred.
-        :type result: tuple (numpy array, scalar)
+        :param result: the result object to log to
+        :type result: Result
+        :return: a tuple of final best guess, overall lowest residual value and the evaluation at the final best guess.
+        Or (None, None, None), if an error occurred.
+        :rtype: tuple (numpy array, scalar, Evaluation)
         """
         pass
 
@@ -86,7 +178,7 @@ class LinearParallelLineSearch(LineSearch):
         :param max_iterations: maximum number of iterations, defaults to 3
         :type max_iterations: int, optional
         :param parallel_evaluations: parallel evaluations in each
-        iteration, defaults to 10
+        iteration, defaults to 10. If None, the parallelism of the evaluator is used.
         :type parallel_evaluations: int, optional
         """
         super().__init__(evaluator)
@@ -97,6 +189,7 @@ class LinearParallelLineSearch(LineSearch):
 
         # calculate the gradient at the current point
         grad = J.transpose().dot(r)
+        parallel_evaluations = self.getParallelEvaluations()
 
         low = 0                     # current lowest value of the search window
         top = 1                     # current highest value of the search window
@@ -104,21 +197,22 @@ class LinearParallelLineSearch(LineSearch):
 
         overall_minnorm = float("inf")
         overall_minalpha = -1
+        overall_minguess = None
+        overall_minevaluation = None
 
         all_alphas = []
 
         result.addRunMetadata("ls_maxiterations", self.max_iterations)
-        result.addRunMetadata("ls_parallel_evaluations", self.parallel_evaluations)
+        result.addRunMetadata("ls_parallel_evaluations", parallel_evaluations)
 
         while True:
             l += 1
-            alphas = np.linspace(low, top, num=self.parallel_evaluations)
+            alphas = np.linspace(low, top, num=parallel_evaluations)
             evaluations = []
-            for i in range(self.parallel_evaluations):
+            for i in range(parallel_evaluations):
                 evaluations.append(guess + alphas[i] * stepdirection)
 
-            with self.evaluator:
-                nextevaluations = self.evaluator.evaluate(evaluations, True, "linesearch")
+            nextevaluations = self.evaluateCandidates(evaluations, guess, J, r, result)
 
             nextfunctionvalues = self.measurementToNumpyArrayConverter(nextevaluations, target)
 
@@ -127,7 +221,7 @@ class LinearParallelLineSearch(LineSearch):
             minindex = -1
 
             # find the evaluation with lowest residualnorm, and check if all evaluations returned none, i.e. did not finish in UG
-            for i in range(self.parallel_evaluations):
+            for i in range(parallel_evaluations):
                 if isinstance(nextevaluations[i], ErroredEvaluation):
                     result.log("\t\talpha_" + str(i) + " = " + str(alphas[i]) + " errored: " + nextevaluations[i].reason)
                     all_alphas.append((alphas[i], None))
@@ -139,7 +233,7 @@ class LinearParallelLineSearch(LineSearch):
                 residualnorm = 0.5 * residual.dot(residual)
                 all_alphas.append((alphas[i], residualnorm))
 
-                result.log("\t\talpha_" + str(i) + " = " + str(alphas[i]) + ", evalid=" + str(nextevaluations[i].eval_id) + ", residual = " + str(residualnorm))
+                result.log("\t\talpha_" + str(i) + " = " + str(alphas[i]) + ", evalid=" + str(nextevaluations[i].eval_id) + ", residual = " + str(residualnorm), result.LogLevel.DEBUG)
 
                 if (residualnorm < minnorm):
                     minnorm = residualnorm
@@ -147,29 +241,31 @@ class LinearParallelLineSearch(LineSearch):
                     if (minnorm < overall_minnorm):
                         overall_minnorm = minnorm
                         overall_minalpha = alphas[minindex]
+                        overall_minguess = evaluations[minindex]
+                        overall_minevaluation = nextevaluations[minindex]
 
             if (allNone):
                 result.log("\t [" + str(l) + "]: no run finished.")
 
                 if l == self.max_iterations:
                     result.addMetric("lineSearchAlphas", all_alphas)
-                    return None, None
+                    return None, None, None
                 else:
                     low = 0
-                    top = top / self.parallel_evaluations
+                    top = top / parallel_evaluations
                     continue
 
             minindex_alpha = alphas[minindex]
             continue_override = False
 
-            if minindex == self.parallel_evaluations - 1:
+            if minindex == parallel_evaluations - 1:
                 continue_override = True
                 next_low = top
                 next_top = top + (top - low)
             elif minindex == 0 and low == 0:
                 continue_override = True
                 next_low = 0
-                next_top = top / self.parallel_evaluations
+                next_top = top / parallel_evaluations
             else:
                 next_low = max(0, minindex_alpha - (top - low) / 4)
                 next_top = minindex_alpha + (top - low) / 4
@@ -180,15 +276,15 @@ class LinearParallelLineSearch(LineSearch):
             if ((overall_minnorm < lowerbound and not continue_override)):
                 result.addMetric("alpha", overall_minalpha)
                 result.addMetric("lineSearchAlphas", all_alphas)
-                return guess + overall_minalpha * stepdirection, overall_minnorm
+                return overall_minguess, overall_minnorm, overall_minevaluation
 
             if l == self.max_iterations:
                 result.addMetric("lineSearchAlphas", all_alphas)
                 if overall_minnorm < lowerbound:
                     result.addMetric("alpha", overall_minalpha)
-                    return guess + overall_minalpha * stepdirection, overall_minnorm
+                    return overall_minguess, overall_minnorm, overall_minevaluation
 
-                return None, None
+                return None, None, None
 
             low = next_low
             top = next_top
@@ -218,7 +314,7 @@ class LogarithmicParallelLineSearch(LineSearch):
         A value of 5 (default), means the initial search window is between 1 and 1/2^5
         :type size: int, optional
         :param parallel_evaluations: parallel evaluations in each
-        iteration, defaults to 10
+        iteration, defaults to 10. If None, the parallelism of the evaluator is used.
         :type parallel_evaluations: int, optional
         """
         super().__init__(evaluator)
@@ -230,23 +326,23 @@ class LogarithmicParallelLineSearch(LineSearch):
 
         # calculate the gradient at the current point
         grad = J.transpose().dot(r)
+        parallel_evaluations = self.getParallelEvaluations()
         l = 0
         highest_power = self.highest_power
         all_alphas = []
 
         result.addRunMetadata("ls_maxiterations", self.max_iterations)
         result.addRunMetadata("ls_size", self.size)
-        result.addRunMetadata("ls_parallel_evaluations", self.parallel_evaluations)
+        result.addRunMetadata("ls_parallel_evaluations", parallel_evaluations)
 
         while True:
             l += 1
             evaluations = []
-            alphas = np.logspace(highest_power - self.size, highest_power, base=2, num=self.parallel_evaluations)
-            for i in range(self.parallel_evaluations):
+            alphas = np.logspace(highest_power - self.size, highest_power, base=2, num=parallel_evaluations)
+            for i in range(parallel_evaluations):
                 evaluations.append(guess + alphas[i] * stepdirection)
 
-            with self.evaluator:
-                nextevaluations = self.evaluator.evaluate(evaluations, True, "linesearch")
+            nextevaluations = self.evaluateCandidates(evaluations, guess, J, r, result)
 
             nextfunctionvalues = self.measurementToNumpyArrayConverter(nextevaluations, target)
 
@@ -255,7 +351,7 @@ class LogarithmicParallelLineSearch(LineSearch):
             minindex = -1
 
             # find the evaluation with lowest residualnorm, and check if all evaluations returned none, i.e. did not finish in UG
-            for i in range(self.parallel_evaluations):
+            for i in range(parallel_evaluations):
                 if isinstance(nextevaluations[i], ErroredEvaluation):
                     result.log("\t\talpha_" + str(i) + " = " + str(alphas[i]) + " did not finish: : " + nextevaluations[i].reason)
                     all_alphas.append((alphas[i], None))
@@ -267,7 +363,7 @@ class LogarithmicParallelLineSearch(LineSearch):
                 residualnorm = 0.5 * residual.dot(residual)
                 all_alphas.append((alphas[i], residualnorm))
 
-                result.log("\t\talpha_" + str(i) + " = " + str(alphas[i]) + ", evalid=" + str(nextevaluations[i].eval_id) + ", residual = " + str(residualnorm))
+                result.log("\t\talpha_" + str(i) + " = " + str(alphas[i]) + ", evalid=" + str(nextevaluations[i].eval_id) + ", residual = " + str(residualnorm), result.LogLevel.DEBUG)
 
                 if (residualnorm < minnorm):
                     minnorm = residualnorm
@@ -279,7 +375,7 @@ class LogarithmicParallelLineSearch(LineSearch):
                 if l == self.max_iterations:
 
                     result.addMetric("lineSearchAlphas", all_alphas)
-                    return None, None
+                    return None, None, None
                 else:
                     highest_power -= self.size
                     continue
@@ -292,14 +388,14 @@ class LogarithmicParallelLineSearch(LineSearch):
             if minnorm < lowerbound and minindex != 0:
                 result.addMetric("alpha", minindex_alpha)
                 result.addMetric("lineSearchAlphas", all_alphas)
-                return guess + minindex_alpha * stepdirection, minnorm
+                return evaluations[minindex], minnorm, nextevaluations[minindex]
             elif l == self.max_iterations:
                 if minnorm < lowerbound:
                     result.addMetric("alpha", minindex_alpha)
                     result.addMetric("lineSearchAlphas", all_alphas)
-                    return guess + minindex_alpha * stepdirection, minnorm
+                    return evaluations[minindex], minnorm, nextevaluations[minindex]
                 result.addMetric("lineSearchAlphas", all_alphas)
-                return None, None
+                return None, None, None
 
             highest_power -= self.size
 
@@ -324,13 +420,12 @@ class BacktrackingLineSearch(LineSearch):
 
         while True:
             nextguess = guess + alpha * stepdirection
-            with self.evaluator:
-                nextevaluation = self.evaluator.evaluate([nextguess], True, "linesearch")
+            nextevaluation = self.evaluateCandidates([nextguess], guess, J, r, result)[0]
 
             if nextevaluation is None or isinstance(nextevaluation, ErroredEvaluation):
-                return None, None
+                return None, None, None
 
-            nextfunctionvalue = self.measurementToNumpyArrayConverter(nextevaluation, target)[0]
+            nextfunctionvalue = self.measurementToNumpyArrayConverter([nextevaluation], target)[0]
 
             residual = nextfunctionvalue - target.getNumpyArray()
             nextresidualnorm = 0.5 * residual.dot(residual)
@@ -344,8 +439,8 @@ class BacktrackingLineSearch(LineSearch):
             result.addMetric("alpha", alpha)
 
             if (nextresidualnorm <= lowerbound):
-                return nextguess, nextresidualnorm
+                return nextguess, nextresidualnorm, nextevaluation
             alpha = alpha * self.rho
 
             if (l == self.max_iterations):
-                return None, None
+                return None, None, None
@@ -1,4 +1,5 @@
 from .optimizer import Optimizer
+from .levMarOptimizer import LevMarSolver
 from UGParameterEstimator import LineSearch, Result, ErroredEvaluation
 import numpy as np
 
@@ -14,16 +15,20 @@ class GainedLevMarOptimizer(Optimizer):
         self.initial_lam = initial_lam
 
     def calculateDelta(self, V, r, p, lam):
-
-        # calculate Lev-Mar step direction  (p.7)
-        A = V.transpose().dot(V)
-        g = V.transpose().dot(r)
-
-        M = A + lam * np.diag(np.ones(p))
-        Q, R = np.linalg.qr(M)
-        w = Q.transpose().dot(g)
-        delta = -np.linalg.solve(R, w)
-        return delta
+        """Calculates the Levenberg-Marquardt step for a single lambda, see LevMarSolver.
+
+        :param V: the jacobi matrix
+        :type V: numpy array
+        :param r: the residual vector
+        :type r: numpy array
+        :param p: number of parameters
+        :type p: int
+        :param lam: the lambda to use
+        :type lam: float
+        :return: the step
+        :rtype: numpy array
+        """
+        return LevMarSolver(V, r).getStep(lam)
 
     def calculateGainRatio(self, S, newS, delta, lam, grad):
         denum = 0.5 * delta.transpose().dot(lam * delta - grad)
@@ -103,16 +108,15 @@ class GainedLevMarOptimizer(Optimizer):
 
             lambdas = [lam]
             nus = [nu]
-            deltas = [self.calculateDelta(V, r, p, lam)]
-            points = [guess + deltas[-1]]
 
             for z in range(self.presteps):
                 new_nu = nus[-1] * 2
                 nus.append(new_nu)
                 new_lam = lambdas[-1] * nus[-1]
                 lambdas.append(new_lam)
-                deltas.append(self.calculateDelta(V, r, p, new_lam))
-                points.append(guess + deltas[-1])
+
+            deltas = LevMarSolver(V, r).getSteps(lambdas)
+            points = [guess + delta for delta in deltas]
 
             evals = evaluator.evaluate(points)
             evalvecs = self.measurementToNumpyArrayConverter(evals, target)
@@ -126,7 +130,7 @@ class GainedLevMarOptimizer(Optimizer):
                 if isinstance(evals[z], ErroredEvaluation):
                     result.log("\t lam=" + str(lambdas[z]) + ", nu=" + str(nus[z]) + ": " + evals[z].reason)
                 else:
-                    result.log("\t lam=" + str(lambdas[z]) + ", nu=" + str(nus[z]) + ": f=" + str(costs[z]) + ", new gainration=" + str(gainratios[z]))
+                    result.log("\t lam=" + str(lambdas[z]) + ", nu=" + str(nus[z]) + ": f=" + str(costs[z]) + ", new gainration=" + str(gainratios[z]), Result.LogLevel.DEBUG)
 
             for z in range(self.presteps + 1):
                 if gainratios[z] > 0:   # step acceptable
@@ -6,9 +6,10 @@ from scipy import stats
 
 class GaussNewtonOptimizer(Optimizer):
 
-    def __init__(self, linesearchmethod: LineSearch, maxiterations=15, epsilon=1e-3, minreduction=1e-4, differencing=Optimizer.Differencing.forward):
-        super().__init__(epsilon, differencing)
+    def __init__(self, linesearchmethod: LineSearch, maxiterations=15, epsilon=1e-3, minreduction=1e-4, differencing=Optimizer.Differencing.forward, broyden_interval=None, adaptive_epsilon=False, speculative=False):
+        super().__init__(epsilon, differencing, broyden_interval, adaptive_epsilon)
         self.linesearchmethod = linesearchmethod
+        self.speculative = speculative
         self.maxiterations = maxiterations
         self.minreduction = minreduction
 
@@ -23,6 +24,9 @@ class GaussNewtonOptimizer(Optimizer):
         result.addRunMetadata("linesearchmethod", type(self.linesearchmethod).__name__)
         result.addRunMetadata("epsilon", self.finite_differencing_epsilon)
         result.addRunMetadata("differencing", self.differencing.value)
+        result.addRunMetadata("broyden_interval", self.broyden_interval)
+        result.addRunMetadata("adaptive_epsilon", self.adaptive_epsilon)
+        result.addRunMetadata("speculative", self.speculative)
         result.addRunMetadata("fixedparameters", evaluator.fixedparameters)
         result.addRunMetadata("parametermanager", evaluator.parametermanager)
 
@@ -33,9 +37,13 @@ class GaussNewtonOptimizer(Optimizer):
         last_S = -1
         first_S = -1
 
+        # evaluation at guess, if already calculated by the line search
+        guessevaluation = None
+        self.resetJacobiMatrixUpdates()
+
         for i in range(self.maxiterations):
 
-            jacobi_result = self.getJacobiMatrix(guess, evaluator, target, result)
+            jacobi_result = self.getJacobiMatrixUpdated(guess, evaluator, target, result, guessevaluation)
             if jacobi_result is None:
                 result.log("Error calculating Jacobi matrix, UG run did not finish")
                 result.log(evaluator.getStatistics())
@@ -106,8 +114,19 @@ class GaussNewtonOptimizer(Optimizer):
                 result.commitIteration()
                 break
 
+            # if the next jacobi matrix will be calculated by finite differencing, the line search can evaluate
+            # the disturbed points of its most promising candidates in unused slots of the evaluator
+            if self.speculative and (self.broyden_interval is None or self.broydenupdates + 1 >= self.broyden_interval):
+                self.linesearchmethod.speculation = self.getJacobiMatrixPoints
+
             # do linesearch in the gauss-newton search direction
-            nextguess = self.linesearchmethod.doLineSearch(delta, guess, target, V, r, result)[0]
+            nextguess, _, nextevaluation = self.linesearchmethod.doLineSearch(delta, guess, target, V, r, result)
+            self.linesearchmethod.finishSpeculation(nextguess)
+
+            if nextguess is None and self.refreshJacobiMatrix():
+                result.log("line search failed using the updated jacobi matrix, calculating it by finite differencing.")
+                result.commitIteration()
+                continue
 
             if (nextguess is None):
                 result.log("-- Newton method did not converge. --")
@@ -119,6 +138,7 @@ class GaussNewtonOptimizer(Optimizer):
             result.commitIteration()
 
             guess = nextguess
+            guessevaluation = nextevaluation
             last_S = S
 
         if (i == self.maxiterations - 1):
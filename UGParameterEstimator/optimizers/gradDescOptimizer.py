@@ -5,8 +5,8 @@ import numpy as np
 
 class GradientDescentOptimizer(Optimizer):
 
-    def __init__(self, linesearchmethod: LineSearch, maxiterations=15, epsilon=1e-3, minreduction=1e-4, max_error_ratio=(0.05, 0.95), differencing=Optimizer.Differencing.forward):
-        super().__init__(epsilon, differencing)
+    def __init__(self, linesearchmethod: LineSearch, maxiterations=15, epsilon=1e-3, minreduction=1e-4, max_error_ratio=(0.05, 0.95), differencing=Optimizer.Differencing.forward, broyden_interval=None, adaptive_epsilon=False):
+        super().__init__(epsilon, differencing, broyden_interval, adaptive_epsilon)
         self.linesearchmethod = linesearchmethod
         self.maxiterations = maxiterations
         self.minreduction = minreduction
@@ -23,6 +23,8 @@ class GradientDescentOptimizer(Optimizer):
         result.addRunMetadata("linesearchmethod", type(self.linesearchmethod).__name__)
         result.addRunMetadata("epsilon", self.finite_differencing_epsilon)
         result.addRunMetadata("differencing", self.differencing.value)
+        result.addRunMetadata("broyden_interval", self.broyden_interval)
+        result.addRunMetadata("adaptive_epsilon", self.adaptive_epsilon)
         result.addRunMetadata("fixedparameters", evaluator.fixedparameters)
         result.addRunMetadata("parametermanager", evaluator.parametermanager)
 
@@ -33,9 +35,13 @@ class GradientDescentOptimizer(Optimizer):
         last_S = -1
         first_S = -1
 
+        # evaluation at guess, if already calculated by the line search
+        guessevaluation = None
+        self.resetJacobiMatrixUpdates()
+
         for i in range(self.maxiterations):
 
-            jacobi_result = self.getJacobiMatrix(guess, evaluator, target, result)
+            jacobi_result = self.getJacobiMatrixUpdated(guess, evaluator, target, result, guessevaluation)
             if jacobi_result is None:
                 result.log("Error calculating Jacobi matrix, UG run did not finish")
                 result.log(evaluator.getStatistics())
@@ -86,7 +92,12 @@ class GradientDescentOptimizer(Optimizer):
                 break
 
             # do linesearch in the gauss-newton search direction
-            nextguess = self.linesearchmethod.doLineSearch(delta, guess, target, V, r, result)[0]
+            nextguess, _, nextevaluation = self.linesearchmethod.doLineSearch(delta, guess, target, V, r, result)
+
+            if nextguess is None and self.refreshJacobiMatrix():
+                result.log("line search failed using the updated jacobi matrix, calculating it by finite differencing.")
+                result.commitIteration()
+                continue
 
             if (nextguess is None):
                 result.log("-- Gradient descent method did not converge. --")
@@ -98,6 +109,7 @@ class GradientDescentOptimizer(Optimizer):
             result.commitIteration()
 
             guess = nextguess
+            guessevaluation = nextevaluation
             last_S = S
 
         if (i == self.maxiterations - 1):
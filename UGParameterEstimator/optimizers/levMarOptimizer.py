@@ -3,10 +3,72 @@ from UGParameterEstimator import LineSearch, Result
 import numpy as np
 
 
+class LevMarSolver:
+    """Solves the Levenberg-Marquardt equations (V^T V + lambda I) delta = -V^T r for any lambda.
+
+    V is decomposed once by a singular value decomposition V = U diag(s) W^T, so the step for each lambda is
+    delta = -W diag(s / (s^2 + lambda)) U^T r, costing O(p^2) instead of a new factorization. V^T V is never formed,
+    which would square the condition number of V.
+
+    If scaling is set, the columns of V are scaled to unit norm first, i.e. the equations are solved with
+    the diagonal of V^T V scaled to 1 (p.7), and the step is scaled back.
+
+    :param V: the jacobi matrix
+    :type V: numpy array
+    :param r: the residual vector
+    :type r: numpy array
+    :param scaling: whether to scale the columns of V
+    :type scaling: bool, optional
+    """
+
+    def __init__(self, V, r, scaling=False):
+        self.scaling = scaling
+
+        # columns of V without any sensitivity are not scaled
+        self.columnnorms = np.ones(V.shape[1])
+        if scaling:
+            norms = np.linalg.norm(V, axis=0)
+            self.columnnorms = np.where(norms > 0, norms, 1)
+
+        U, s, self.Wt = np.linalg.svd(V / self.columnnorms, full_matrices=False)
+        self.Ur = U.transpose().dot(r)
+
+        # singular values at the level of rounding errors are treated as 0, as done by numpy.linalg.pinv
+        cutoff = np.finfo(np.float64).eps * max(V.shape) * (s[0] if len(s) > 0 else 0)
+        self.singularvalues = np.where(s > cutoff, s, 0)
+
+    def getSteps(self, lams):
+        """Calculates the steps for multiple lambdas.
+
+        :param lams: the lambdas to calculate the steps for
+        :type lams: list of floats
+        :return: the step for each lambda, one per row
+        :rtype: numpy array
+        """
+        lams = np.asarray(lams, dtype=np.float64)[:, np.newaxis]
+        s = self.singularvalues
+        denominator = s**2 + lams
+
+        # directions with s = 0 do not contribute for lambda = 0, as for the pseudo inverse
+        factors = np.divide(s * self.Ur, denominator, out=np.zeros(denominator.shape), where=denominator > 0)
+
+        return -factors.dot(self.Wt) / self.columnnorms
+
+    def getStep(self, lam):
+        """Calculates the step for a single lambda.
+
+        :param lam: the lambda to use
+        :type lam: float
+        :return: the step
+        :rtype: numpy array
+        """
+        return self.getSteps([lam])[0]
+
+
 class LevMarOptimizer(Optimizer):
 
-    def __init__(self, maxiterations=15, initial_lam=0.01, nu=10, P=10, P_iteration_count=3, scaling=False, epsilon=1e-3, minreduction=1e-4, differencing=Optimizer.Differencing.forward):
-        super().__init__(epsilon, differencing)
+    def __init__(self, maxiterations=15, initial_lam=0.01, nu=10, P=10, P_iteration_count=3, scaling=False, epsilon=1e-3, minreduction=1e-4, differencing=Optimizer.Differencing.forward, broyden_interval=None, adaptive_epsilon=False):
+        super().__init__(epsilon, differencing, broyden_interval, adaptive_epsilon)
         self.maxiterations = maxiterations
         self.minreduction = minreduction
         self.nu = nu
@@ -16,33 +78,34 @@ class LevMarOptimizer(Optimizer):
         self.P_iteration_count = P_iteration_count
 
     def calculateDelta(self, V, r, p, lam):
-
-        scaling = self.scaling
-
-        # calculate Lev-Mar step direction  (p.7)
-        A = V.transpose().dot(V)
-        g = V.transpose().dot(r)
-
-        AStar = np.copy(A)
-        gStar = np.copy(g)
-
-        if scaling:
-            for x in range(p):
-                for y in range(p):
-                    AStar[x, y] = A[x, y] / (np.sqrt(A[x, x]) * np.sqrt(A[y, y]))
-                gStar[x] = g[x] / np.sqrt(A[x, x])
-
-        M = AStar + lam * np.diag(np.ones(p))
-        Q, R = np.linalg.qr(M)
-        w = Q.transpose().dot(g)
-        deltaStar = -np.linalg.solve(R, w)
-        delta = np.copy(deltaStar)
-
-        if scaling:
-            for x in range(p):
-                delta[x] = deltaStar[x] / np.sqrt(A[x, x])
-
-        return delta
+        """Calculates the Levenberg-Marquardt step for a single lambda, see LevMarSolver.
+
+        :param V: the jacobi matrix
+        :type V: numpy array
+        :param r: the residual vector
+        :type r: numpy array
+        :param p: number of parameters
+        :type p: int
+        :param lam: the lambda to use
+        :type lam: float
+        :return: the step
+        :rtype: numpy array
+        """
+        return LevMarSolver(V, r, self.scaling).getStep(lam)
+
+    def calculateDeltas(self, V, r, lams):
+        """Calculates the Levenberg-Marquardt steps for multiple lambdas, see LevMarSolver.
+
+        :param V: the jacobi matrix
+        :type V: numpy array
+        :param r: the residual vector
+        :type r: numpy array
+        :param lams: the lambdas to calculate the steps for
+        :type lams: list of floats
+        :return: the step for each lambda, one per row
+        :rtype: numpy array
+        """
+        return LevMarSolver(V, r, self.scaling).getSteps(lams)
 
     def run(self, evaluator, initial_parameters, target, result=Result()):
 
@@ -54,6 +117,8 @@ class LevMarOptimizer(Optimizer):
         result.addRunMetadata("optimizertype", type(self).__name__)
         result.addRunMetadata("epsilon", self.finite_differencing_epsilon)
         result.addRunMetadata("differencing", self.differencing.value)
+        result.addRunMetadata("broyden_interval", self.broyden_interval)
+        result.addRunMetadata("adaptive_epsilon", self.adaptive_epsilon)
         result.addRunMetadata("lambda_init", self.initial_lam)
         result.addRunMetadata("nu", self.nu)
         result.addRunMetadata("fixedparameters", evaluator.fixedparameters)
@@ -66,9 +131,13 @@ class LevMarOptimizer(Optimizer):
         first_S = -1
         lam = self.initial_lam
 
+        # evaluation at guess, if already calculated during the lambda search
+        guessevaluation = None
+        self.resetJacobiMatrixUpdates()
+
         for i in range(self.maxiterations):
 
-            jacobi_result = self.getJacobiMatrix(guess, evaluator, target, result)
+            jacobi_result = self.getJacobiMatrixUpdated(guess, evaluator, target, result, guessevaluation)
             if jacobi_result is None:
                 result.log("Error calculating Jacobi matrix, UG run did not finish")
                 result.log(evaluator.getStatistics())
@@ -110,76 +179,52 @@ class LevMarOptimizer(Optimizer):
                 result.commitIteration()
                 break
 
-            delta_lower_lam = self.calculateDelta(V, r, p, lam / self.nu)
-            delta_prev_lam = self.calculateDelta(V, r, p, lam)
-            delta_higher_lam = self.calculateDelta(V, r, p, lam * self.nu)
+            # search lambda = lam * nu^k, starting with k = -1 and increasing k, in batches sized to the parallelism of the evaluator.
+            # the smallest lambda reducing the residual norm is accepted.
+            batchsize = max(3, evaluator.parallelism)
+            exponents = np.arange(-1, self.P * self.P_iteration_count)
+            solver = LevMarSolver(V, r, self.scaling)
+            found = False
 
-            evals = evaluator.evaluate([guess + delta_lower_lam, guess + delta_prev_lam, guess + delta_higher_lam])
-            evalvecs = self.measurementToNumpyArrayConverter(evals, target)
+            for start in range(0, len(exponents), batchsize):
+                lams = lam * self.nu ** exponents[start:start + batchsize].astype(np.float64)
+                points = guess + solver.getSteps(lams)
+
+                with evaluator:
+                    evals = evaluator.evaluate(list(points), True, "lambda-search")
+                evalvecs = self.measurementToNumpyArrayConverter(evals, target)
+
+                costs = [None if x is None else 0.5 * (x - targetdata).dot(x - targetdata) for x in evalvecs]
+
+                for z in range(len(lams)):
+                    if costs[z] is None:
+                        result.log("\t lam = " + str(lams[z]) + ": " + evals[z].reason)
+                    else:
+                        result.log("\t lam = " + str(lams[z]) + ": f=" + str(costs[z]), Result.LogLevel.DEBUG)
+
+                for z in range(len(lams)):
+                    # as before, a lambda not larger than the current one is also accepted if the residual norm stays the same
+                    if costs[z] is not None and (costs[z] < S or (costs[z] == S and lams[z] <= lam)):
+                        lam = lams[z]
+                        new_S = costs[z]
+                        nextguess = points[z]
+                        nextevaluation = evals[z]
+                        found = True
+                        break
 
-            S_lower_lam = None if evalvecs[0] is None else 0.5 * (evalvecs[0] - targetdata).dot(evalvecs[0] - targetdata)
-            S_prev_lam = None if evalvecs[1] is None else 0.5 * (evalvecs[1] - targetdata).dot(evalvecs[1] - targetdata)
-            S_higher_lam = None if evalvecs[2] is None else 0.5 * (evalvecs[2] - targetdata).dot(evalvecs[2] - targetdata)
+                if found:
+                    break
 
-            found = False
-            if S_lower_lam is None:
-                result.log("\t lam = " + str(lam / self.nu) + ": " + evals[0].reason)
-            else:
-                result.log("\t lam = " + str(lam / self.nu) + ": f=" + str(S_lower_lam))
-
-            if S_prev_lam is None:
-                result.log("\t lam = " + str(lam) + ": " + evals[1].reason)
-            else:
-                result.log("\t lam = " + str(lam) + ": f=" + str(S_prev_lam))
-
-            if S_higher_lam is None:
-                result.log("\t lam = " + str(lam * self.nu) + ": " + evals[2].reason)
-            else:
-                result.log("\t lam = " + str(lam * self.nu) + ": f=" + str(S_higher_lam))
-
-            if S_lower_lam is not None and S_lower_lam <= S:
-                lam = lam / self.nu
-                new_S = S_lower_lam
-                nextguess = guess + delta_lower_lam
-            elif S_prev_lam is not None and S_prev_lam <= S:
-                new_S = S_prev_lam
-                nextguess = guess + delta_prev_lam
-            elif S_higher_lam is not None and S_higher_lam < S:
-                lam = lam * self.nu
-                new_S = S_higher_lam
-                nextguess = guess + delta_higher_lam
-            else:
-                for zl in range(self.P_iteration_count):
-                    points = []
-                    for z in range(self.P):
-                        new_lam = lam * self.nu**(zl * self.P + z)
-                        delta = self.calculateDelta(V, r, p, new_lam)
-                        points.append(guess + delta)
-
-                    evals = evaluator.evaluate(points)
-                    evalvecs = self.measurementToNumpyArrayConverter(evals, target)
-
-                    costs = [None if x is None else 0.5 * (x - targetdata).dot(x - targetdata) for x in evalvecs]
-
-                    for z in range(self.P):
-                        if costs[z] is None:
-                            result.log("\t lam = " + str(lam * self.nu**z) + ": " + evals[z].reason)
-                        else:
-                            result.log("\t lam = " + str(lam * self.nu**z) + ": f=" + str(costs[z]))
-                    for z in range(self.P):
-                        if costs[z] is not None and costs[z] < S:
-                            lam = lam * self.nu**z
-                            new_S = costs[z]
-                            nextguess = points[z]
-                            found = True
-                    if found:
-                        break
-                if not found:
-                    result.log("-- Levenberg-Marquardt method did not converge. --")
-                    result.commitIteration()
-                    result.log(evaluator.getStatistics())
-                    result.save()
-                    return result
+            if not found and self.refreshJacobiMatrix():
+                result.log("no lambda found using the updated jacobi matrix, calculating it by finite differencing.")
+                result.commitIteration()
+                continue
+            if not found:
+                result.log("-- Levenberg-Marquardt method did not converge. --")
+                result.commitIteration()
+                result.log(evaluator.getStatistics())
+                result.save()
+                return result
 
             result.log("[" + str(i) + "] best lam was = " + str(lam) + " with f=" + str(new_S))
 
@@ -190,6 +235,7 @@ class LevMarOptimizer(Optimizer):
             result.commitIteration()
 
             guess = nextguess
+            guessevaluation = nextevaluation
 
         if (i == self.maxiterations - 1):
             result.log("-- Levenberg-Marquardt method did not converge. --")
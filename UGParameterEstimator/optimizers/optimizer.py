@@ -15,7 +15,23 @@ class Optimizer(ABC):
 
     Differencing = Enum("Differencing", "central forward pure_forward pure_central")
 
-    def __init__(self, epsilon, differencing: Differencing):
+    # Broyden updates are not used if the residual norm of the last step was reduced by less than this factor
+    broyden_stall_reduction = 0.9
+
+    # adaptive step selection: number of evaluations along a random direction used to estimate the noise of the measurement
+    noise_probes = 6
+
+    # adaptive step selection: relative distance between these evaluations
+    noise_probe_distance = 1e-6
+
+    # adaptive step selection: relative step used to estimate the curvature in the direction of each parameter
+    curvature_probe_epsilon = 1e-2
+
+    # bounds of the adaptively selected epsilons
+    min_epsilon = 1e-8
+    max_epsilon = 1e-1
+
+    def __init__(self, epsilon, differencing: Differencing, broyden_interval=None, adaptive_epsilon=False):
         """Class constructor. Should be called by all classes implementing an optimizer.
 
         :param epsilon: The value of epsilon to use when doing finite differencing. If a value lower than 0 is supplied,
@@ -23,12 +39,21 @@ class Optimizer(ABC):
         :type epsilon: float
         :param differencing: the type of differencing to use to calculate the jacobi matrix
         :type differencing: Optimizer.Differencing
+        :param broyden_interval: if set, the jacobi matrix is calculated by finite differencing only every broyden_interval iterations,
+        in between it is updated by Broyden's rank-one update using the last step. See getJacobiMatrixUpdated.
+        :type broyden_interval: int, optional
+        :param adaptive_epsilon: if True, a separate epsilon is selected for each parameter before the first jacobi matrix
+        is calculated, based on the estimated noise of the measurement. See estimateEpsilons.
+        :type adaptive_epsilon: bool, optional
         """
+        if epsilon < 0:
+            epsilon = np.sqrt(np.finfo(np.float64).eps)
+
         self.differencing = differencing
         self.finite_differencing_epsilon = epsilon
-
-        if epsilon < 0:
-            epsilon = np.sqrt(np.finfo(np.float).eps)
+        self.broyden_interval = broyden_interval
+        self.adaptive_epsilon = adaptive_epsilon
+        self.resetJacobiMatrixUpdates()
 
     def measurementToNumpyArrayConverter(self, evaluations, target):
         """Helper function to convert an array of Evaluation.
@@ -52,12 +77,16 @@ class Optimizer(ABC):
                 results.append(e.getNumpyArrayLike(target))
         return results
 
-    def getJacobiMatrix(self, point, evaluator, target, result):
+    def getJacobiMatrix(self, point, evaluator, target, result, pointevaluation=None):
         """Calculates the jacobi matrix in parallel using finite differencing.
         To do so, a number of jobs equal to the number of parameters will
         be passed to the given evaluator.
         As approximation the finite differencing with epsilon set via the
-        class constructor will be used.
+        class constructor will be used, or the epsilons selected by estimateEpsilons
+        if adaptive_epsilon is set.
+
+        If the evaluation at 'point' is already known, e.g. because the line search accepted this point,
+        it can be passed as pointevaluation and will not be evaluated again.
 
         :param point: The point in parameter space to calculate the jacobi matrix at
         :type point: numpy array
@@ -68,58 +97,41 @@ class Optimizer(ABC):
         :type target: Evaluation
         :param result: The result object to log to
         :type result:  Result
+        :param pointevaluation: the evaluation at 'point', if already known
+        :type pointevaluation: Evaluation, optional
         :return: the jacobi matrix, and the evaluation at 'point'
         :rtype: tuple (numpy array, Evaluation)
         """
         jacobi = []
 
+        if isinstance(pointevaluation, ErroredEvaluation):
+            pointevaluation = None
+
+        if self.adaptive_epsilon and self.epsilons is None:
+            pointevaluation = self.estimateEpsilons(point, evaluator, target, result, pointevaluation)
+
         neededevaluations = []
-        neededevaluations.append(point)
+        if pointevaluation is None:
+            neededevaluations.append(point)
 
-        if (self.differencing == Optimizer.Differencing.forward):
-            for i in range(len(point)):
-                changed = np.copy(point)
-                if changed[i] == 0:
-                    changed[i] = self.finite_differencing_epsilon
-                else:
-                    changed[i] *= 1 + self.finite_differencing_epsilon
-                neededevaluations.append(changed)
-        elif (self.differencing == Optimizer.Differencing.pure_forward):
-            for i in range(len(point)):
-                changed = np.copy(point)
-                changed[i] += self.finite_differencing_epsilon
-                neededevaluations.append(changed)
-        elif (self.differencing == Optimizer.Differencing.central):
-            for i in range(len(point)):
-                changedPos = np.copy(point)
-                changedNeg = np.copy(point)
-                if point[i] == 0:
-                    changedPos[i] = self.finite_differencing_epsilon
-                    changedNeg[i] = -self.finite_differencing_epsilon
-                else:
-                    changedNeg[i] *= 1 - self.finite_differencing_epsilon
-                    changedPos[i] *= 1 + self.finite_differencing_epsilon
-                neededevaluations.append(changedPos)
-                neededevaluations.append(changedNeg)
-        elif (self.differencing == Optimizer.Differencing.pure_central):
-            for i in range(len(point)):
-                changedPos = np.copy(point)
-                changedNeg = np.copy(point)
-                changedNeg[i] -= self.finite_differencing_epsilon
-                changedPos[i] += self.finite_differencing_epsilon
-                neededevaluations.append(changedPos)
-                neededevaluations.append(changedNeg)
+        steps = self.getSteps(point)
+        forward = self.differencing in [Optimizer.Differencing.forward, Optimizer.Differencing.pure_forward]
+        neededevaluations += self.getJacobiMatrixPoints(point)
 
         with evaluator:
             evaluations = evaluator.evaluate(neededevaluations, True, "jacobi-matrix")
 
+        if pointevaluation is not None:
+            evaluator.reuseEvaluation(pointevaluation)
+            evaluations = [pointevaluation] + evaluations
+
         result.log("jacobi matrix calculated. evaluations:")
 
         for ev in evaluations:
             if isinstance(ev, ErroredEvaluation):
                 result.log("\tid=" + str(ev.eval_id) + ", " + str(ev.reason))
             else:
-                result.log("\tid=" + str(ev.eval_id) + ", timeCount=" + str(ev.timeCount))
+                result.log("\tid=" + str(ev.eval_id) + ", timeCount=" + str(ev.timeCount), Result.LogLevel.DEBUG)
 
         for ev in evaluations:
             if isinstance(ev, ErroredEvaluation):
@@ -132,24 +144,227 @@ class Optimizer(ABC):
 
         # calculate the jacobi matrix
         for i in range(len(point)):
-            if (self.differencing == Optimizer.Differencing.forward):
-                if point[i] == 0:
-                    column = (results[i + 1] - undisturbed) / (self.finite_differencing_epsilon)
-                else:
-                    column = (results[i + 1] - undisturbed) / (self.finite_differencing_epsilon * point[i])
-            elif (self.differencing == Optimizer.Differencing.pure_forward):
-                column = (results[i + 1] - undisturbed) / (self.finite_differencing_epsilon)
-            elif (self.differencing == Optimizer.Differencing.central):
-                if point[i] == 0:
-                    column = (results[2 * i + 1] - results[2 * i + 2]) / (2 * self.finite_differencing_epsilon)
-                else:
-                    column = (results[2 * i + 1] - results[2 * i + 2]) / (2 * self.finite_differencing_epsilon * point[i])
-            elif (self.differencing == Optimizer.Differencing.pure_central):
-                column = (results[2 * i + 1] - results[2 * i + 2]) / (2 * self.finite_differencing_epsilon)
+            if forward:
+                column = (results[i + 1] - undisturbed) / steps[i]
+            else:
+                column = (results[2 * i + 1] - results[2 * i + 2]) / (2 * steps[i])
             jacobi.append(column)
 
         return (np.array(jacobi).transpose(), evaluations[0])
 
+    def getJacobiMatrixPoints(self, point):
+        """Returns the points evaluated by getJacobiMatrix besides 'point' itself, i.e. the point
+        disturbed in the direction of each parameter (for central differencing in both directions).
+
+        :param point: The point in parameter space to calculate the jacobi matrix at
+        :type point: numpy array
+        :return: the disturbed points, in the order used by getJacobiMatrix
+        :rtype: list of numpy arrays
+        """
+        steps = self.getSteps(point)
+        forward = self.differencing in [Optimizer.Differencing.forward, Optimizer.Differencing.pure_forward]
+
+        points = []
+        for i in range(len(point)):
+            changedPos = np.copy(point)
+            changedPos[i] += steps[i]
+            points.append(changedPos)
+
+            if not forward:
+                changedNeg = np.copy(point)
+                changedNeg[i] -= steps[i]
+                points.append(changedNeg)
+
+        return points
+
+    def getSteps(self, point):
+        """Returns the step used for finite differencing in the direction of each parameter.
+        For forward and central differencing, epsilon is relative to the value of the parameter
+        (or absolute, if the parameter is 0), for pure_forward and pure_central it is absolute.
+
+        :param point: The point in parameter space to calculate the jacobi matrix at
+        :type point: numpy array
+        :return: the step for each parameter
+        :rtype: numpy array
+        """
+        epsilons = self.finite_differencing_epsilon if self.epsilons is None else self.epsilons
+        epsilons = np.broadcast_to(np.asarray(epsilons, dtype=np.float64), np.shape(point))
+
+        if self.differencing in [Optimizer.Differencing.forward, Optimizer.Differencing.central]:
+            return np.where(point == 0, epsilons, epsilons * point)
+
+        return np.array(epsilons)
+
+    def estimateEpsilons(self, point, evaluator, target, result, pointevaluation=None):
+        """Selects the epsilon of each parameter, balancing the truncation error and the error
+        caused by noise in the measurement (e.g. because of the solver tolerances of UG4).
+
+        For a forward difference with step h the truncation error is about h * c / 2, with c the second derivative of the
+        measurement in the direction of the parameter, the error caused by noise of size sigma is about 2 * sigma / h.
+        Both are balanced by h = 2 * sqrt(sigma / c).
+
+        To estimate sigma, the measurement is evaluated at noise_probes points close to each other along a random direction.
+        For a smooth measurement, the third differences of these evaluations are dominated by the noise (see Moré/Wild,
+        "Estimating Computational Noise", 2011). c is estimated by the second difference of two additional evaluations in
+        the direction of each parameter, using the relative step curvature_probe_epsilon.
+        All evaluations are done in a single parallel batch. The selected epsilons are clipped to [min_epsilon, max_epsilon].
+        For central differencing, the same epsilons are used, since its truncation error is smaller.
+
+        If an evaluation fails, the epsilon set via the class constructor is used for all parameters.
+
+        :param point: The point in parameter space to select the epsilons at
+        :type point: numpy array
+        :param evaluator: the evaluator to use
+        :type evaluator: Evaluator
+        :param target: the target of the calibration, needed only to convert all evaluations to the correct format
+        :type target: Evaluation
+        :param result: The result object to log to
+        :type result: Result
+        :param pointevaluation: the evaluation at 'point', if already known
+        :type pointevaluation: Evaluation, optional
+        :return: the evaluation at 'point', or None if it is not known
+        :rtype: Evaluation
+        """
+        self.epsilons = np.full(len(point), self.finite_differencing_epsilon, dtype=np.float64)
+
+        scale = np.where(point == 0, 1, np.abs(point))
+        if self.differencing in [Optimizer.Differencing.pure_forward, Optimizer.Differencing.pure_central]:
+            scale = np.ones(len(point))
+
+        direction = np.random.RandomState(len(point)).choice([-1.0, 1.0], len(point))
+
+        neededevaluations = []
+        if pointevaluation is None:
+            neededevaluations.append(point)
+
+        for j in range(1, self.noise_probes):
+            neededevaluations.append(point + j * self.noise_probe_distance * scale * direction)
+
+        curvaturesteps = self.curvature_probe_epsilon * scale
+        for i in range(len(point)):
+            for j in [1, 2]:
+                changed = np.copy(point)
+                changed[i] += j * curvaturesteps[i]
+                neededevaluations.append(changed)
+
+        with evaluator:
+            evaluations = evaluator.evaluate(neededevaluations, True, "epsilon-estimation")
+
+        if pointevaluation is not None:
+            evaluator.reuseEvaluation(pointevaluation)
+            evaluations = [pointevaluation] + evaluations
+
+        for ev in evaluations:
+            if isinstance(ev, ErroredEvaluation):
+                result.log("estimation of the epsilons failed, using epsilon=" + str(self.finite_differencing_epsilon))
+                return evaluations[0]
+
+        results = np.array(self.measurementToNumpyArrayConverter(evaluations, target))
+        undisturbed = results[0]
+
+        # noise level, as root mean square over all entries of the measurement
+        # the third difference of independent noise of variance sigma^2 has the variance 20 * sigma^2
+        differences = np.diff(results[:self.noise_probes], 3, axis=0)
+        noise = np.sqrt(np.mean(differences**2) / 20)
+        noise = max(noise, np.finfo(np.float64).eps * np.sqrt(np.mean(undisturbed**2)))
+
+        for i in range(len(point)):
+            first = results[self.noise_probes + 2 * i]
+            second = results[self.noise_probes + 2 * i + 1]
+
+            # a second difference below the noise only gives an upper bound of the curvature
+            seconddifference = max(np.sqrt(np.mean((second - 2 * first + undisturbed)**2)), np.sqrt(6) * noise)
+            curvature = seconddifference / curvaturesteps[i]**2
+
+            self.epsilons[i] = 2 * np.sqrt(noise / curvature) / scale[i]
+
+        self.epsilons = np.clip(self.epsilons, self.min_epsilon, self.max_epsilon)
+
+        result.log("estimated noise level " + str(noise) + ", selected epsilons " + str(self.epsilons))
+        result.addRunMetadata("noiselevel", noise)
+        result.addRunMetadata("epsilons", np.copy(self.epsilons))
+
+        return evaluations[0]
+
+    def resetJacobiMatrixUpdates(self):
+        """Forgets the last jacobi matrix, so the next call of getJacobiMatrixUpdated uses finite differencing,
+        and the adaptively selected epsilons. Should be called at the start of every run.
+        """
+        # epsilon for each parameter selected by estimateEpsilons
+        self.epsilons = None
+
+        # tuple (jacobi matrix, point, measurement at point) of the last calculated jacobi matrix
+        self.lastjacobi = None
+
+        # number of Broyden updates since the last jacobi matrix calculated by finite differencing
+        self.broydenupdates = 0
+
+    def getJacobiMatrixUpdated(self, point, evaluator, target, result, pointevaluation=None):
+        """Returns the jacobi matrix at point. If broyden_interval is set, the last jacobi matrix is
+        updated by Broyden's rank-one update
+
+        J_new = J + ((m_new - m - J s) s^T) / (s^T s)
+
+        with the step s from the last point and the change of the measurement m, so no additional evaluation is needed.
+        Finite differencing (see getJacobiMatrix) is used instead every broyden_interval iterations,
+        if the evaluation at point is not known, if the last step reduced the residual norm by less than
+        broyden_stall_reduction, or after refreshJacobiMatrix was called.
+
+        :param point: The point in parameter space to calculate the jacobi matrix at
+        :type point: numpy array
+        :param evaluator: the evaluator to use
+        :type evaluator: Evaluator
+        :param target: the target of the calibration
+        :type target: Evaluation
+        :param result: The result object to log to
+        :type result: Result
+        :param pointevaluation: the evaluation at 'point', if already known
+        :type pointevaluation: Evaluation, optional
+        :return: the jacobi matrix, and the evaluation at 'point'. None, if an evaluation failed.
+        :rtype: tuple (numpy array, Evaluation)
+        """
+        if self.broyden_interval is not None and self.lastjacobi is not None and self.broydenupdates + 1 < self.broyden_interval \
+                and pointevaluation is not None and not isinstance(pointevaluation, ErroredEvaluation):
+
+            lastV, lastpoint, lastmeasurement = self.lastjacobi
+            measurement = pointevaluation.getNumpyArrayLike(target)
+            targetdata = target.getNumpyArray()
+            step = point - lastpoint
+
+            lastS = 0.5 * (lastmeasurement - targetdata).dot(lastmeasurement - targetdata)
+            S = 0.5 * (measurement - targetdata).dot(measurement - targetdata)
+
+            if step.dot(step) > 0 and S < self.broyden_stall_reduction * lastS:
+                V = lastV + np.outer(measurement - lastmeasurement - lastV.dot(step), step) / step.dot(step)
+
+                evaluator.reuseEvaluation(pointevaluation)
+                self.lastjacobi = (V, np.copy(point), measurement)
+                self.broydenupdates += 1
+                result.log("jacobi matrix updated by Broyden's method")
+                result.addMetric("broydenupdate", True)
+                return V, pointevaluation
+
+        jacobi_result = self.getJacobiMatrix(point, evaluator, target, result, pointevaluation)
+        if jacobi_result is None:
+            return None
+
+        V, pointevaluation = jacobi_result
+        self.lastjacobi = (V, np.copy(point), pointevaluation.getNumpyArrayLike(target))
+        self.broydenupdates = 0
+        result.addMetric("broydenupdate", False)
+        return jacobi_result
+
+    def refreshJacobiMatrix(self):
+        """Makes the next call of getJacobiMatrixUpdated calculate the jacobi matrix by finite differencing, e.g.
+        because the step calculated using an updated jacobi matrix failed.
+
+        :return: True, if the last jacobi matrix was a Broyden update, i.e. calculating it by finite differencing may help
+        :rtype: bool
+        """
+        updated = self.lastjacobi is not None and self.broydenupdates > 0
+        self.broydenupdates = self.broyden_interval if self.broyden_interval is not None else 0
+        return updated
+
     @abstractmethod
     def run(self, evaluator, initial_parameters, target, result=Result()):
         """Runs this optimizer.
@@ -0,0 +1,75 @@
+#!/usr/bin/env python3
+
+# Compares the interpolation in GenericEvaluation.getNumpyArrayLike with the scan based
+# implementation used before, on time series with 10^5 samples.
+#
+# The scan based implementation restarts at the first timestep for every target time, so it is only
+# run for a subset of the target times and extrapolated to the full target.
+#
+# usage: python benchmarks/benchmarkGenericEvaluation.py [samples]
+
+import os
+import sys
+import time
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+import numpy as np
+from UGParameterEstimator import GenericEvaluation
+
+
+def scanInterpolation(evaluation, targettimes):
+    """The interpolation as implemented before, restarting the search at index 0 for every target time."""
+    array = np.zeros(len(targettimes))
+    for i in range(len(targettimes)):
+        targettime = targettimes[i]
+        nearest_lower = 0
+        while True:
+            if evaluation.times[nearest_lower] == targettime:
+                array[i] = evaluation.data[nearest_lower]
+                break
+            if nearest_lower == evaluation.timeCount - 1:
+                array[i] = evaluation.data[nearest_lower]
+                break
+            if evaluation.times[nearest_lower] < targettime:
+                if evaluation.times[nearest_lower + 1] > targettime:
+                    percentage = ((targettime - evaluation.times[nearest_lower]) / (evaluation.times[nearest_lower + 1] - evaluation.times[nearest_lower]))
+                    array[i] = percentage * evaluation.data[nearest_lower + 1] + (1 - percentage) * evaluation.data[nearest_lower]
+                    break
+                else:
+                    nearest_lower += 1
+            if nearest_lower == 0:
+                array[i] = evaluation.data[nearest_lower]
+                break
+    return array
+
+
+def main():
+    samples = int(sys.argv[1]) if len(sys.argv) > 1 else 100000
+    subset = 200
+
+    rng = np.random.default_rng(0)
+
+    # simulated time series with adaptive time stepping, and a target with different timesteps
+    times = np.cumsum(rng.uniform(0.5, 1.5, samples))
+    evaluation = GenericEvaluation(np.sin(times / 100), times)
+    target = GenericEvaluation(np.zeros(samples), np.linspace(times[0] - 1, times[-1] + 1, samples))
+
+    starttime = time.perf_counter()
+    vectorized = evaluation.getNumpyArrayLike(target)
+    vectorizedtime = time.perf_counter() - starttime
+
+    # evenly spread subset of the target times for the scan based version
+    indices = np.linspace(0, samples - 1, subset).astype(int)
+    starttime = time.perf_counter()
+    scanned = scanInterpolation(evaluation, target.times[indices])
+    scantime = (time.perf_counter() - starttime) * samples / subset
+
+    print("samples: " + str(samples))
+    print("vectorized interpolation: " + str(vectorizedtime) + "s")
+    print("scan interpolation (extrapolated from " + str(subset) + " target times): " + str(scantime) + "s")
+    print("speedup: " + str(scantime / vectorizedtime))
+    print("max deviation: " + str(np.max(np.abs(vectorized[indices] - scanned))))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,103 @@
+InitUG(2, AlgebraType("CPU", 1));
+
+ug_load_script("ug_util.lua");
+ug_load_script("util/refinement_util.lua");
+ug_load_script("worker.lua");
+
+------------------------------------------
+-- same model as evaluate.lua, run as a
+-- worker of the WorkerEvaluator: the grid is
+-- read and refined once, then one parameter
+-- set after another is evaluated
+------------------------------------------
+
+SecondsPerHour = 3600
+
+dom = util.CreateDomain("Room_Door.ugx", 0, {"Inner", "Wall", "Door"})
+util.refinement.CreateRegularHierarchy(dom, 5, true)
+
+local approxSpaceDesc = { fct = "temp", type = "Lagrange", order = 1 }
+approxSpace = ApproximationSpace(dom)
+approxSpace:add_fct(approxSpaceDesc.fct, approxSpaceDesc.type, approxSpaceDesc.order)
+approxSpace:init_levels()
+approxSpace:init_top_surface()
+approxSpace:print_statistic()
+
+function InitialValue(x,y,t,si)
+  if (si==1) then return 0.0 else
+  return 4.0 end
+end
+
+----------------------------------------------------------
+-- evaluation of one parameter set
+----------------------------------------------------------
+function Evaluate(communicationDir, evaluationId)
+  local p = util.Parameters:fromfile(communicationDir.."/"..evaluationId.."_parameters.json")
+  local outputfilename = communicationDir.."/"..evaluationId.."_measurement.csv"
+
+  local alpha={
+      ["Inner"]= p.alpha_inner * 1e-6 * SecondsPerHour,
+      ["Wall"]= p.alpha_wall * 1e-6 * SecondsPerHour,
+      ["Door"]= p.alpha_door * 1e-6* SecondsPerHour,
+  }
+
+  local elemDisc={}
+  for index, Subset in ipairs({"Inner", "Wall", "Door"}) do
+      elemDisc[Subset] = ConvectionDiffusion("temp", Subset, "fe")
+      elemDisc[Subset]:set_diffusion(alpha[Subset])
+  end
+
+  local dirichletBnd = DirichletBoundary()
+  dirichletBnd:add(4.0, "temp", "North")
+  dirichletBnd:add(4.0, "temp", "West")
+  dirichletBnd:add(30.0, "temp", "Heater")
+
+  local domainDisc = DomainDiscretization(approxSpace)
+  for index, vol in ipairs({"Inner", "Wall", "Door"}) do
+      domainDisc:add(elemDisc[vol])
+  end
+  domainDisc:add(dirichletBnd)
+
+  local solverDesc = {
+      type = "bicgstab",
+      precond = {
+        type		= "ilut",
+      }
+  }
+  local solver = util.solver.CreateSolver(solverDesc)
+
+  local u = GridFunction(approxSpace)
+  u:set(0.0)
+  Interpolate("InitialValue", u, "temp")
+
+  local timeDisc=ThetaTimeStep(domainDisc, 1.0)
+
+  local timeIntegrator = ConstStepLinearTimeIntegrator(timeDisc)
+  timeIntegrator:set_linear_solver(solver)
+
+  -- callbacks for writing the measured data to file
+  local file = io.open (outputfilename, "w")
+  file:write("step,time,value\n")
+  file:close()
+
+  local function stepCallback(u, step, time, dt)
+    local file = io.open (outputfilename, "a")
+    local value = EvaluateAtClosestVertex(Vec2d(0,0), u, "temp", "Inner", dom:subset_handler())
+    file:write(step..","..time..","..value.."\n")
+    file:close()
+  end
+
+  local function finishCallback(u, step, time, dt)
+    local file = io.open (outputfilename, "a")
+    file:write("FINISHED,,")
+    file:close()
+  end
+
+  timeIntegrator:attach_finalize_observer(util.LuaCallbackHelper:create(stepCallback).CPPCallback)
+  timeIntegrator:attach_end_observer(util.LuaCallbackHelper:create(finishCallback).CPPCallback)
+
+  timeIntegrator:set_time_step(0.5)
+  timeIntegrator:apply(u, 100.0, u, 0.0)
+end
+
+worker.Run(Evaluate)
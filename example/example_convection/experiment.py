@@ -27,6 +27,9 @@ evaluator = Evaluator.ConstructEvaluator(
     parameter_output_adapter=UG4ParameterOutputAdapter(),       # the adapter to use to write the parameters
     threadcount=1)                     # threads to use locally or when using UGSUBMIT
 
+# alternatively, keep jobcount UG4 processes alive which read and refine the grid only once (see evaluate_worker.lua)
+# evaluator = WorkerEvaluator("evaluate_worker.lua", "evaluations", pm, GenericEvaluation, UG4ParameterOutputAdapter(), threadcount=1, jobcount=2)
+
 # create the optimizer
 optimizer = GaussNewtonOptimizer(LinearParallelLineSearch(evaluator))
 
@@ -0,0 +1,83 @@
+------------------------------------------------------------------
+-- worker side of the file protocol of the WorkerEvaluator
+-- (see UGParameterEstimator.Worker for the protocol)
+--
+-- usage: load plugins, read the grid and set up everything which
+-- does not depend on the parameters, then pass a function
+-- evaluating one parameter set to worker.Run:
+--
+--   ug_load_script("worker.lua")
+--   worker.Run(function(communicationDir, evaluationId)
+--     -- read communicationDir.."/"..evaluationId.."_parameters.json"
+--     -- and write communicationDir.."/"..evaluationId.."_measurement.csv"
+--   end)
+--
+-- worker.Run returns, when the evaluator stops the worker.
+-- all MPI processes read the request file, only the first one
+-- writes the started and done files.
+------------------------------------------------------------------
+
+worker = worker or {}
+
+-- time in seconds between two checks of the request file
+worker.pollInterval = 0.05
+
+local function ReadFile(filename)
+  local file = io.open(filename, "r")
+  if file == nil then
+    return nil
+  end
+  local content = file:read("*a")
+  file:close()
+  return content
+end
+
+-- written to a temporary file first and renamed,
+-- so the evaluator never reads half-written files
+local function WriteFile(filename, content)
+  if ProcRank() ~= 0 then
+    return
+  end
+  local file = io.open(filename..".tmp", "w")
+  file:write(content)
+  file:close()
+  os.rename(filename..".tmp", filename)
+end
+
+function worker.Run(evaluate)
+  local workerId = util.GetParam("-workerId", "0")
+  local communicationDir = util.GetParam("-communicationDir", "./evaluations")
+  local prefix = communicationDir.."/worker_"..workerId
+
+  print("worker "..workerId.." ready")
+
+  -- the request file is never deleted, a request is new if it differs from the last one
+  local last = nil
+  while true do
+    local request = ReadFile(prefix..".request")
+
+    if request == nil or request == last then
+      os.execute("sleep "..worker.pollInterval)
+    else
+      last = request
+      local evaluationId = string.match(request, "^(%S+)")
+      WriteFile(prefix..".started", request)
+
+      if evaluationId == "stop" then
+        print("worker "..workerId.." stopping")
+        return
+      end
+
+      print("evaluating "..evaluationId)
+
+      -- a failed evaluation does not end the worker, the evaluator
+      -- notices the missing results when parsing the measurement
+      local success, message = pcall(evaluate, communicationDir, evaluationId)
+      if not success then
+        print("Evaluation "..evaluationId.." failed: "..tostring(message))
+      end
+
+      WriteFile(prefix..".done", request)
+    end
+  end
+end
@@ -26,6 +26,10 @@ evaluator = Evaluator.ConstructEvaluator(
     parameter_output_adapter=UG4ParameterOutputAdapter(),       # the adapter to use to write the parameters
     threadcount=10)                     # threads to use locally or in ugsubmit when using UGSUBMIT
 
+# optionally, keep all evaluations on disk, so an interrupted calibration can be resumed without rerunning the simulations.
+# the directory must not be inside the exchange directory, as that is cleared when the evaluator is constructed.
+# evaluator.setPersistentCache(EvaluationStore("evaluationstore"))
+
 # create the optimizer
 optimizer = GaussNewtonOptimizer(LinearParallelLineSearch(evaluator))
 
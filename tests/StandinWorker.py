@@ -0,0 +1,78 @@
+"""Stand-in for a ugshell worker (see UGParameterEstimator.Worker), used to test the WorkerEvaluator without UG4.
+
+Called like the worker: StandinWorker.py -ex <luafile> -workerId <index> -communicationDir <directory> [-startup <seconds>]
+The startup time simulates loading the grid. For each request, the parameter "duration" gives the runtime of the
+evaluation in seconds, the parameter "value" is written as measurement. A negative duration crashes the worker.
+Evaluations of 10 seconds and more start a child process waiting as well, like the processes started by mpirun.
+"""
+import json
+import os
+import subprocess
+import sys
+import time
+
+
+def argument(name, default=None):
+    if name in sys.argv:
+        return sys.argv[sys.argv.index(name) + 1]
+    return default
+
+
+def writeFile(filename, content):
+    with open(filename + ".tmp", "w") as f:
+        f.write(content)
+    os.replace(filename + ".tmp", filename)
+
+
+def main():
+    index = argument("-workerId")
+    directory = argument("-communicationDir")
+    requestfile = os.path.join(directory, "worker_" + index + ".request")
+    startedfile = os.path.join(directory, "worker_" + index + ".started")
+    donefile = os.path.join(directory, "worker_" + index + ".done")
+
+    print("worker " + index + " (" + str(os.getpid()) + ") starting", flush=True)
+    time.sleep(float(argument("-startup", 0)))
+
+    last = None
+    while True:
+        try:
+            with open(requestfile) as f:
+                request = f.read().strip()
+        except OSError:
+            request = None
+
+        if request is None or request == last:
+            time.sleep(0.005)
+            continue
+
+        last = request
+        evaluation_id = request.split()[0]
+        writeFile(startedfile, request)
+
+        if evaluation_id == "stop":
+            print("worker " + index + " stopping", flush=True)
+            return
+
+        with open(os.path.join(directory, evaluation_id + "_parameters.json")) as f:
+            parameters = json.load(f)
+
+        print("evaluating " + evaluation_id, flush=True)
+        duration = parameters["duration"]["value"]
+        if duration < 0:
+            print("Segmentation fault", flush=True)
+            os._exit(1)
+        if duration >= 10:
+            child = subprocess.Popen([sys.executable, "-c", "import time; time.sleep(%f)" % duration])
+            with open(os.path.join(directory, evaluation_id + "_child.txt"), "w") as f:
+                f.write(str(child.pid))
+        time.sleep(duration)
+
+        with open(os.path.join(directory, evaluation_id + "_measurement.csv"), "w") as f:
+            f.write("step,time,value\n1,0,%f\nFINISHED,,\n" % parameters["value"]["value"])
+
+        writeFile(donefile, request)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,2 +1,11 @@
 from .testFreeSurfaceEvaluation import FreeSurfaceTimeDependentEvaluationTests
-from .testGenericEvaluation import GenericEvaluationTests
\ No newline at end of file
+from .testGenericEvaluation import GenericEvaluationTests
+from .testEvaluatorCache import EvaluatorCacheTests
+from .testEvaluationStore import EvaluationStoreTests
+from .testResult import ResultTests
+from .testOptimizers import OptimizerTests
+from .testAsyncEvaluator import AsyncEvaluatorTests
+from .testLocalEvaluator import LocalEvaluatorTests
+from .testWorkerEvaluator import WorkerEvaluatorTests
+from .testPilotEvaluator import PilotEvaluatorTests
+from .testClusterEvaluator import ClusterEvaluatorTests
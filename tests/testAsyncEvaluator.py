@@ -0,0 +1,121 @@
+import unittest
+import os
+import sys
+import threading
+import time
+sys.path.insert(0, os.path.abspath('../..'))
+
+import numpy as np
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from UGParameterEstimator import Evaluator, GenericEvaluation, ErroredEvaluation, LogarithmicParallelLineSearch, Result, ParameterManager, DirectParameter
+
+
+class ThreadedEvaluator(Evaluator):
+    """Asynchronous evaluator without UG4, the first parameter is the runtime of the evaluation in seconds
+    """
+
+    asynchronous = True
+
+    def __init__(self, jobcount=4):
+        self.reset()
+        self.parametermanager = ParameterManager()
+        self.parametermanager.addParameter(DirectParameter("duration", 0.0))
+        self.fixedparameters = {}
+        self.id = 0
+        self.jobcount = jobcount
+        self.executor = ThreadPoolExecutor(max_workers=jobcount)
+        self.stopped = {}
+
+    @property
+    def parallelism(self):
+        return self.jobcount
+
+    def evaluate(self, evaluationlist, transform=True, tag=""):
+        return self.collect(self.submit(evaluationlist, transform), tag)
+
+    def run(self, evaluation_id, parameters):
+        if self.stopped[evaluation_id].wait(parameters[0]):
+            return ErroredEvaluation(parameters, reason="Cancelled", eval_id=evaluation_id)
+        return GenericEvaluation([np.sum(parameters)], [0], evaluation_id, parameters)
+
+    def startEvaluation(self, parameters):
+        self.stopped[self.id] = threading.Event()
+        future = self.executor.submit(self.run, self.id, parameters)
+        future.evaluation_id = self.id
+        self.id += 1
+        return future
+
+    def cancelEvaluation(self, future):
+        if not future.cancel():
+            self.stopped[future.evaluation_id].set()
+
+    def __enter__(self):
+        pass
+
+    def __exit__(self, type, value, traceback):
+        pass
+
+
+class AsyncEvaluatorTests(unittest.TestCase):
+
+    def setUp(self):
+        self.evaluator = ThreadedEvaluator()
+
+    def test_evaluate(self):
+        results = self.evaluator.evaluate([np.array([0.0, 1.0]), np.array([0.01, 2.0])], False)
+        self.assertEqual([r.getNumpyArray()[0] for r in results], [1.0, 2.01])
+        self.assertEqual(self.evaluator.total_evaluation_count, 2)
+        self.assertEqual(self.evaluator.serial_evaluation_count, 1)
+
+        # finished evaluations are served from the cache
+        futures = self.evaluator.submit([np.array([0.0, 1.0])], False)
+        self.assertTrue(futures[0].done())
+        self.assertIs(futures[0].result(), results[0])
+
+    def test_as_completed_and_cancel(self):
+        starttime = time.time()
+        futures = self.evaluator.submit([np.array([10.0]), np.array([0.0]), np.array([10.0]), np.array([10.0]), np.array([10.0])], False)
+
+        first = next(as_completed(futures))
+        self.assertIs(first, futures[1])
+
+        # one running and one waiting evaluation are cancelled
+        self.evaluator.cancel(futures)
+        results = self.evaluator.collect(futures, "test")
+        self.assertLess(time.time() - starttime, 5)
+
+        self.assertEqual(results[1].getNumpyArray()[0], 0.0)
+        for i in [0, 2, 3, 4]:
+            self.assertIsInstance(results[i], ErroredEvaluation)
+            self.assertEqual(results[i].reason, "Cancelled")
+
+        # cancelled evaluations are not cached
+        self.assertEqual(len(self.evaluator.cache), 1)
+        self.assertEqual(self.evaluator.total_evaluation_count, 1)
+
+    def test_speculation_cancelled(self):
+        linesearch = LogarithmicParallelLineSearch(self.evaluator, parallel_evaluations=2)
+        linesearch.speculation = lambda point: [point + 10]
+        result = Result(loglevel=Result.LogLevel.ERROR)
+
+        candidates = [np.array([0.0]), np.array([0.01])]
+        evaluations = linesearch.evaluateCandidates(candidates, np.array([0.0]), np.array([[1.0]]), np.array([-1.0]), result)
+        self.assertEqual(len(evaluations), 2)
+        self.assertEqual(result.currentIteration["speculativeevaluations"], 2)
+
+        # the speculative evaluations run for 10 seconds, the one of the accepted candidate is replaced by a fast one
+        accepted, futures = linesearch.speculativefutures[1]
+        self.evaluator.cancel(futures)
+        linesearch.speculativefutures[1] = (accepted, self.evaluator.submit([np.array([0.02])]))
+
+        starttime = time.time()
+        linesearch.finishSpeculation(accepted)
+        self.assertLess(time.time() - starttime, 5)
+        self.assertIsNotNone(self.evaluator.checkCache(np.array([0.02])))
+        self.assertIsNone(self.evaluator.checkCache(np.array([10.0])))
+        self.assertIsNone(linesearch.speculation)
+        self.assertEqual(linesearch.speculativefutures, [])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,284 @@
+import unittest
+import os
+import sys
+import shutil
+import tempfile
+import time
+sys.path.insert(0, os.path.abspath('../..'))
+
+import numpy as np
+from UGParameterEstimator import ClusterEvaluator, Result, ParameterManager, DirectParameter, GenericEvaluation, UG4ParameterOutputAdapter, ErroredEvaluation, RetryPolicy
+
+# stand-ins for the cluster tools: ugsubmit runs the job in the background right away, uginfo lists the jobs still alive,
+# ugcancel kills a job.
+# the output of uginfo can be replaced by writing it to the file uginfo.txt, ugsubmit rejects as many submissions
+# as written to the file rejections.txt, and jobs wait in the queue for the seconds written to the file queuedelay.txt.
+# ugsubmit fails without submitting as many times as written to the file submiterrors.txt, and exits with the
+# status written to the file submitstatus.txt after submitting
+UGSUBMIT = """#!{python}
+import os, subprocess, sys, time
+if os.path.exists("rejections.txt"):
+    with open("rejections.txt") as f:
+        rejections = int(f.read())
+    if rejections > 0:
+        with open("rejections.txt", "w") as f:
+            f.write(str(rejections - 1))
+        print("error: QOSMaxSubmitJobPerUserLimit")
+        sys.exit(1)
+if os.path.exists("submiterrors.txt"):
+    with open("submiterrors.txt") as f:
+        errors = int(f.read())
+    if errors > 0:
+        with open("submiterrors.txt", "w") as f:
+            f.write(str(errors - 1))
+        print("error: invalid partition")
+        sys.exit(1)
+command = sys.argv[sys.argv.index("---") + 1:]
+delay = 0
+if os.path.exists("queuedelay.txt"):
+    with open("queuedelay.txt") as f:
+        delay = float(f.read())
+    command = [sys.executable, "-c", "import subprocess, sys, time; time.sleep(%f); sys.exit(subprocess.call(sys.argv[1:]))" % delay] + command
+os.makedirs("jobs", exist_ok=True)
+jobid = len(os.listdir("jobs")) + 100
+os.makedirs("jobid." + str(jobid), exist_ok=True)
+with open("jobid." + str(jobid) + "/job.output", "w") as output:
+    process = subprocess.Popen(command, stdout=output, stderr=subprocess.STDOUT, start_new_session=True)
+with open("jobs/" + str(jobid), "w") as f:
+    f.write(str(process.pid) + " " + str(time.time() + delay))
+print("Received job id " + str(jobid))
+if os.path.exists("submitstatus.txt"):
+    with open("submitstatus.txt") as f:
+        sys.exit(int(f.read()))
+"""
+
+UGINFO = """#!{python}
+import os, time
+if os.path.exists("uginfo.txt"):
+    with open("uginfo.txt") as f:
+        print(f.read(), end="")
+    raise SystemExit
+print("Cluster: test")
+print("JOBID STATE NAME")
+for jobid in sorted(os.listdir("jobs")) if os.path.isdir("jobs") else []:
+    with open("jobs/" + jobid) as f:
+        pid, starttime = f.read().split()
+    try:
+        with open("/proc/" + pid + "/stat") as f:
+            if f.read().split(")")[-1].split()[0] != "Z":
+                print(jobid + (" RUNNING" if time.time() > float(starttime) else " PENDING") + " job")
+    except OSError:
+        pass
+"""
+
+UGCANCEL = """#!{python}
+import os, signal, sys
+with open("jobs/" + sys.argv[1]) as f:
+    pid = int(f.read().split()[0])
+try:
+    os.killpg(pid, signal.SIGKILL)
+except OSError:
+    pass
+"""
+
+# stand-in for ugshell: waits for the given duration and writes the value as measurement. a negative value
+# makes the run die before the measurement is finished. a duration of -1 fails once like a filesystem problem,
+# leaving a broken measurement file which looks finished, and takes a second when run again
+UGSHELL = """#!{python}
+import json, os, sys, time
+directory = sys.argv[sys.argv.index("-communicationDir") + 1]
+evaluation_id = sys.argv[sys.argv.index("-evaluationId") + 1]
+with open(os.path.join(directory, evaluation_id + "_parameters.json")) as f:
+    parameters = json.load(f)
+print("evaluating " + evaluation_id, flush=True)
+if parameters["duration"]["value"] == -1:
+    marker = os.path.join(directory, evaluation_id + "_failed")
+    if not os.path.exists(marker):
+        open(marker, "w").close()
+        print("Stale file handle", flush=True)
+        with open(os.path.join(directory, evaluation_id + "_measurement.csv"), "w") as f:
+            f.write("step,time\\n1,0\\nFINISHED,\\n")
+        sys.exit(1)
+    parameters["duration"]["value"] = 1
+time.sleep(parameters["duration"]["value"])
+with open(os.path.join(directory, evaluation_id + "_measurement.csv"), "w") as f:
+    f.write("step,time,value\\n1,0,%f\\n" % parameters["value"]["value"])
+    if parameters["value"]["value"] >= 0:
+        f.write("FINISHED,,\\n")
+"""
+
+
+class ClusterEvaluatorTests(unittest.TestCase):
+
+    def setUp(self):
+        self.cwd = os.getcwd()
+        self.path = os.environ["PATH"]
+        self.tmpdir = tempfile.mkdtemp()
+
+        for name, script in [("ugsubmit", UGSUBMIT), ("uginfo", UGINFO), ("ugcancel", UGCANCEL), ("ugshell", UGSHELL)]:
+            filename = os.path.join(self.tmpdir, name)
+            with open(filename, "w") as f:
+                f.write(script.format(python=sys.executable))
+            os.chmod(filename, 0o755)
+        open(os.path.join(self.tmpdir, "evaluate.lua"), "w").close()
+
+        os.chdir(self.tmpdir)
+        os.environ["PATH"] = self.tmpdir + os.pathsep + self.path
+
+        parametermanager = ParameterManager()
+        parametermanager.addParameter(DirectParameter("duration", 0.0))
+        parametermanager.addParameter(DirectParameter("value", 0.0))
+        self.evaluator = ClusterEvaluator("evaluate.lua", "exchange", parametermanager, GenericEvaluation, UG4ParameterOutputAdapter(), threadcount=1)
+        self.evaluator.pollinterval = 0.05
+        self.evaluator.uginfointerval = 0.2
+        self.evaluator.reset()
+
+    def tearDown(self):
+        os.chdir(self.cwd)
+        os.environ["PATH"] = self.path
+        shutil.rmtree(self.tmpdir)
+
+    def test_measurement_file(self):
+        # uginfo is not needed to detect finished jobs
+        self.evaluator.uginfointerval = 1000
+        os.remove("uginfo")
+
+        results = self.evaluator.evaluate([np.array([0.0, 1.0]), np.array([0.2, 2.0])])
+        self.assertEqual([r.getNumpyArray()[0] for r in results], [1.0, 2.0])
+
+        # the output of ugshell is preserved with the evaluation id
+        for result in results:
+            with open(os.path.join("exchange", str(result.eval_id) + "_ug_output.txt")) as f:
+                self.assertEqual(f.read(), "evaluating " + str(result.eval_id) + "\n")
+
+    def test_lost_job(self):
+        starttime = time.time()
+        results = self.evaluator.evaluate([np.array([0.0, -1.0]), np.array([0.0, 2.0])])
+        self.assertLess(time.time() - starttime, 5)
+
+        self.assertIsInstance(results[0], ErroredEvaluation)
+        self.assertEqual(results[1].getNumpyArray()[0], 2.0)
+
+    def test_unreadable_uginfo(self):
+        # running jobs are not considered lost, if the job table can not be read
+        for output in ["", "Connection to scheduler failed\n"]:
+            with open("uginfo.txt", "w") as f:
+                f.write(output)
+
+            results = self.evaluator.evaluate([np.array([1.0, 1.0])])
+            self.assertEqual(results[0].getNumpyArray()[0], 1.0)
+            self.evaluator.reset()
+
+        # garbled lines are skipped
+        jobid = 100 + len(os.listdir("jobs"))
+        with open("uginfo.txt", "w") as f:
+            f.write("warning: slow response\nJOBID STATE NAME\n###\nfoo bar baz qux\n" + str(jobid) + " RUNNING job\n")
+
+        results = self.evaluator.evaluate([np.array([1.0, 1.0])])
+        self.assertEqual(results[0].getNumpyArray()[0], 1.0)
+
+    def test_monitor_failure(self):
+        os.remove("uginfo")
+
+        # the lost job can only be found by uginfo, so watching the jobs fails
+        futures = self.evaluator.submit([np.array([0.0, -1.0])])
+        with self.assertRaises(OSError):
+            self.evaluator.collect(futures)
+
+        # a new monitor is started for the next submission
+        results = self.evaluator.evaluate([np.array([0.0, 2.0])])
+        self.assertEqual(results[0].getNumpyArray()[0], 2.0)
+
+    def test_timeout(self):
+        self.evaluator.timeout = 1
+        self.evaluator.runninginterval = 0.1
+        with open("queuedelay.txt", "w") as f:
+            f.write("1.5")
+
+        # the time waiting in the queue does not count towards the timeout
+        starttime = time.time()
+        results = self.evaluator.evaluate([np.array([0.2, 1.0]), np.array([10.0, 2.0])])
+        self.assertLess(time.time() - starttime, 5)
+
+        self.assertEqual(results[0].getNumpyArray()[0], 1.0)
+        self.assertLess(results[0].runtime, 1)
+        self.assertTrue(results[1].reason.startswith("Timeout"))
+        self.assertEqual(self.evaluator.timeout_count, 1)
+
+    def test_retry(self):
+        self.evaluator.setRetryPolicy(RetryPolicy(maxretries=2))
+        self.evaluator.resultobj = Result(loglevel=Result.LogLevel.ERROR)
+
+        # the broken measurement file of the failed attempt is not taken as the result of the resubmitted job
+        results = self.evaluator.evaluate([np.array([-1.0, 1.0])])
+        self.assertEqual(results[0].getNumpyArray()[0], 1.0)
+
+        retries = self.evaluator.resultobj.metadata["evaluator_retries"]
+        self.assertEqual(len(retries), 1)
+        self.assertIn("Stale file handle", retries[0]["classification"])
+        self.assertEqual(sorted(os.listdir("jobs")), ["100", "101"])
+        with open(os.path.join("exchange", str(results[0].eval_id) + "_ug_output_0.txt")) as f:
+            self.assertIn("Stale file handle", f.read())
+
+    def test_submission_backoff(self):
+        self.evaluator.minsubmitdelay = 0.05
+        self.evaluator.maxsubmitdelay = 0.1
+        self.evaluator.resultobj = Result(loglevel=Result.LogLevel.ERROR)
+
+        # accepted submissions are not delayed
+        self.evaluator.evaluate([np.array([0.0, 1.0]), np.array([0.0, 2.0])])
+        self.assertEqual(self.evaluator.submitdelay, 0)
+        self.assertEqual(self.evaluator.submission_backoff_count, 0)
+
+        # the delay doubles with every rejection up to maxsubmitdelay, and decays with accepted submissions
+        with open("rejections.txt", "w") as f:
+            f.write("3")
+        results = self.evaluator.evaluate([np.array([0.0, 3.0])])
+        self.assertEqual(results[0].getNumpyArray()[0], 3.0)
+        self.assertEqual(self.evaluator.submission_backoff_count, 3)
+        self.assertAlmostEqual(self.evaluator.submitdelay, 0.05)
+
+        self.evaluator.evaluate([np.array([0.0, 4.0])])
+        self.assertEqual(self.evaluator.submitdelay, 0)
+
+        metadata = self.evaluator.resultobj.metadata
+        self.assertEqual(metadata["evaluator_submissioncount"], 4)
+        self.assertEqual(metadata["evaluator_submissionbackoffs"], 3)
+        self.assertGreater(metadata["evaluator_submissiontime"], 0.05 + 0.1 + 0.1)
+        self.assertAlmostEqual(metadata["evaluator_submissionthroughput"], 4 / metadata["evaluator_submissiontime"])
+
+    def test_submission_rejected(self):
+        self.evaluator.minsubmitdelay = 0.01
+        self.evaluator.submitretries = 2
+        with open("rejections.txt", "w") as f:
+            f.write("10")
+
+        results = self.evaluator.evaluate([np.array([0.0, 1.0])])
+        self.assertIsInstance(results[0], ErroredEvaluation)
+        self.assertEqual(self.evaluator.submission_backoff_count, 3)
+        with open("rejections.txt") as f:
+            self.assertEqual(f.read(), "7")
+
+    def test_submission_failed(self):
+        self.evaluator.minsubmitdelay = 0.01
+
+        # a job id was printed, so the job is used, even though ugsubmit failed
+        with open("submitstatus.txt", "w") as f:
+            f.write("1")
+        results = self.evaluator.evaluate([np.array([0.0, 1.0])])
+        self.assertEqual(results[0].getNumpyArray()[0], 1.0)
+        self.assertEqual(os.listdir("jobs"), ["100"])
+        os.remove("submitstatus.txt")
+
+        # failures not caused by the scheduler pushing back are not retried
+        with open("submiterrors.txt", "w") as f:
+            f.write("1")
+        results = self.evaluator.evaluate([np.array([0.0, 2.0])])
+        self.assertIsInstance(results[0], ErroredEvaluation)
+        self.assertEqual(self.evaluator.submission_backoff_count, 0)
+        with open("submiterrors.txt") as f:
+            self.assertEqual(f.read(), "0")
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,117 @@
+import unittest
+import os
+import sys
+import tempfile
+import shutil
+sys.path.insert(0, os.path.abspath('../..'))
+
+import numpy as np
+from UGParameterEstimator import Evaluator, EvaluationStore, GenericEvaluation, ErroredEvaluation, Result
+
+
+class StoreTestEvaluator(Evaluator):
+
+    @property
+    def parallelism(self):
+        return 1
+
+    def evaluate(self, evaluationlist, transform=True, tag=""):
+        results = []
+        for parameters in evaluationlist:
+            evaluation = self.checkCache(parameters)
+            if evaluation is None:
+                evaluation = GenericEvaluation([np.sum(parameters)], [0], self.id, parameters)
+                self.id += 1
+                self.handleNewEvaluations([evaluation], tag)
+            results.append(evaluation)
+        return results
+
+
+class EvaluationStoreTests(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.store = EvaluationStore(self.directory)
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_store_and_load(self):
+        evaluation = GenericEvaluation([1, 2], [0, 1], 3, np.array([1.0]))
+        self.store.store("fingerprint", b"key", evaluation)
+
+        loaded = self.store.load("fingerprint", b"key")
+        self.assertEqual(loaded.data.tolist(), [1, 2])
+        self.assertEqual(loaded.eval_id, 3)
+        self.assertIsNone(self.store.load("other fingerprint", b"key"))
+        self.assertIsNone(self.store.load("fingerprint", b"other key"))
+        self.assertEqual(len(self.store), 1)
+
+    def test_fingerprint(self):
+        a = EvaluationStore.getFingerprint("a.lua", [], {"x": 1}, GenericEvaluation)
+        b = EvaluationStore.getFingerprint("a.lua", [], {"x": 2}, GenericEvaluation)
+        c = EvaluationStore.getFingerprint("a.lua", ["-p", "1"], {"x": 1}, GenericEvaluation)
+        self.assertEqual(a, EvaluationStore.getFingerprint("a.lua", [], {"x": 1}, GenericEvaluation))
+        self.assertNotEqual(a, b)
+        self.assertNotEqual(a, c)
+
+    def test_fingerprint_cached(self):
+        evaluator = StoreTestEvaluator()
+        evaluator.reset()
+        evaluator.fixedparameters = {"x": 1}
+        evaluator.setPersistentCache(self.store)
+
+        fingerprints = []
+        getFingerprint = evaluator.getFingerprint
+        evaluator.getFingerprint = lambda: fingerprints.append(getFingerprint()) or fingerprints[-1]
+
+        evaluator.evaluate([np.array([1.0]), np.array([2.0]), np.array([1.0])])
+        self.assertEqual(len(fingerprints), 1)
+
+        # changing the setup changes the fingerprint
+        evaluator.fixedparameters["x"] = 2
+        self.assertEqual(evaluator.getCachedFingerprint(), fingerprints[-1])
+        self.assertEqual(len(fingerprints), 2)
+        self.assertNotEqual(fingerprints[0], fingerprints[1])
+
+    def test_shared_between_evaluators(self):
+        first = StoreTestEvaluator()
+        first.reset()
+        first.setPersistentCache(self.store)
+        first.evaluate([np.array([1.0, 2.0])])
+        first.handleNewEvaluations([ErroredEvaluation(np.array([3.0]), "failed")], "")
+
+        # a new evaluator (e.g. in a restarted process) is served from disk
+        second = StoreTestEvaluator()
+        second.reset()
+        second.setPersistentCache(self.store)
+        evaluation = second.checkCache(np.array([1.0, 2.0]))
+        self.assertIsNotNone(evaluation)
+        self.assertEqual(evaluation.data.tolist(), [3.0])
+        self.assertEqual(second.persistent_cache_hits, 1)
+
+        # errored evaluations are not persisted
+        self.assertIsNone(second.checkCache(np.array([3.0])))
+
+    def test_unique_ids(self):
+        first = StoreTestEvaluator()
+        first.reset()
+        first.setPersistentCache(self.store)
+        first.evaluate([np.array([1.0]), np.array([2.0])])
+
+        # evaluations of an earlier run get new ids, so they do not collide with the ids of this run
+        second = StoreTestEvaluator()
+        second.reset()
+        second.setPersistentCache(self.store)
+        second.setResultObject(Result(loglevel=Result.LogLevel.ERROR))
+        results = second.evaluate([np.array([3.0]), np.array([2.0]), np.array([4.0])])
+        self.assertEqual([r.eval_id for r in results], [0, 1, 2])
+        self.assertEqual([r.data.tolist() for r in results], [[3.0], [2.0], [4.0]])
+
+        second.handleNewEvaluations([results[1]], "")
+        for result in results:
+            self.assertIs(second.resultobj.getEvaluation(result.eval_id), result)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,65 @@
+import unittest
+import os
+import sys
+sys.path.insert(0, os.path.abspath('../..'))
+
+import numpy as np
+from UGParameterEstimator import Evaluator, GenericEvaluation
+
+
+class CacheTestEvaluator(Evaluator):
+
+    @property
+    def parallelism(self):
+        return 1
+
+    def evaluate(self, evaluationlist, transform=True, tag=""):
+        results = []
+        for parameters in evaluationlist:
+            evaluation = self.checkCache(parameters)
+            if evaluation is None:
+                evaluation = GenericEvaluation([np.sum(parameters)], [0], len(self.cache), parameters)
+                self.handleNewEvaluations([evaluation], tag)
+            results.append(evaluation)
+        return results
+
+
+class EvaluatorCacheTests(unittest.TestCase):
+
+    def setUp(self):
+        self.evaluator = CacheTestEvaluator()
+        self.evaluator.reset()
+
+    def test_cache_hit(self):
+        first = self.evaluator.evaluate([np.array([1.0, 2.0])])[0]
+        second = self.evaluator.evaluate([np.array([1.0, 2.0])])[0]
+        self.assertIs(first, second)
+        self.assertEqual(self.evaluator.cached_evaluation_count, 1)
+        self.assertEqual(self.evaluator.cache_miss_count, 1)
+
+    def test_cache_miss(self):
+        self.evaluator.evaluate([np.array([1.0, 2.0])])
+        self.assertIsNone(self.evaluator.checkCache(np.array([1.0, 2.0 + 1e-12])))
+        self.assertIsNone(self.evaluator.checkCache(np.array([2.0, 1.0])))
+        self.assertIsNotNone(self.evaluator.checkCache([1, 2]))
+        self.assertIsNotNone(self.evaluator.checkCache(np.array([1.0, 2.0])))
+
+    def test_negative_zero(self):
+        self.evaluator.evaluate([np.array([0.0, 2.0])])
+        self.assertIsNotNone(self.evaluator.checkCache(np.array([-0.0, 2.0])))
+
+    def test_cache_tolerance(self):
+        self.evaluator.cache_tolerance = 1e-9
+        self.evaluator.evaluate([np.array([1e-10, 2.0])])
+        self.assertIsNotNone(self.evaluator.checkCache(np.array([1e-10 * (1 + 1e-14), 2.0])))
+        self.assertIsNone(self.evaluator.checkCache(np.array([1.1e-10, 2.0])))
+
+    def test_statistics(self):
+        self.evaluator.evaluate([np.array([1.0]), np.array([1.0])])
+        statistics = self.evaluator.getStatistics()
+        self.assertIn("Taken from cache: 1", statistics)
+        self.assertIn("Cache misses: 1", statistics)
+
+
+if __name__ == '__main__':
+    unittest.main()
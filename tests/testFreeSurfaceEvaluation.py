@@ -3,8 +3,10 @@ import os
 import sys
 sys.path.insert(0, os.path.abspath('../..'))
 
+import struct
 import numpy as np
-from UGParameterEstimator import FreeSurfaceTimeDependentEvaluation
+from unittest import mock
+from UGParameterEstimator import FreeSurfaceTimeDependentEvaluation, FreeSurfaceEvaluation, ErroredEvaluation
 
 class FreeSurfaceTimeDependentEvaluationTests(unittest.TestCase):
 
@@ -38,11 +40,47 @@ class FreeSurfaceTimeDependentEvaluationTests(unittest.TestCase):
 
     def test_read_in(self):
         self.assertEqual(self.series0.locations, [0, 2])
-        self.assertEqual(self.series0.times, [1, 2, 3])
-        self.assertEqual(self.series0.data, [[1, 2], [2, 3], [3, 4]])
+        self.assertEqual(self.series0.times.tolist(), [1, 2, 3])
+        self.assertEqual(self.series0.data.tolist(), [[1, 2], [2, 3], [3, 4]])
         self.assertEqual(self.series1.locations, [0, 2])
-        self.assertEqual(self.series1.times, [1, 1.5, 2.5, 3.5])
-        self.assertEqual(self.series1.data, [[1, 2], [2, 3], [3, 4], [4, 5]])
+        self.assertEqual(self.series1.times.tolist(), [1, 1.5, 2.5, 3.5])
+        self.assertEqual(self.series1.data.tolist(), [[1, 2], [2, 3], [3, 4], [4, 5]])
+
+    def test_read_in_chunked(self):
+        with open("2_measurement.csv", "w") as f:
+            f.write("step,time,dim0,dim1,z\n")
+            for step in range(1, 51):
+                for x in range(3):
+                    for y in range(2):
+                        f.write("{},{},{},{},{}\n".format(step, step * 0.1, x, y, step + x * y))
+            f.write("FINISHED,,,,")
+
+        budget = FreeSurfaceTimeDependentEvaluation.csvmemorybudget
+        try:
+            FreeSurfaceTimeDependentEvaluation.csvmemorybudget = 64
+            with mock.patch.object(np, "loadtxt", wraps=np.loadtxt) as loadtxt:
+                series2 = FreeSurfaceTimeDependentEvaluation.parse(".", 2)
+        finally:
+            FreeSurfaceTimeDependentEvaluation.csvmemorybudget = budget
+        reference = FreeSurfaceTimeDependentEvaluation.parseFromCSVRows("2_measurement.csv")
+        os.remove("2_measurement.csv")
+
+        self.assertFalse(isinstance(series2, ErroredEvaluation))
+        self.assertGreater(loadtxt.call_count, 10)
+        self.assertEqual(series2.dimension, 3)
+        self.assertEqual(series2.locations, reference.locations)
+        self.assertEqual(series2.times.tolist(), reference.times.tolist())
+        self.assertEqual(series2.data.tolist(), reference.data.tolist())
+
+    def test_read_in_not_finished(self):
+        with open("2_measurement.csv", "w") as f:
+            f.write("step,time,dim0,z\n")
+            f.write("1,1,0,1\n")
+            f.write("1,1,2,2\n")
+        series2 = FreeSurfaceTimeDependentEvaluation.parse(".", 2)
+        os.remove("2_measurement.csv")
+
+        self.assertTrue(isinstance(series2, ErroredEvaluation))
 
     def test_numpy_array(self):
         self.assertTrue(np.allclose(
@@ -67,5 +105,61 @@ class FreeSurfaceTimeDependentEvaluationTests(unittest.TestCase):
             self.series0.getNumpyArrayLike(self.series0),
             np.array([1, 2, 2, 3, 3, 4])))
 
+    def test_numpy_array_like_cached(self):
+        first = self.series1.getNumpyArrayLike(self.series0)
+        first[:] = 0
+        self.assertTrue(np.allclose(
+            self.series1.getNumpyArrayLike(self.series0),
+            np.array([1, 2, 2.5, 3.5, 3.5, 4.5])))
+
+    def test_numpy_array_like_out_of_timeframe(self):
+        target = FreeSurfaceTimeDependentEvaluation([[0, 0], [0, 0]], [0, 5], [0, 2], 2)
+        self.assertTrue(np.allclose(
+            self.series0.getNumpyArrayLike(target),
+            np.array([1, 2, 3, 4])))
+
+    def write_binary(self, filename, dimension, values, finished=True):
+        with open(filename, "wb") as f:
+            f.write(struct.pack("<i", dimension))
+            for t in range(len(values)):
+                for l in range(len(values[t])):
+                    location = [l * 2.0] if dimension == 2 else [l * 2.0, 1.0]
+                    f.write(struct.pack("<b", 1))
+                    f.write(struct.pack("<" + "d" * (len(location) + 2), t + 1.0, *location, values[t][l]))
+            if finished:
+                f.write(struct.pack("<b", 2))
+
+    def test_read_in_binary(self):
+        self.write_binary("2_measurement.bin", 2, [[1, 2], [2, float("nan")], [3, 4]])
+        self.write_binary("3_measurement.bin", 3, [[1, 2], [2, 3]])
+        self.write_binary("4_measurement.bin", 2, [[1, 2], [2, 3]], finished=False)
+
+        try:
+            series2 = FreeSurfaceTimeDependentEvaluation.parse(".", 2)
+            self.assertEqual(series2.locations, [0, 2])
+            self.assertEqual(series2.times.tolist(), [1, 2, 3])
+            self.assertTrue(np.array_equal(series2.data, [[1, 2], [2, np.nan], [3, 4]], equal_nan=True))
+            self.assertTrue(FreeSurfaceTimeDependentEvaluation.isFinished(".", 2))
+
+            reference = FreeSurfaceTimeDependentEvaluation.parseBinaryStream("2_measurement.bin")
+            self.assertTrue(np.array_equal(series2.data, reference.data, equal_nan=True))
+            self.assertEqual(series2.locations, reference.locations)
+
+            series3 = FreeSurfaceTimeDependentEvaluation.parse(".", 3)
+            self.assertEqual(series3.locations, [(0, 1), (2, 1)])
+            self.assertEqual(series3.data.tolist(), [[1, 2], [2, 3]])
+
+            self.assertTrue(isinstance(FreeSurfaceTimeDependentEvaluation.parse(".", 4), ErroredEvaluation))
+            self.assertFalse(FreeSurfaceTimeDependentEvaluation.isFinished(".", 4))
+
+            FreeSurfaceTimeDependentEvaluation.nanhandling = FreeSurfaceEvaluation.NaNHandling.replace
+            series2 = FreeSurfaceTimeDependentEvaluation.parse(".", 2)
+            self.assertEqual(series2.data.tolist(), [[1, 2], [2, 0], [3, 4]])
+        finally:
+            FreeSurfaceTimeDependentEvaluation.nanhandling = FreeSurfaceEvaluation.NaNHandling.none
+            os.remove("2_measurement.bin")
+            os.remove("3_measurement.bin")
+            os.remove("4_measurement.bin")
+
 if __name__ == '__main__':
     unittest.main()
\ No newline at end of file
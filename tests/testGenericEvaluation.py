@@ -3,6 +3,7 @@ import os
 import sys
 sys.path.insert(0, os.path.abspath('../..'))
 import numpy as np
+from unittest import mock
 from UGParameterEstimator import ErroredEvaluation, GenericEvaluation
 
 class GenericEvaluationTests(unittest.TestCase):
@@ -130,10 +131,10 @@ class GenericEvaluationTests(unittest.TestCase):
         self.assertFalse(isinstance(self.series0, ErroredEvaluation))
         self.assertFalse(isinstance(self.series1, ErroredEvaluation))
 
-        self.assertEqual(self.series0.times, [1, 2, 3, 4, 5])
-        self.assertEqual(self.series1.times, [1.5, 2.5, 3.5, 4])
-        self.assertEqual(self.series0.data, [1, 2, 2, 1, 0])
-        self.assertEqual(self.series1.data, [1.5, 2.5, 1.5, 1])
+        self.assertEqual(self.series0.times.tolist(), [1, 2, 3, 4, 5])
+        self.assertEqual(self.series1.times.tolist(), [1.5, 2.5, 3.5, 4])
+        self.assertEqual(self.series0.data.tolist(), [1, 2, 2, 1, 0])
+        self.assertEqual(self.series1.data.tolist(), [1.5, 2.5, 1.5, 1])
 
     def test_parse_csv(self):
 
@@ -144,8 +145,8 @@ class GenericEvaluationTests(unittest.TestCase):
 
         self.assertFalse(isinstance(self.series2, ErroredEvaluation))
 
-        self.assertEqual(self.series2.times, [0.5, 1, 2])
-        self.assertEqual(self.series2.data, [3, 2.4, 4.623])
+        self.assertEqual(self.series2.times.tolist(), [0.5, 1, 2])
+        self.assertEqual(self.series2.data.tolist(), [3, 2.4, 4.623])
 
     def test_error_on_not_finished(self):
 
@@ -157,6 +158,47 @@ class GenericEvaluationTests(unittest.TestCase):
         self.series4 = GenericEvaluation.parse(".", 4)
         self.assertTrue(isinstance(self.series4, ErroredEvaluation))
 
+    def test_parse_csv_chunked(self):
+        budget = GenericEvaluation.csvmemorybudget
+        try:
+            GenericEvaluation.csvmemorybudget = 8
+            with mock.patch.object(np, "loadtxt", wraps=np.loadtxt) as loadtxt:
+                self.series2 = GenericEvaluation.parse(".", 2)
+            self.series3 = GenericEvaluation.parse(".", 3)
+        finally:
+            GenericEvaluation.csvmemorybudget = budget
+
+        self.assertGreater(loadtxt.call_count, 1)
+
+        self.assertFalse(isinstance(self.series2, ErroredEvaluation))
+        self.assertEqual(self.series2.times.tolist(), [0.5, 1, 2])
+        self.assertEqual(self.series2.data.tolist(), [3, 2.4, 4.623])
+        self.assertTrue(isinstance(self.series3, ErroredEvaluation))
+
+    def test_parse_csv_repeated_header(self):
+        with open("5_measurement.csv", "w") as f:
+            f.write(
+            "step,time,value\n"
+            "1,0.5,3\n"
+            "step,time,value\n"
+            "2,1,2.4\n"
+            "FINISHED,,"
+            )
+
+        self.series5 = GenericEvaluation.parse(".", 5)
+        os.remove("5_measurement.csv")
+
+        self.assertFalse(isinstance(self.series5, ErroredEvaluation))
+        self.assertEqual(self.series5.times.tolist(), [0.5, 1])
+        self.assertEqual(self.series5.data.tolist(), [3, 2.4])
+
+    def test_is_finished(self):
+        self.assertTrue(GenericEvaluation.isFinished(".", 0))
+        self.assertTrue(GenericEvaluation.isFinished(".", 2))
+        self.assertFalse(GenericEvaluation.isFinished(".", 3))
+        self.assertFalse(GenericEvaluation.isFinished(".", 4))
+        self.assertFalse(GenericEvaluation.isFinished(".", 5))
+
     def test_numpy_array(self):
         self.assertTrue(np.allclose(
             self.series0.getNumpyArray(), 
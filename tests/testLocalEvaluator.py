@@ -0,0 +1,214 @@
+import unittest
+import os
+import sys
+import shutil
+import tempfile
+import time
+sys.path.insert(0, os.path.abspath('../..'))
+
+import numpy as np
+from concurrent.futures import as_completed
+from UGParameterEstimator import LocalEvaluator, ParameterManager, DirectParameter, GenericEvaluation, UG4ParameterOutputAdapter, ErroredEvaluation, RetryPolicy, Result
+
+# stand-in for ugshell: waits for the given duration and writes the value as measurement.
+# a duration of -1 fails once per value like a filesystem problem, -2 always fails like a lua error.
+# runs of 10 seconds and more start a child process waiting as well, like the processes started by mpirun.
+# the start and end time of each run are written to <id>_times.txt
+UGSHELL = """#!{python}
+import json, os, subprocess, sys, time
+starttime = time.time()
+directory = sys.argv[sys.argv.index("-communicationDir") + 1]
+evaluation_id = sys.argv[sys.argv.index("-evaluationId") + 1]
+with open(os.path.join(directory, evaluation_id + "_parameters.json")) as f:
+    parameters = json.load(f)
+duration = parameters["duration"]["value"]
+marker = os.path.join(directory, "failed_%f" % parameters["value"]["value"])
+if duration == -2 or (duration == -1 and not os.path.exists(marker)):
+    open(marker, "w").close()
+    print("LUA-ERROR" if duration == -2 else "Stale file handle")
+    sys.exit(1)
+if duration >= 10:
+    child = subprocess.Popen([sys.executable, "-c", "import time; time.sleep(%f)" % duration])
+    with open(os.path.join(directory, evaluation_id + "_child.txt"), "w") as f:
+        f.write(str(child.pid))
+time.sleep(max(0, duration))
+with open(os.path.join(directory, evaluation_id + "_measurement.csv"), "w") as f:
+    f.write("step,time,value\\n1,0,%f\\nFINISHED,,\\n" % parameters["value"]["value"])
+with open(os.path.join(directory, evaluation_id + "_times.txt"), "w") as f:
+    f.write("%f %f" % (starttime, time.time()))
+"""
+
+
+def isAlive(pid, timeout=2):
+    """Returns True, if the process is still running after timeout seconds."""
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            with open("/proc/" + str(pid) + "/stat") as f:
+                if f.read().split(")")[-1].split()[0] == "Z":
+                    return False
+        except OSError:
+            return False
+        time.sleep(0.05)
+    return True
+
+
+class LocalEvaluatorTests(unittest.TestCase):
+
+    def setUp(self):
+        self.cwd = os.getcwd()
+        self.path = os.environ["PATH"]
+        self.tmpdir = tempfile.mkdtemp()
+
+        ugshell = os.path.join(self.tmpdir, "ugshell")
+        with open(ugshell, "w") as f:
+            f.write(UGSHELL.format(python=sys.executable))
+        os.chmod(ugshell, 0o755)
+        open(os.path.join(self.tmpdir, "evaluate.lua"), "w").close()
+
+        os.chdir(self.tmpdir)
+        os.environ["PATH"] = self.tmpdir + os.pathsep + self.path
+
+        parametermanager = ParameterManager()
+        parametermanager.addParameter(DirectParameter("duration", 0.0))
+        parametermanager.addParameter(DirectParameter("value", 0.0))
+        self.evaluator = LocalEvaluator("evaluate.lua", "exchange", parametermanager, GenericEvaluation, UG4ParameterOutputAdapter(), threadcount=1, jobcount=4)
+        self.evaluator.reset()
+
+    def tearDown(self):
+        os.chdir(self.cwd)
+        os.environ["PATH"] = self.path
+        shutil.rmtree(self.tmpdir)
+
+    def getChild(self, evaluation_id):
+        with open(os.path.join("exchange", str(evaluation_id) + "_child.txt")) as f:
+            return int(f.read())
+
+    def test_evaluate(self):
+        results = self.evaluator.evaluate([np.array([0.0, 1.0]), np.array([0.0, 2.0])])
+        self.assertEqual([r.getNumpyArray()[0] for r in results], [1.0, 2.0])
+        self.assertEqual(self.evaluator.total_evaluation_count, 2)
+        self.assertTrue(all(r.runtime > 0 for r in results))
+
+    def test_parallel(self):
+        self.assertEqual(self.evaluator.parallelism, 4)
+        results = self.evaluator.evaluate([np.array([0.5, float(i)]) for i in range(4)])
+        self.assertEqual([r.getNumpyArray()[0] for r in results], [0.0, 1.0, 2.0, 3.0])
+
+        # all four runs overlap, i.e. the last one started before the first one ended
+        times = []
+        for result in results:
+            with open(os.path.join("exchange", str(result.eval_id) + "_times.txt")) as f:
+                times.append([float(t) for t in f.read().split()])
+        self.assertLess(max(start for start, end in times), min(end for start, end in times))
+
+        # without jobcount, the cores are split into jobs of threadcount processes
+        evaluator = LocalEvaluator("evaluate.lua", "exchange", self.evaluator.parametermanager, GenericEvaluation, UG4ParameterOutputAdapter(), threadcount=2, jobcount=None)
+        self.assertEqual(evaluator.parallelism, max(1, (os.cpu_count() or 1) // 2))
+
+    def test_cancel(self):
+        starttime = time.time()
+        futures = self.evaluator.submit([np.array([10.0, 1.0]), np.array([0.0, 2.0])])
+        self.assertIs(next(as_completed(futures)), futures[1])
+
+        self.evaluator.cancel(futures)
+        results = self.evaluator.collect(futures)
+        self.assertLess(time.time() - starttime, 5)
+        self.assertEqual(results[0].reason, "Cancelled")
+        self.assertEqual(results[1].getNumpyArray()[0], 2.0)
+        self.assertFalse(isAlive(self.getChild(results[0].eval_id)))
+
+    def test_timeout(self):
+        self.evaluator.timeout = 1
+        starttime = time.time()
+        results = self.evaluator.evaluate([np.array([0.0, 1.0]), np.array([10.0, 2.0])])
+        self.assertLess(time.time() - starttime, 5)
+
+        self.assertEqual(results[0].getNumpyArray()[0], 1.0)
+        self.assertIsInstance(results[1], ErroredEvaluation)
+        self.assertTrue(results[1].reason.startswith("Timeout"))
+        self.assertEqual(self.evaluator.timeout_count, 1)
+        self.assertIn("Stopped by timeout: 1", self.evaluator.getStatistics())
+
+        # the processes started by the killed one are killed as well
+        self.assertFalse(isAlive(self.getChild(results[1].eval_id)))
+
+    def test_kill_grace_period(self):
+        self.evaluator.killgraceperiod = 0.5
+        with open("ugshell") as f:
+            script = f.read()
+        with open("ugshell", "w") as f:
+            f.write(script.replace("import json,", "import signal; signal.signal(signal.SIGTERM, signal.SIG_IGN)\nimport json,"))
+
+        # a process ignoring SIGTERM is killed after the grace period
+        self.evaluator.timeout = 0.5
+        starttime = time.time()
+        results = self.evaluator.evaluate([np.array([10.0, 1.0])])
+        self.assertLess(time.time() - starttime, 5)
+        self.assertTrue(results[0].reason.startswith("Timeout"))
+
+    def test_uncached_failures(self):
+        # timeouts and transient failures are evaluated again, permanent failures are taken from the cache
+        self.evaluator.timeout = 0.5
+        failed = self.evaluator.evaluate([np.array([1.0, 1.0]), np.array([-1.0, 2.0]), np.array([-2.0, 3.0])])
+        self.assertTrue(all(isinstance(r, ErroredEvaluation) for r in failed))
+        self.assertEqual([r.transient for r in failed], [True, True, False])
+
+        self.evaluator.timeout = None
+        results = self.evaluator.evaluate([np.array([1.0, 1.0]), np.array([-1.0, 2.0]), np.array([-2.0, 3.0])])
+        self.assertEqual(results[0].getNumpyArray()[0], 1.0)
+        self.assertEqual(results[1].getNumpyArray()[0], 2.0)
+        self.assertIs(results[2], failed[2])
+        self.assertEqual(self.evaluator.cached_evaluation_count, 1)
+
+    def test_adaptive_timeout(self):
+        self.evaluator.timeout_factor = 5
+        self.evaluator.timeout_minsamples = 3
+        self.assertIsNone(self.evaluator.getTimeout())
+
+        self.evaluator.evaluate([np.array([0.0, float(i)]) for i in range(3)])
+        self.assertEqual(len(self.evaluator.runtimes), 3)
+        self.assertAlmostEqual(self.evaluator.getTimeout(), 5 * np.median(self.evaluator.runtimes))
+
+        starttime = time.time()
+        results = self.evaluator.evaluate([np.array([0.0, 3.0]), np.array([10.0, 4.0])])
+        self.assertLess(time.time() - starttime, 8)
+        self.assertEqual(results[0].getNumpyArray()[0], 3.0)
+        self.assertTrue(results[1].reason.startswith("Timeout"))
+
+    def test_retry(self):
+        self.evaluator.setRetryPolicy(RetryPolicy(maxretries=1))
+        self.evaluator.resultobj = Result(loglevel=Result.LogLevel.ERROR)
+
+        results = self.evaluator.evaluate([np.array([-1.0, 1.0]), np.array([-2.0, 2.0])])
+        self.assertEqual(results[0].getNumpyArray()[0], 1.0)
+        self.assertIsInstance(results[1], ErroredEvaluation)
+
+        # only the transient failure is resubmitted, the output of the failed attempt is kept
+        retries = self.evaluator.resultobj.metadata["evaluator_retries"]
+        self.assertEqual(len(retries), 1)
+        self.assertEqual(retries[0]["eval_id"], results[0].eval_id)
+        self.assertIn("Stale file handle", retries[0]["classification"])
+        self.assertEqual(self.evaluator.resultobj.metadata["evaluator_retrycount"], 1)
+        self.assertTrue(os.path.isfile(os.path.join("exchange", str(results[0].eval_id) + "_ug_output_0.txt")))
+        self.assertIn("Resubmitted: 1", self.evaluator.getStatistics())
+
+    def test_retry_policy(self):
+        policy = RetryPolicy(maxretries=2)
+        failed = ErroredEvaluation(None, "UG run did not finish.")
+
+        self.assertTrue(policy.classify(failed, 1, "...\nslurmstepd: error: node failure\n")[0])
+        self.assertFalse(policy.classify(failed, 1, "LUA-ERROR: Stale file handle")[0])
+        self.assertTrue(policy.classify(failed, -9, "step 1 done")[0])
+        self.assertFalse(policy.classify(failed, 1, "step 1 done")[0])
+        self.assertTrue(policy.classify(failed, None, None)[0])
+        self.assertFalse(policy.classify(ErroredEvaluation(None, "Timeout: stopped after 10s, limit was 10s"), -9, None)[0])
+        self.assertTrue(RetryPolicy(retry_timeouts=True).classify(ErroredEvaluation(None, "Timeout"), -9, None)[0])
+        self.assertTrue(RetryPolicy(transientpatterns=["out of licenses"]).classify(failed, 1, "error: out of licenses")[0])
+
+        self.assertTrue(policy.shouldRetry(failed, 1, None, None)[0])
+        self.assertFalse(policy.shouldRetry(failed, 2, None, None)[0])
+
+
+if __name__ == '__main__':
+    unittest.main()
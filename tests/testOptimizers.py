@@ -0,0 +1,244 @@
+import unittest
+import os
+import sys
+sys.path.insert(0, os.path.abspath('../..'))
+
+import numpy as np
+from UGParameterEstimator import Evaluator, GenericEvaluation, Result, GaussNewtonOptimizer, GradientDescentOptimizer, LevMarOptimizer, GainedLevMarOptimizer, LevMarSolver, LogarithmicParallelLineSearch
+
+
+class ModelEvaluator(Evaluator):
+    """Evaluates the model a * exp(-b * t) without calling UG4, counting the evaluated parameter sets
+    """
+
+    times = np.linspace(0, 2, 20)
+
+    def __init__(self, noise=0, parallelism=4):
+        self.reset()
+        self.parametermanager = None
+        self.fixedparameters = {}
+        self.evaluated = []
+        self.batches = 0
+        self.jobs = parallelism
+        self.noise = noise
+        self.random = np.random.RandomState(1)
+
+    @property
+    def parallelism(self):
+        return self.jobs
+
+    def evaluate(self, evaluationlist, transform=True, tag=""):
+        results = []
+        evaluatedcount = len(self.evaluated)
+        for parameters in evaluationlist:
+            evaluation = self.checkCache(parameters)
+            if evaluation is None:
+                self.evaluated.append(np.copy(parameters))
+                data = parameters[0] * np.exp(-parameters[1] * self.times) + self.noise * self.random.randn(len(self.times))
+                evaluation = GenericEvaluation(data, self.times, len(self.evaluated), np.copy(parameters))
+            results.append(evaluation)
+        if len(self.evaluated) > evaluatedcount:
+            self.batches += 1
+        self.handleNewEvaluations(results, tag)
+        return results
+
+    def __enter__(self):
+        pass
+
+    def __exit__(self, type, value, traceback):
+        pass
+
+
+class OptimizerTests(unittest.TestCase):
+
+    def setUp(self):
+        self.evaluator = ModelEvaluator()
+        self.target = GenericEvaluation(2 * np.exp(-1.5 * ModelEvaluator.times), ModelEvaluator.times)
+        self.result = Result(loglevel=Result.LogLevel.ERROR)
+
+    def test_gauss_newton_reuses_linesearch_evaluation(self):
+        optimizer = GaussNewtonOptimizer(LogarithmicParallelLineSearch(self.evaluator), maxiterations=4)
+        optimizer.run(self.evaluator, np.array([1.0, 1.0]), self.target, self.result)
+
+        iterations = self.result.iterationCount
+        self.assertGreater(iterations, 1)
+        self.assertEqual(self.evaluator.reused_evaluation_count, iterations - 1)
+        self.assertEqual(self.result.metadata["evaluator_reusedcount"], iterations - 1)
+        self.assertIn("Reused by optimizer: " + str(iterations - 1), self.evaluator.getStatistics())
+
+        # the accepted point is never evaluated twice
+        self.assertEqual(self.evaluator.cached_evaluation_count, 0)
+        for i in range(1, iterations):
+            evaluation = self.result.iterations[i]["measurementEvaluation"]
+            self.assertEqual(evaluation.parameters.tolist(), self.result.iterations[i]["parameters"].tolist())
+
+    def test_gradient_descent_reuses_linesearch_evaluation(self):
+        optimizer = GradientDescentOptimizer(LogarithmicParallelLineSearch(self.evaluator), maxiterations=3)
+        optimizer.run(self.evaluator, np.array([1.0, 1.0]), self.target, self.result)
+
+        self.assertGreater(self.result.iterationCount, 1)
+        self.assertEqual(self.evaluator.reused_evaluation_count, self.result.iterationCount - 1)
+
+    def test_broyden_updates(self):
+        optimizer = GaussNewtonOptimizer(LogarithmicParallelLineSearch(self.evaluator), maxiterations=6, broyden_interval=3)
+        optimizer.run(self.evaluator, np.array([1.0, 1.0]), self.target, self.result)
+
+        updates = self.result.getMetric("broydenupdate")
+        self.assertFalse(updates[0])
+        self.assertIn(True, updates)
+        self.assertEqual(self.result.metadata["broyden_interval"], 3)
+
+        # never more than broyden_interval - 1 updates in a row
+        self.assertNotIn([True, True, True], [updates[i:i + 3] for i in range(len(updates))])
+
+        # the jacobi matrix batches only contain the finite differencing iterations
+        jacobievaluations = sum(len(e) for iteration in self.result.iterations for e, tag, _ in iteration.get("evaluations", []) if tag == "jacobi-matrix")
+        self.assertEqual(jacobievaluations, 2 * updates.count(False) + 1)
+
+        residualnorms = self.result.getMetric("residualnorm")
+        self.assertLess(residualnorms[-1], residualnorms[0])
+
+    def test_broyden_matches_linear_model(self):
+        optimizer = GaussNewtonOptimizer(LogarithmicParallelLineSearch(self.evaluator), broyden_interval=3)
+        V = np.array([[1.0, 2.0], [3.0, 4.0], [5.0, 6.0]])
+        target = GenericEvaluation([0, 0, 0], [0, 1, 2])
+        optimizer.lastjacobi = (V, np.zeros(2), np.array([10.0, 10.0, 10.0]))
+
+        # the measurement changes linearly along the step, so the update is exact in this direction
+        step = np.array([0.5, -1.0])
+        evaluation = GenericEvaluation(np.array([10.0, 10.0, 10.0]) + V.dot(step), [0, 1, 2], 1, step)
+        updated, _ = optimizer.getJacobiMatrixUpdated(step, self.evaluator, target, self.result, evaluation)
+        self.assertTrue(np.allclose(updated, V))
+
+        evaluation = GenericEvaluation(np.array([10.0, 10.0, 10.0]) + V.dot(step) - np.array([1.0, 1.0, 1.0]), [0, 1, 2], 2, step)
+        optimizer.lastjacobi = (V, np.zeros(2), np.array([10.0, 10.0, 10.0]))
+        optimizer.broydenupdates = 0
+        updated, _ = optimizer.getJacobiMatrixUpdated(step, self.evaluator, target, self.result, evaluation)
+        self.assertTrue(np.allclose(updated.dot(step), V.dot(step) - 1))
+
+    def test_levmar_reuses_evaluation(self):
+        optimizer = LevMarOptimizer(maxiterations=3)
+        optimizer.run(self.evaluator, np.array([1.0, 1.0]), self.target, self.result)
+
+        self.assertGreater(self.result.iterationCount, 1)
+        self.assertEqual(self.evaluator.reused_evaluation_count, self.result.iterationCount - 1)
+
+    def test_epsilon_guess(self):
+        optimizer = GaussNewtonOptimizer(LogarithmicParallelLineSearch(self.evaluator), epsilon=-1)
+        self.assertEqual(optimizer.finite_differencing_epsilon, np.sqrt(np.finfo(np.float64).eps))
+
+    def test_adaptive_epsilon(self):
+        point = np.array([2.0, 1.5])
+
+        optimizer = GaussNewtonOptimizer(LogarithmicParallelLineSearch(self.evaluator), adaptive_epsilon=True)
+        optimizer.estimateEpsilons(point, self.evaluator, self.target, self.result)
+        smooth = optimizer.epsilons
+        self.assertLess(self.result.metadata["noiselevel"], 1e-12)
+
+        # the measurement is linear in the first parameter, so a large step is fine
+        self.assertGreater(smooth[0], 1e-3)
+        self.assertLess(smooth[1], 1e-6)
+
+        noisy = ModelEvaluator(noise=1e-3)
+        result = Result(loglevel=Result.LogLevel.ERROR)
+        optimizer.estimateEpsilons(point, noisy, self.target, result)
+        self.assertGreater(result.metadata["noiselevel"], 3e-4)
+        self.assertLess(result.metadata["noiselevel"], 3e-3)
+        self.assertGreater(optimizer.epsilons[1], 1e-3)
+        self.assertLessEqual(optimizer.epsilons[1], optimizer.max_epsilon)
+
+    def test_adaptive_epsilon_run(self):
+        evaluator = ModelEvaluator(noise=1e-3)
+        optimizer = GaussNewtonOptimizer(LogarithmicParallelLineSearch(evaluator), maxiterations=5, adaptive_epsilon=True)
+        optimizer.run(evaluator, np.array([1.0, 1.0]), self.target, self.result)
+
+        self.assertTrue(self.result.metadata["adaptive_epsilon"])
+        self.assertEqual(len(self.result.metadata["epsilons"]), 2)
+
+        # the estimation is only done once, the jacobi matrix uses the selected steps
+        tags = [tag for iteration in self.result.iterations for e, tag, _ in iteration.get("evaluations", [])]
+        self.assertEqual(tags.count("epsilon-estimation"), 1)
+        parameters = self.result.iterations[0]["parameters"]
+        jacobibatch = [e for e, tag, _ in self.result.iterations[0]["evaluations"] if tag == "jacobi-matrix"][0]
+        steps = np.array([e.parameters for e in jacobibatch]) - parameters
+        self.assertTrue(np.allclose(np.abs(np.diag(steps)), optimizer.epsilons * np.abs(parameters)))
+
+        self.assertTrue(np.allclose(self.result.getMetric("parameters")[-1], [2, 1.5], rtol=1e-2))
+
+    def test_speculative_jacobi_matrix(self):
+        evaluator = ModelEvaluator(parallelism=10)
+        optimizer = GaussNewtonOptimizer(LogarithmicParallelLineSearch(evaluator, parallel_evaluations=4), maxiterations=4, speculative=True)
+        optimizer.run(evaluator, np.array([1.0, 1.0]), self.target, self.result)
+
+        reference = ModelEvaluator(parallelism=10)
+        referenceresult = Result(loglevel=Result.LogLevel.ERROR)
+        referenceoptimizer = GaussNewtonOptimizer(LogarithmicParallelLineSearch(reference, parallel_evaluations=4), maxiterations=4)
+        referenceoptimizer.run(reference, np.array([1.0, 1.0]), self.target, referenceresult)
+
+        # same path, but the jacobi matrices of the accepted points were evaluated together with the line search
+        self.assertTrue(np.allclose(self.result.getMetric("parameters"), referenceresult.getMetric("parameters")))
+        self.assertTrue(self.result.metadata["speculative"])
+        self.assertEqual(evaluator.cached_evaluation_count, 2 * (self.result.iterationCount - 1))
+        self.assertEqual(reference.batches - evaluator.batches, self.result.iterationCount - 1)
+
+        # three candidates fit into the six unused slots
+        self.assertEqual(self.result.iterations[0]["speculativeevaluations"], 6)
+        self.assertIsNone(optimizer.linesearchmethod.speculation)
+
+    def test_levmar_deltas(self):
+        V = np.array([[1.0, 2.0], [3.0, 4.5], [5.0, 6.0]])
+        r = np.array([0.5, -1.0, 2.0])
+        A = V.transpose().dot(V)
+        D = np.diag(1 / np.sqrt(np.diag(A)))
+
+        for scaling in [False, True]:
+            optimizer = LevMarOptimizer(scaling=scaling)
+            deltas = optimizer.calculateDeltas(V, r, [0.01, 1, 100])
+            for lam, delta in zip([0.01, 1, 100], deltas):
+                if scaling:
+                    expected = -D.dot(np.linalg.solve(D.dot(A).dot(D) + lam * np.eye(2), D.dot(V.transpose().dot(r))))
+                else:
+                    expected = -np.linalg.solve(A + lam * np.eye(2), V.transpose().dot(r))
+                self.assertTrue(np.allclose(delta, expected))
+                self.assertTrue(np.allclose(optimizer.calculateDelta(V, r, 2, lam), expected))
+
+    def test_levmar_solver_ill_conditioned(self):
+        # the second parameter is nearly redundant, forming V^T V would lose all information about it
+        t = np.linspace(0, 1, 10)
+        V = np.array([t, t + 1e-9 * t**2]).transpose()
+        r = np.sin(t)
+
+        solver = LevMarSolver(V, r)
+        expected = -np.linalg.lstsq(V, r, rcond=None)[0]
+        self.assertTrue(np.allclose(V.dot(solver.getStep(0)), V.dot(expected)))
+
+        # rank deficient: for lambda = 0 the minimum norm step is returned
+        V = np.array([t, t, np.zeros(10)]).transpose()
+        step = LevMarSolver(V, r, scaling=True).getStep(0)
+        self.assertTrue(np.all(np.isfinite(step)))
+        self.assertTrue(np.allclose(step, -np.linalg.pinv(V).dot(r)))
+
+    def test_gained_levmar(self):
+        optimizer = GainedLevMarOptimizer(maxiterations=5)
+        optimizer.run(self.evaluator, np.array([1.0, 1.0]), self.target, self.result)
+
+        residualnorms = self.result.getMetric("residualnorm")
+        self.assertLess(residualnorms[-1], 1e-2 * residualnorms[0])
+
+    def test_levmar_lambda_batches(self):
+        evaluator = ModelEvaluator(parallelism=6)
+        optimizer = LevMarOptimizer(maxiterations=3, initial_lam=1e3)
+        optimizer.run(evaluator, np.array([1.0, 1.0]), self.target, self.result)
+
+        batches = [e for iteration in self.result.iterations for e, tag, _ in iteration.get("evaluations", []) if tag == "lambda-search"]
+        self.assertGreater(len(batches), 0)
+        self.assertTrue(all(len(batch) == 6 for batch in batches))
+
+        # the smallest lambda reducing the residual norm is accepted, so lambda decreases from the large initial value
+        lambdas = self.result.getMetric("lambda")
+        self.assertEqual(lambdas[0], 1e2)
+        self.assertTrue(all(reduction < 1 for reduction in self.result.getMetric("reduction") if reduction is not None))
+
+
+if __name__ == '__main__':
+    unittest.main()
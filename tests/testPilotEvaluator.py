@@ -0,0 +1,164 @@
+import unittest
+import os
+import sys
+import shutil
+import tempfile
+import time
+sys.path.insert(0, os.path.abspath('../..'))
+
+import numpy as np
+from UGParameterEstimator import PilotEvaluator, ParameterManager, DirectParameter, GenericEvaluation, UG4ParameterOutputAdapter, ErroredEvaluation
+
+# stand-ins for the cluster tools: ugsubmit runs the job in the background right away, uginfo lists the jobs still alive
+UGSUBMIT = """#!{python}
+import os, subprocess, sys
+command = sys.argv[sys.argv.index("---") + 1:]
+os.makedirs("jobs", exist_ok=True)
+jobid = len(os.listdir("jobs")) + 100
+os.makedirs("jobid." + str(jobid), exist_ok=True)
+with open("jobid." + str(jobid) + "/job.output", "w") as output:
+    process = subprocess.Popen(command, stdout=output, stderr=subprocess.STDOUT, start_new_session=True)
+with open("jobs/" + str(jobid), "w") as f:
+    f.write(str(process.pid) + " " + sys.argv[1])
+print("Received job id " + str(jobid))
+"""
+
+UGINFO = """#!{python}
+import os
+print("JOBID STATE NAME")
+for jobid in sorted(os.listdir("jobs")) if os.path.isdir("jobs") else []:
+    with open("jobs/" + jobid) as f:
+        pid = int(f.read().split()[0])
+    try:
+        os.kill(pid, 0)
+        print(jobid + " RUNNING pilot")
+    except OSError:
+        pass
+"""
+
+# stand-in for ugshell, evaluations of 10 seconds and more start a child process waiting as well, like the
+# processes started by mpirun
+UGSHELL = """#!{python}
+import json, os, subprocess, sys, time
+directory = sys.argv[sys.argv.index("-communicationDir") + 1]
+evaluation_id = sys.argv[sys.argv.index("-evaluationId") + 1]
+with open(os.path.join(directory, evaluation_id + "_parameters.json")) as f:
+    parameters = json.load(f)
+if parameters["duration"]["value"] >= 10:
+    child = subprocess.Popen([sys.executable, "-c", "import time; time.sleep(%f)" % parameters["duration"]["value"]])
+    with open(os.path.join(directory, evaluation_id + "_child.txt"), "w") as f:
+        f.write(str(child.pid))
+time.sleep(parameters["duration"]["value"])
+with open(os.path.join(directory, evaluation_id + "_measurement.csv"), "w") as f:
+    f.write("step,time,value\\n1,0,%f\\nFINISHED,,\\n" % parameters["value"]["value"])
+"""
+
+
+def isAlive(pid, timeout=2):
+    """Returns True, if the process is still running after timeout seconds."""
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            with open("/proc/" + str(pid) + "/stat") as f:
+                if f.read().split(")")[-1].split()[0] == "Z":
+                    return False
+        except OSError:
+            return False
+        time.sleep(0.05)
+    return True
+
+
+class PilotEvaluatorTests(unittest.TestCase):
+
+    def setUp(self):
+        self.cwd = os.getcwd()
+        self.path = os.environ["PATH"]
+        self.tmpdir = tempfile.mkdtemp()
+
+        for name, script in [("ugsubmit", UGSUBMIT), ("uginfo", UGINFO), ("ugshell", UGSHELL)]:
+            filename = os.path.join(self.tmpdir, name)
+            with open(filename, "w") as f:
+                f.write(script.format(python=sys.executable))
+            os.chmod(filename, 0o755)
+        open(os.path.join(self.tmpdir, "evaluate.lua"), "w").close()
+
+        os.chdir(self.tmpdir)
+        os.environ["PATH"] = self.tmpdir + os.pathsep + self.path
+
+        parametermanager = ParameterManager()
+        parametermanager.addParameter(DirectParameter("duration", 0.0))
+        parametermanager.addParameter(DirectParameter("value", 0.0))
+        self.evaluator = PilotEvaluator("evaluate.lua", "exchange", parametermanager, GenericEvaluation, UG4ParameterOutputAdapter(), threadcount=1, slots=3)
+        self.evaluator.pollinterval = 0.05
+        self.evaluator.reset()
+
+    def tearDown(self):
+        self.evaluator.close()
+        os.chdir(self.cwd)
+        os.environ["PATH"] = self.path
+        shutil.rmtree(self.tmpdir)
+
+    def test_evaluate(self):
+        for i in range(3):
+            results = self.evaluator.evaluate([np.array([0.0, 3.0 * i + j]) for j in range(3)])
+            self.assertEqual([r.getNumpyArray()[0] for r in results], [3.0 * i + j for j in range(3)])
+
+        # all evaluations ran in the same pilot, with the output of each evaluation in the exchange directory
+        self.assertEqual(os.listdir("jobs"), ["100"])
+        self.assertEqual(self.evaluator.parallelism, 3)
+        self.assertIn("Pilots submitted: 1", self.evaluator.getStatistics())
+        self.assertTrue(os.path.isfile(os.path.join("exchange", str(results[0].eval_id) + "_ug_output.txt")))
+
+        self.evaluator.close()
+        with open("jobid.100/job.output") as f:
+            self.assertIn("exiting after 9 evaluations", f.read())
+
+    def test_timeout(self):
+        self.evaluator.timeout = 1
+
+        starttime = time.time()
+        results = self.evaluator.evaluate([np.array([0.0, 1.0]), np.array([10.0, 2.0])])
+        self.assertLess(time.time() - starttime, 5)
+        self.assertEqual(results[0].getNumpyArray()[0], 1.0)
+        self.assertTrue(results[1].reason.startswith("Timeout"))
+
+        # the processes started by the evaluation are killed with it
+        with open(os.path.join("exchange", str(results[1].eval_id) + "_child.txt")) as f:
+            self.assertFalse(isAlive(int(f.read())))
+
+        # the pilot keeps running evaluations
+        results = self.evaluator.evaluate([np.array([0.0, 3.0])])
+        self.assertEqual(results[0].getNumpyArray()[0], 3.0)
+        self.assertEqual(self.evaluator.pilot_submission_count, 1)
+
+    def test_cancel(self):
+        futures = self.evaluator.submit([np.array([10.0, 1.0]), np.array([10.0, 2.0]), np.array([10.0, 3.0]), np.array([10.0, 4.0])])
+        time.sleep(1)
+
+        # three running evaluations are killed, the waiting one never starts
+        self.evaluator.cancel(futures)
+        results = self.evaluator.collect(futures)
+        self.assertTrue(all(isinstance(r, ErroredEvaluation) and r.reason == "Cancelled" for r in results))
+        for future in futures[:3]:
+            with open(os.path.join("exchange", str(future.evaluation_id) + "_child.txt")) as f:
+                self.assertFalse(isAlive(int(f.read())))
+        self.assertFalse(os.path.exists(os.path.join("exchange", str(futures[3].evaluation_id) + ".task")))
+
+    def test_idle_pilot(self):
+        self.evaluator.idletimeout = 0.2
+
+        self.evaluator.evaluate([np.array([0.0, 1.0])])
+        while not os.path.exists(os.path.join("exchange", "pilot_0.exit")):
+            time.sleep(0.05)
+
+        # a new pilot is submitted for the next batch
+        results = self.evaluator.evaluate([np.array([0.0, 2.0])])
+        self.assertEqual(results[0].getNumpyArray()[0], 2.0)
+        self.assertEqual(sorted(os.listdir("jobs")), ["100", "101"])
+
+        with open("jobs/101") as f:
+            self.assertEqual(f.read().split()[1], "3")
+
+
+if __name__ == '__main__':
+    unittest.main()
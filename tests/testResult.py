@@ -0,0 +1,289 @@
+import unittest
+import os
+import sys
+import tempfile
+import shutil
+import pickle
+import gc
+import subprocess
+sys.path.insert(0, os.path.abspath('../..'))
+
+import numpy as np
+from UGParameterEstimator import Result, ResultJournal, GenericEvaluation
+
+
+class ResultTests(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.filename = os.path.join(self.directory, "result.pkl")
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def writeResult(self, journal, iterations=3):
+        result = Result(self.filename, journal=journal)
+        result.addRunMetadata("optimizertype", "test")
+        for i in range(iterations):
+            result.log("iteration " + str(i))
+            evaluations = [GenericEvaluation([i, j], [0, 1], 2 * i + j, np.array([i, j])) for j in range(2)]
+            result.addEvaluations(evaluations, "jacobi")
+            result.addMetric("measurementEvaluation", evaluations[0])
+            result.addMetric("parameters", np.array([i, 2.0 * i]))
+            result.addMetric("residualnorm", 1.0 / (i + 1))
+            result.commitIteration()
+        result.save()
+        result.closeLog()
+        return result
+
+    def test_journal(self):
+        self.writeResult(journal=True)
+
+        self.assertFalse(os.path.isfile(self.filename))
+        self.assertTrue(os.path.isfile(self.filename + "_journal"))
+
+        result = Result.load(self.filename, printInfo=False)
+        self.assertEqual(result.iterationCount, 3)
+        self.assertEqual(result.metadata["optimizertype"], "test")
+        self.assertEqual(len(result.logentries), 3)
+        self.assertEqual(result.iterations[-1]["residualnorm"], 1.0 / 3)
+        self.assertEqual(result.iterations[1]["parameters"].tolist(), [1, 2])
+
+    def test_journal_appends(self):
+        self.writeResult(journal=True)
+        size = os.path.getsize(self.filename + "_journal")
+
+        result = Result.load(self.filename, printInfo=False)
+        result.addMetric("residualnorm", 0.1)
+        result.commitIteration()
+
+        self.assertGreater(os.path.getsize(self.filename + "_journal"), size)
+        self.assertEqual(Result.load(self.filename, printInfo=False).iterationCount, 4)
+
+    def test_journal_truncated(self):
+        self.writeResult(journal=True)
+        with open(self.filename + "_journal", "ab") as f:
+            f.write(ResultJournal.header.pack(ResultJournal.ITERATION, 1000) + b"incomplete")
+
+        result = Result.load(self.filename, printInfo=False)
+        self.assertEqual(result.iterationCount, 3)
+
+    def test_compact(self):
+        result = self.writeResult(journal=True)
+        result.compact()
+        os.remove(self.filename + "_journal")
+
+        compacted = Result.load(self.filename, printInfo=False)
+        self.assertIsNone(compacted.journal)
+        self.assertEqual(compacted.iterationCount, 3)
+        self.assertEqual(compacted.metadata, {"optimizertype": "test"})
+        self.assertEqual(compacted.logentries, result.logentries)
+        self.assertEqual(compacted.iterations[2]["parameters"].tolist(), [2, 4])
+
+    def assertEvaluationsShared(self, result):
+        for i in range(3):
+            iteration = result.iterations[i]
+            evaluations, tag, index = iteration["evaluations"][0]
+            self.assertEqual(tag, "jacobi")
+            self.assertEqual(index, i)
+            self.assertIs(iteration["measurementEvaluation"], evaluations[0])
+            self.assertIs(result.getEvaluation(2 * i + 1), evaluations[1])
+            self.assertEqual(evaluations[1].data.tolist(), [i, 1])
+
+    def test_evaluations_shared(self):
+        self.writeResult(journal=False)
+        self.assertEvaluationsShared(Result.load(self.filename, printInfo=False))
+
+    def test_evaluations_shared_journal(self):
+        result = self.writeResult(journal=True)
+        self.assertEvaluationsShared(Result.load(self.filename, printInfo=False))
+
+        result.compact()
+        compacted = Result.load(self.filename, printInfo=False, lazy=False)
+        self.assertIsNone(compacted.journal)
+        self.assertEqual(len(compacted.storedevaluations), 6)
+        self.assertEvaluationsShared(compacted)
+        self.assertEvaluationsShared(Result.load(self.filename, printInfo=False))
+
+    def test_evaluations_not_copied(self):
+        result = Result()
+        evaluation = GenericEvaluation([1], [0], 0, np.array([1.0]))
+        result.addEvaluations([evaluation], "test")
+        result.addMetric("measurementEvaluation", evaluation)
+        result.commitIteration()
+
+        self.assertIs(result.iterations[0]["evaluations"][0][0][0], evaluation)
+        self.assertIs(result.iterations[0]["measurementEvaluation"], evaluation)
+
+    def test_log_level(self):
+        result = Result(self.filename, loglevel=Result.LogLevel.INFO)
+        result.log("candidate", Result.LogLevel.DEBUG)
+        result.log("iteration")
+        result.closeLog()
+
+        self.assertEqual(len(result.logentries), 1)
+        with open(self.filename + "_log") as f:
+            self.assertEqual(f.read(), result.logentries[0] + "\n")
+
+    def test_log_buffered(self):
+        for asynclog in [False, True]:
+            result = Result(self.filename, asynclog=asynclog)
+            result.logflushinterval = 60
+            result.log("first")
+            result.log("second")
+
+            self.assertFalse(os.path.isfile(self.filename + "_log"))
+
+            result.commitIteration()
+            with open(self.filename + "_log") as f:
+                self.assertEqual(f.read().splitlines(), result.logentries)
+
+            result.closeLog()
+            os.remove(self.filename + "_log")
+
+    def test_log_warning_flushed(self):
+        for asynclog in [False, True]:
+            result = Result(self.filename, asynclog=asynclog)
+            result.logflushinterval = 60
+            result.log("first")
+            result.log("problem", Result.LogLevel.WARNING)
+
+            with open(self.filename + "_log") as f:
+                self.assertEqual(f.read().splitlines(), result.logentries)
+
+            result.closeLog()
+            os.remove(self.filename + "_log")
+
+    def test_log_flushed_without_close(self):
+        result = Result(self.filename)
+        result.logflushinterval = 60
+        result.log("first")
+        logentries = result.logentries
+        del result
+        gc.collect()
+
+        with open(self.filename + "_log") as f:
+            self.assertEqual(f.read().splitlines(), logentries)
+        os.remove(self.filename + "_log")
+
+        # still referenced when the interpreter exits
+        script = "import sys\nfrom UGParameterEstimator import Result\nresult = Result(sys.argv[1])\nresult.logflushinterval = 60\nresult.log('first')\n"
+        root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+        subprocess.run([sys.executable, "-c", script, self.filename], cwd=root, check=True, stdout=subprocess.DEVNULL)
+        with open(self.filename + "_log") as f:
+            self.assertEqual(len(f.read().splitlines()), 1)
+
+    def test_columns(self):
+        result = self.writeResult(journal=False)
+        result.iterations[1]["jacobian"] = np.ones((2, 2))
+        result.iterations[2]["jacobian"] = 2 * np.ones((2, 2))
+        directory = os.path.join(self.directory, "columns")
+        result.writeColumns(directory)
+
+        columns = Result.readColumns(directory, ["metric_residualnorm", "metric_jacobian"])
+        self.assertEqual(set(columns), {"metric_residualnorm", "metric_jacobian"})
+        self.assertIsInstance(columns["metric_residualnorm"], np.memmap)
+        self.assertEqual(columns["metric_residualnorm"].tolist(), [1.0, 0.5, 1.0 / 3])
+        self.assertEqual(columns["metric_jacobian"].shape, (3, 2, 2))
+        self.assertTrue(np.all(np.isnan(columns["metric_jacobian"][0])))
+        self.assertEqual(columns["metric_jacobian"][2].tolist(), [[2, 2], [2, 2]])
+
+        columns = Result.readColumns(directory)
+        self.assertNotIn("metric_measurementEvaluation", columns)
+        self.assertEqual(columns["evaluation_ids"].tolist(), [0, 1, 2, 3, 4, 5])
+        self.assertEqual(columns["evaluation_iterations"].tolist(), [0, 0, 1, 1, 2, 2])
+        self.assertEqual(columns["evaluation_tags"].tolist(), ["jacobi"] * 6)
+        self.assertEqual(columns["evaluation_parameters"][3].tolist(), [1, 1])
+        self.assertEqual(columns["evaluation_measurements"][3].tolist(), [1, 1])
+
+        imported = Result.fromColumns(directory)
+        self.assertEqual(imported.iterationCount, 3)
+        self.assertEqual(imported.metadata, {"optimizertype": "test"})
+        self.assertEqual(imported.iterations[1]["parameters"].tolist(), [1, 2])
+
+    def test_columns_rewritten(self):
+        result = self.writeResult(journal=False)
+        directory = os.path.join(self.directory, "columns")
+        result.writeColumns(directory)
+        result.writeColumns(directory, metrics=["residualnorm"])
+
+        columns = Result.readColumns(directory)
+        self.assertIn("metric_residualnorm", columns)
+        self.assertNotIn("metric_parameters", columns)
+        self.assertEqual(list(Result.fromColumns(directory).iterations[0]), ["residualnorm"])
+
+    def test_lazy_load(self):
+        result = self.writeResult(journal=False)
+        result.iterations[2]["jacobian"] = np.ones((10, 10))
+        result.save()
+
+        loaded = Result.load(self.filename, printInfo=False)
+        self.assertEqual(loaded.iterationCount, 3)
+        self.assertEqual(loaded.metadata, {"optimizertype": "test"})
+        self.assertEqual(loaded.getMetric("residualnorm"), [1.0, 0.5, 1.0 / 3])
+        self.assertIsNone(loaded.iterations.lastindex)
+        self.assertEqual(loaded.storedevaluations, {})
+
+        jacobians = loaded.getMetric("jacobian")
+        self.assertEqual(jacobians[:2], [None, None])
+        self.assertEqual(jacobians[2].tolist(), np.ones((10, 10)).tolist())
+        self.assertEqual(loaded.getEvaluation(5).data.tolist(), [2, 1])
+
+    def test_lazy_save(self):
+        self.writeResult(journal=False)
+
+        loaded = Result.load(self.filename, printInfo=False)
+        loaded.addRunMetadata("note", "saved again")
+        loaded.save()
+        self.assertEqual(loaded.iterations[1]["parameters"].tolist(), [1, 2])
+
+        loaded.addMetric("residualnorm", 0.1)
+        loaded.commitIteration()
+
+        reloaded = Result.load(self.filename, printInfo=False)
+        self.assertEqual(reloaded.metadata["note"], "saved again")
+        self.assertEqual(reloaded.getMetric("residualnorm"), [1.0, 0.5, 1.0 / 3, 0.1])
+        self.assertEvaluationsShared(reloaded)
+
+    def test_lazy_load_replaced(self):
+        self.writeResult(journal=False)
+        loaded = Result.load(self.filename, printInfo=False)
+
+        # a running optimization saves again, replacing the file
+        self.writeResult(journal=False, iterations=5)
+
+        self.assertEqual(loaded.iterationCount, 3)
+        self.assertEqual(loaded.iterations[2]["parameters"].tolist(), [2, 4])
+        self.assertEqual(loaded.getEvaluation(5).data.tolist(), [2, 1])
+        self.assertEqual(Result.load(self.filename, printInfo=False).iterationCount, 5)
+
+    def test_load_other_version(self):
+        self.writeResult(journal=False)
+        with open(self.filename, "r+b") as f:
+            f.seek(-1, os.SEEK_END)
+            f.write(b"2")
+
+        with self.assertRaisesRegex(ValueError, "version 2"):
+            Result.load(self.filename, printInfo=False)
+
+    def test_load_plain_pickle(self):
+        result = self.writeResult(journal=False)
+        with open(self.filename, "wb") as f:
+            pickle.dump(result.getState(), f)
+
+        loaded = Result.load(self.filename, printInfo=False)
+        self.assertIsNone(loaded.resultfile)
+        self.assertEqual(loaded.getMetric("residualnorm"), [1.0, 0.5, 1.0 / 3])
+        self.assertEvaluationsShared(loaded)
+
+    def test_save_without_journal(self):
+        self.writeResult(journal=False)
+
+        self.assertFalse(os.path.isfile(self.filename + "_journal"))
+        result = Result.load(self.filename, printInfo=False)
+        self.assertEqual(result.iterationCount, 3)
+        self.assertEqual(result.iterations[0]["residualnorm"], 1.0)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,121 @@
+import unittest
+import os
+import sys
+import shutil
+import tempfile
+import time
+sys.path.insert(0, os.path.abspath('../..'))
+
+import numpy as np
+from UGParameterEstimator import WorkerEvaluator, ParameterManager, DirectParameter, GenericEvaluation, UG4ParameterOutputAdapter, ErroredEvaluation
+
+# runs the stand-in worker in place of ugshell
+UGSHELL = """#!{python}
+import runpy
+runpy.run_path({worker!r}, run_name="__main__")
+"""
+
+
+def isAlive(pid, timeout=2):
+    """Returns True, if the process is still running after timeout seconds."""
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            with open("/proc/" + str(pid) + "/stat") as f:
+                if f.read().split(")")[-1].split()[0] == "Z":
+                    return False
+        except OSError:
+            return False
+        time.sleep(0.05)
+    return True
+
+
+class WorkerEvaluatorTests(unittest.TestCase):
+
+    def setUp(self):
+        self.cwd = os.getcwd()
+        self.path = os.environ["PATH"]
+        self.tmpdir = tempfile.mkdtemp()
+
+        ugshell = os.path.join(self.tmpdir, "ugshell")
+        with open(ugshell, "w") as f:
+            f.write(UGSHELL.format(python=sys.executable, worker=os.path.join(os.path.dirname(os.path.abspath(__file__)), "StandinWorker.py")))
+        os.chmod(ugshell, 0o755)
+        open(os.path.join(self.tmpdir, "evaluate.lua"), "w").close()
+
+        os.chdir(self.tmpdir)
+        os.environ["PATH"] = self.tmpdir + os.pathsep + self.path
+
+        parametermanager = ParameterManager()
+        parametermanager.addParameter(DirectParameter("duration", 0.0))
+        parametermanager.addParameter(DirectParameter("value", 0.0))
+        self.evaluator = WorkerEvaluator("evaluate.lua", "exchange", parametermanager, GenericEvaluation, UG4ParameterOutputAdapter(), threadcount=1, cliparameters=["-startup", "1"], jobcount=2)
+        self.evaluator.reset()
+
+    def tearDown(self):
+        self.evaluator.close()
+        os.chdir(self.cwd)
+        os.environ["PATH"] = self.path
+        shutil.rmtree(self.tmpdir)
+
+    def test_evaluate(self):
+        # the startup of one second is only paid once per worker
+        starttime = time.time()
+        for i in range(4):
+            results = self.evaluator.evaluate([np.array([0.0, 2.0 * i]), np.array([0.0, 2.0 * i + 1])])
+            self.assertEqual([r.getNumpyArray()[0] for r in results], [2.0 * i, 2.0 * i + 1])
+        self.assertLess(time.time() - starttime, 3)
+        self.assertEqual(self.evaluator.pool.starts, 2)
+        self.assertIn("Worker starts: 2", self.evaluator.getStatistics())
+
+        # the output of each evaluation is separated
+        with open(os.path.join("exchange", str(results[1].eval_id) + "_ug_output.txt")) as f:
+            self.assertEqual(f.read(), "evaluating " + str(results[1].eval_id) + "\n")
+
+    def test_crash(self):
+        results = self.evaluator.evaluate([np.array([-1.0, 1.0]), np.array([0.0, 2.0])])
+        self.assertIsInstance(results[0], ErroredEvaluation)
+        self.assertEqual(results[1].getNumpyArray()[0], 2.0)
+
+        # the crashed worker is started again
+        results = self.evaluator.evaluate([np.array([0.0, 3.0]), np.array([0.0, 4.0])])
+        self.assertEqual([r.getNumpyArray()[0] for r in results], [3.0, 4.0])
+        self.assertEqual(self.evaluator.pool.starts, 3)
+
+    def test_timeout(self):
+        self.evaluator.timeout = 0.5
+
+        # the startup of the workers does not count towards the timeout
+        starttime = time.time()
+        results = self.evaluator.evaluate([np.array([0.0, 1.0]), np.array([10.0, 2.0])])
+        self.assertLess(time.time() - starttime, 5)
+        self.assertEqual(results[0].getNumpyArray()[0], 1.0)
+        self.assertTrue(results[1].reason.startswith("Timeout"))
+
+        # the processes started by the worker are killed with it
+        with open(os.path.join("exchange", str(results[1].eval_id) + "_child.txt")) as f:
+            self.assertFalse(isAlive(int(f.read())))
+
+    def test_internal_error(self):
+        self.evaluator.evaluate([np.array([0.0, 1.0])])
+
+        def fail(offset, filename):
+            raise OSError("disk full")
+        for worker in self.evaluator.pool.workers:
+            worker.copyOutput = fail
+
+        # the worker is unregistered and released, even if running the evaluation fails
+        with self.assertRaises(OSError):
+            self.evaluator.evaluate([np.array([0.0, 2.0])])
+        self.assertEqual(self.evaluator.processes, {})
+        self.assertEqual(self.evaluator.pool.idle.qsize(), 2)
+
+    def test_close(self):
+        self.evaluator.evaluate([np.array([0.0, 1.0])])
+        processes = [worker.process for worker in self.evaluator.pool.workers if worker.process is not None]
+        self.evaluator.close()
+        self.assertTrue(all(process.poll() == 0 for process in processes))
+
+
+if __name__ == '__main__':
+    unittest.main()